@@ -0,0 +1,47 @@
+"""
+Сравнение двух прогонов bench/run.py: пропускная способность и p50/p99 по каждому сценарию.
+
+    python -m bench.compare bench/results/old.json bench/results/new.json
+"""
+import json
+import sys
+
+def _load(path: str) -> tuple:
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["scenario"], r["concurrency"]): r for r in report["results"]}, report["meta"]
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "    -"
+    return f"{(new - old) * 100 / old:+6.1f}%"
+
+def compare(old_path: str, new_path: str) -> str:
+    old, old_meta = _load(old_path)
+    new, new_meta = _load(new_path)
+    lines = [
+        f"old: {old_meta.get('git') or old_path} ({old_meta.get('started', '?')})",
+        f"new: {new_meta.get('git') or new_path} ({new_meta.get('started', '?')})",
+        "",
+        f"{'SCENARIO':<10}{'C':>4}  {'THROUGHPUT':>22}  {'P50 MS':>22}  {'P99 MS':>22}",
+    ]
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        row = f"{key[0]:<10}{key[1]:>4}"
+        row += f"  {a['throughput']:>7.1f} {b['throughput']:>7.1f} {_delta(a['throughput'], b['throughput'])}"
+        for q in ("p50", "p99"):
+            x, y = a["latency_ms"][q], b["latency_ms"][q]
+            row += f"  {x:>7.1f} {y:>7.1f} {_delta(x, y)}"
+        if b["errors"]:
+            row += f"  ⚠️ {b['errors']} errors"
+        lines.append(row)
+    missing = sorted(old.keys() ^ new.keys())
+    if missing:
+        lines.append("")
+        lines.append("only in one run: " + ", ".join(f"{s} c={c}" for s, c in missing))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python -m bench.compare <old.json> <new.json>")
+    print(compare(sys.argv[1], sys.argv[2]))
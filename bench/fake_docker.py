@@ -0,0 +1,146 @@
+"""
+Фейковый Docker Engine API на Unix-сокете (DOCKER_SOCKET): список контейнеров, логи
+(в том числе follow с мультиплексированными кадрами), one-shot stats, restart, поток событий.
+"""
+import asyncio
+import json
+import re
+import time
+from datetime import datetime, timezone
+from bench.httpserver import Response, connection_handler
+
+LOG_CONTENT_TYPE = "application/vnd.docker.multiplexed-stream"
+
+def _frame(payload: bytes, stream: int = 1) -> bytes:
+    return bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, "big") + payload
+
+def _timestamp() -> str:
+    now = time.time_ns()
+    base = datetime.fromtimestamp(now // 10 ** 9, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{base}.{now % 10 ** 9:09d}Z"
+
+class FakeDocker:
+    """
+    Docker API для бенчмарка. Контейнеры bench-1..N всегда запущены.
+    emit(name, line) отправляет строку всем открытым потокам логов контейнера (follow=1),
+    emit_event(name, action, **attributes) - событие всем подписчикам /events.
+    """
+
+    def __init__(self, socket_path: str, containers: int = 3):
+        self.socket_path = socket_path
+        self.names = [f"bench-{i}" for i in range(1, containers + 1)]
+        self.calls = {}
+        # Сколько соединений принял сервер (проверка keep-alive клиента)
+        self.connections = 0
+        self._followers = {name: set() for name in self.names}
+        self._subscribers = set()
+        self._server = None
+        self._serve = connection_handler(self._handle)
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._accept, self.socket_path)
+
+    async def _accept(self, reader, writer):
+        self.connections += 1
+        await self._serve(reader, writer)
+
+    async def stop(self):
+        for queues in list(self._followers.values()) + [self._subscribers]:
+            for queue in queues:
+                queue.put_nowait(None)
+        self._server.close()
+        await self._serve.close()
+        await self._server.wait_closed()
+
+    def followers(self, name: str) -> int:
+        return len(self._followers[name])
+
+    def emit(self, name: str, line: str):
+        for queue in self._followers[name]:
+            queue.put_nowait(line)
+
+    def emit_event(self, name: str, action: str, **attributes):
+        now = time.time_ns()
+        event = {
+            "Type": "container", "Action": action, "id": name, "time": now // 10 ** 9, "timeNano": now,
+            "Actor": {"ID": name, "Attributes": dict(attributes, name=name, image="bench:latest")},
+        }
+        for queue in self._subscribers:
+            queue.put_nowait(json.dumps(event).encode() + b"\n")
+
+    async def _events(self):
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                line = await queue.get()
+                if line is None:
+                    return
+                yield line
+        finally:
+            self._subscribers.discard(queue)
+
+    def _container(self, name: str) -> dict:
+        return {
+            "Id": name, "Names": [f"/{name}"], "Image": "bench:latest",
+            "State": "running", "Status": "Up 2 hours",
+        }
+
+    async def _follow(self, name: str, timestamps: bool):
+        queue = asyncio.Queue()
+        self._followers[name].add(queue)
+        try:
+            while True:
+                line = await queue.get()
+                if line is None:
+                    return
+                prefix = _timestamp() + " " if timestamps else ""
+                yield _frame(f"{prefix}{line}\n".encode())
+        finally:
+            self._followers[name].discard(queue)
+
+    def _logs(self, name: str, query: dict) -> Response:
+        timestamps = query.get("timestamps") == "1"
+        if query.get("follow") == "1":
+            return Response(200, self._follow(name, timestamps), LOG_CONTENT_TYPE)
+        tail = query.get("tail", "all")
+        count = 100 if tail == "all" else int(tail)
+        prefix = _timestamp() + " " if timestamps else ""
+        body = b"".join(
+            _frame(f"{prefix}{name} GET /api/items/{i} 200 {i % 97}ms\n".encode()) for i in range(count)
+        )
+        return Response(200, body, LOG_CONTENT_TYPE)
+
+    @staticmethod
+    def _stats(name: str) -> dict:
+        usage = int(time.monotonic() * 1e8)
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": usage}},
+            "memory_stats": {"usage": 64 * 1024 ** 2, "limit": 512 * 1024 ** 2, "stats": {"inactive_file": 0}},
+            "networks": {"eth0": {"rx_bytes": usage // 1000, "tx_bytes": usage // 2000}},
+            "blkio_stats": {"io_service_bytes_recursive": [
+                {"op": "read", "value": usage // 100}, {"op": "write", "value": usage // 50},
+            ]},
+        }
+
+    async def _handle(self, request):
+        # Версия API в пути (/v1.43/...) не важна
+        path = re.sub(r"^/v[\d.]+", "", request.path)
+        self.calls[path] = self.calls.get(path, 0) + 1
+        if path == "/_ping":
+            return Response(200, b"OK", "text/plain")
+        if path == "/events":
+            return Response(200, self._events())
+        if path == "/containers/json":
+            return Response.json([self._container(name) for name in self.names])
+        match = re.fullmatch(r"/containers/([^/]+)/(json|logs|stats|restart)", path)
+        if not match or match.group(1) not in self._followers:
+            return Response.json({"message": f"No such container: {path}"}, 404)
+        name, action = match.groups()
+        if action == "json":
+            return Response.json(dict(self._container(name), RestartCount=0))
+        if action == "logs":
+            return self._logs(name, request.query)
+        if action == "stats":
+            return Response.json(self._stats(name))
+        return Response(204, b"")
@@ -0,0 +1,261 @@
+"""
+Фейковый Bot API: принимает запросы python-telegram-bot по HTTP (TELEGRAM_API_URL),
+отдает подложенные бенчмарком обновления через getUpdates (или POST-ит их на webhook бота
+после setWebhook) и записывает все, что бот отправил. Используется и тестами (tests/).
+"""
+import asyncio
+import itertools
+import json
+import time
+from email.parser import BytesParser
+from urllib.parse import parse_qs, urlsplit
+from bench.httpserver import Response, connection_handler
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+# Методы, которые отправляют сообщение в чат (ответ бота на команду)
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageText"}
+
+def _parse_params(request) -> dict:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        return json.loads(request.body or b"{}")
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + request.body)
+        params = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            # Загружаемые файлы (document, photo) остаются байтами
+            params[name] = payload.decode() if part.get_filename() is None else payload
+        return params
+    return {k: v[-1] for k, v in parse_qs(request.body.decode()).items()}
+
+class WebhookPusher:
+    """
+    Доставка апдейтов на webhook, как у Telegram: до max_connections keep-alive соединений,
+    каждое отправляет апдейты по одному и ждет ответа. Апдейт, не принятый ботом (не 200), теряется.
+    """
+
+    def __init__(self, url: str, secret: str, max_connections: int):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = parts.path or "/"
+        self.secret = secret
+        self.statuses = {}
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max_connections)]
+
+    def push(self, update: dict):
+        self._queue.put_nowait(update)
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _post(self, reader, writer, body: bytes) -> int:
+        writer.write(
+            f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nX-Telegram-Bot-Api-Secret-Token: {self.secret}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        return status
+
+    async def _worker(self):
+        reader = writer = None
+        try:
+            while True:
+                body = json.dumps(await self._queue.get()).encode()
+                # Одна повторная попытка: бот мог закрыть простаивающее соединение
+                for attempt in range(2):
+                    try:
+                        if writer is None:
+                            reader, writer = await asyncio.open_connection(self.host, self.port)
+                        status = await self._post(reader, writer, body)
+                        break
+                    except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+                        if writer is not None:
+                            writer.close()
+                        reader = writer = None
+                        status = 0
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+class FakeTelegram:
+    """
+    Сервер Bot API на 127.0.0.1.
+    inject() кладет команду в очередь getUpdates (после setWebhook - отправляет на webhook),
+    wait_for() ждет первого ответа бота в чат, fail() - ответить ошибкой на следующие вызовы метода.
+    rtt - искусственная задержка каждого ответа (сек), как у настоящего api.telegram.org.
+    """
+
+    def __init__(self, user_id: int, rtt: float = 0.0):
+        self.user_id = user_id
+        self.rtt = rtt
+        self.port = None
+        self.calls = {}
+        # Все загруженные файлы по порядку: (метод, chat_id, {поле: байты}), включая неудачные попытки
+        self.uploads = []
+        # Наблюдатели за отправкой: callback(method, chat_id, text, perf_counter)
+        self.listeners = []
+        self._failures = []
+        self._updates = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._waiters = {}
+        self.webhook = None
+        self._server = None
+        self._serve = connection_handler(self._handle)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.webhook:
+            await self.webhook.close()
+        self._server.close()
+        # Висящий long polling getUpdates не дает закрыть сервер - будим его
+        self._new_updates.set()
+        await self._serve.close()
+        await self._server.wait_closed()
+
+    def inject(self, text: str, chat_id: int) -> float:
+        """Кладет сообщение-команду от пользователя в чат chat_id. Возвращает время отправки."""
+        command = text.split()[0]
+        update_id = next(self._update_ids)
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": self.user_id, "is_bot": False, "first_name": "Bench"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+            },
+        }
+        started = time.perf_counter()
+        if self.webhook:
+            self.webhook.push(update)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+        return started
+
+    def fail(self, method: str, error_code: int = 429, retry_after: int = None, times: int = 1):
+        """Следующие times вызовов method получат ошибку (429 с retry_after - flood limit Telegram)."""
+        for _ in range(times):
+            self._failures.append((method, error_code, retry_after))
+
+    def _failure(self, method: str):
+        for entry in self._failures:
+            if entry[0] == method:
+                self._failures.remove(entry)
+                _, error_code, retry_after = entry
+                data = {"ok": False, "error_code": error_code, "description": f"Error {error_code}"}
+                if retry_after is not None:
+                    data["parameters"] = {"retry_after": retry_after}
+                return Response.json(data, error_code)
+        return None
+
+    def wait_for(self, chat_id: int, methods=("sendMessage",), match=None):
+        """Future с временем первого вызова одного из methods в чат (и text/caption, удовлетворяющим match)."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((set(methods), match, future))
+        return future
+
+    def _message(self, chat_id: int, params: dict) -> dict:
+        message = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        return message
+
+    def _record(self, method: str, params: dict):
+        now = time.perf_counter()
+        self.calls[method] = self.calls.get(method, 0) + 1
+        chat_id = int(params.get("chat_id", 0))
+        text = params.get("text") or params.get("caption") or ""
+        for listener in list(self.listeners):
+            listener(method, chat_id, text, now)
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        for entry in list(waiters):
+            methods, match, future = entry
+            if method in methods and (match is None or match(text)):
+                waiters.remove(entry)
+                if not future.done():
+                    future.set_result(now)
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        return list(self._updates)
+
+    async def _handle(self, request):
+        # /bot<token>/<method>
+        method = request.path.rsplit("/", 1)[-1]
+        params = _parse_params(request)
+        if self.rtt and method != "getUpdates":
+            await asyncio.sleep(self.rtt)
+        if method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "getMe":
+            result = BOT_USER
+        elif method == "setWebhook":
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if self.webhook:
+                await self.webhook.close()
+            self.webhook = WebhookPusher(
+                params["url"], params.get("secret_token", ""), int(params.get("max_connections") or 40)
+            )
+            result = True
+        elif method == "deleteWebhook":
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if self.webhook:
+                await self.webhook.close()
+                self.webhook = None
+            result = True
+        elif method in SEND_METHODS:
+            files = {name: value for name, value in params.items() if isinstance(value, bytes)}
+            if files:
+                self.uploads.append((method, int(params.get("chat_id", 0)), files))
+            failure = self._failure(method)
+            if failure is not None:
+                return failure
+            self._record(method, params)
+            result = self._message(int(params.get("chat_id", 0)), params)
+        else:
+            # setMyCommands, setChatMenuButton, ...
+            self.calls[method] = self.calls.get(method, 0) + 1
+            result = True
+        return Response.json({"ok": True, "result": result})
@@ -0,0 +1,97 @@
+"""Минимальный HTTP/1.1 сервер на asyncio (keep-alive, chunked-ответы) для фейковых API."""
+import asyncio
+import json
+from urllib.parse import urlsplit, parse_qs
+
+class Response:
+    """Ответ обработчика: body - bytes или async-итератор кусков (тогда chunked)."""
+
+    def __init__(self, status: int = 200, body=b"", content_type: str = "application/json"):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+    @classmethod
+    def json(cls, data, status: int = 200):
+        return cls(status, json.dumps(data).encode())
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = b""
+    if "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    return Request(method, target, headers, body)
+
+def connection_handler(handle):
+    """
+    Оборачивает async handle(Request) -> Response в обработчик соединения asyncio.start_server.
+    await serve.close() закрывает открытые keep-alive соединения и ждет их обработчики.
+    """
+    connections = {}
+
+    async def serve(reader, writer):
+        connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                response = await handle(request)
+                head = f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'OK')}\r\n" \
+                       f"Content-Type: {response.content_type}\r\n"
+                if isinstance(response.body, bytes):
+                    writer.write(f"{head}Content-Length: {len(response.body)}\r\n\r\n".encode() + response.body)
+                    await writer.drain()
+                    continue
+                writer.write(f"{head}Transfer-Encoding: chunked\r\n\r\n".encode())
+                async for chunk in response.body:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def close():
+        for writer in list(connections.values()):
+            writer.close()
+        await asyncio.gather(*connections, return_exceptions=True)
+
+    serve.close = close
+    return serve
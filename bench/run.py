@@ -0,0 +1,334 @@
+"""
+Нагрузочный бенчмарк бота: настоящий Application из bot/main.py против фейкового Bot API
+и фейкового Docker. Для каждого сценария и уровня параллельности считает пропускную способность
+и p50/p99 задержки, результат пишет в JSON (сравнение версий - bench/compare.py).
+
+    python -m bench.run
+    python -m bench.run --scenarios status,logs --concurrency 1,8,32 --requests 100
+    python -m bench.run --transport webhook
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from bench.fake_docker import FakeDocker
+from bench.fake_telegram import FakeTelegram
+
+BENCH_USER_ID = 42
+REQUEST_TIMEOUT = 30
+# Уникальный чат на каждый запрос - ответ однозначно сопоставляется с командой
+_chat_ids = itertools.count(10 ** 6)
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(scenario: str, concurrency: int, latencies: list, errors: int, duration: float, unit: str) -> dict:
+    values = sorted(latencies)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(values) + errors,
+        "ok": len(values),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput": round(len(values) / duration, 2) if duration > 0 else 0.0,
+        "throughput_unit": unit,
+        "latency_ms": {
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+            "max": round(values[-1] * 1000, 2) if values else 0.0,
+            "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        },
+    }
+
+class Bench:
+    def __init__(self, telegram: FakeTelegram, docker: FakeDocker, hostname: str):
+        self.telegram = telegram
+        self.docker = docker
+        self.hostname = hostname
+
+    # --- Команды: замкнутый цикл, concurrency "пользователей" шлют команду и ждут ответа ---
+
+    async def command(self, text: str, methods=("sendMessage",)) -> float:
+        chat_id = next(_chat_ids)
+        reply = self.telegram.wait_for(chat_id, methods)
+        started = self.telegram.inject(text, chat_id)
+        return await asyncio.wait_for(reply, REQUEST_TIMEOUT) - started
+
+    async def closed_loop(self, scenario: str, concurrency: int, total: int, warmup: int, one) -> dict:
+        for _ in range(warmup):
+            await one()
+        counter = itertools.count()
+        latencies, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            while next(counter) < total:
+                try:
+                    latencies.append(await one())
+                except asyncio.TimeoutError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(scenario, concurrency, latencies, errors, time.perf_counter() - started, "req/s")
+
+    async def run_status(self, concurrency, total, warmup):
+        return await self.closed_loop("status", concurrency, total, warmup, lambda: self.command("/status"))
+
+    async def run_logs(self, concurrency, total, warmup):
+        text = f"/logs {self.hostname} {self.docker.names[0]}"
+        return await self.closed_loop("logs", concurrency, total, warmup, lambda: self.command(text))
+
+    async def run_graph(self, concurrency, total, warmup):
+        return await self.closed_loop("graph", concurrency, total, warmup,
+                                      lambda: self.command("/graph", ("sendPhoto",)))
+
+    # --- /tail: concurrency подписчиков на один контейнер, задержка от строки в логе до Telegram ---
+
+    async def run_tail(self, concurrency, total, warmup, rate: float = 50):
+        from bot.config import TAIL_FLUSH_INTERVAL
+        from bot.logindex import log_feed
+        from bot.tail import TailSession
+
+        container = self.docker.names[0]
+        if log_feed:
+            deadline = time.monotonic() + 10
+            while not log_feed.follows(container) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        chats = [next(_chat_ids) for _ in range(concurrency)]
+        sessions = []
+        for chat_id in chats:
+            source = log_feed.lines(container) if log_feed and log_feed.follows(container) else None
+            session = TailSession(chat_id, container, self.hostname, source=source)
+            session.start()
+            sessions.append(session)
+        # Ждем, пока все подписчики откроют поток (свой LogFollower или общий поток индексатора)
+        await asyncio.sleep(1)
+
+        emitted, latencies = {}, []
+        pending = {chat_id: set() for chat_id in chats}
+        done = asyncio.Event()
+
+        def on_send(method, chat_id, text, now):
+            if chat_id not in pending:
+                return
+            for seq in map(int, re.findall(r"bench-mark-(\d+)", text)):
+                if seq in pending[chat_id]:
+                    pending[chat_id].discard(seq)
+                    latencies.append(now - emitted[seq])
+            if all(not waiting for waiting in pending.values()) and len(emitted) == total:
+                done.set()
+
+        self.telegram.listeners.append(on_send)
+        started = time.perf_counter()
+        try:
+            for seq in range(total):
+                emitted[seq] = time.perf_counter()
+                for waiting in pending.values():
+                    waiting.add(seq)
+                self.docker.emit(container, f"INFO request handled bench-mark-{seq}")
+                await asyncio.sleep(1 / rate)
+            try:
+                await asyncio.wait_for(done.wait(), TAIL_FLUSH_INTERVAL + REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.telegram.listeners.remove(on_send)
+            for session in sessions:
+                await session.stop()
+        errors = sum(len(waiting) for waiting in pending.values())
+        return summarize("tail", concurrency, latencies, errors, time.perf_counter() - started, "lines/s")
+
+    # --- Алерты: пачки по concurrency алертов разом в чат админа (как alarm_job) ---
+
+    async def run_alerts(self, concurrency, total, warmup):
+        from bot.outbox import outbox, PRIORITY_ALERT
+
+        sent, latencies = {}, []
+        waiting = set()
+        burst_done = asyncio.Event()
+
+        def on_send(method, chat_id, text, now):
+            if chat_id != BENCH_USER_ID:
+                return
+            # Очередь склеивает подряд идущие алерты - в одном сообщении может быть несколько
+            for seq in map(int, re.findall(r"bench-alert-(\d+)", text)):
+                if seq in waiting:
+                    waiting.discard(seq)
+                    latencies.append(now - sent[seq])
+            if not waiting:
+                burst_done.set()
+
+        self.telegram.listeners.append(on_send)
+        started = time.perf_counter()
+        errors = 0
+        try:
+            for first in range(0, total, concurrency):
+                burst_done.clear()
+                for seq in range(first, min(total, first + concurrency)):
+                    sent[seq] = time.perf_counter()
+                    waiting.add(seq)
+                    outbox.submit(BENCH_USER_ID, "send_message", PRIORITY_ALERT, True,
+                                  text=f"🚨 CPU load is high (bench-alert-{seq})")
+                try:
+                    await asyncio.wait_for(burst_done.wait(), REQUEST_TIMEOUT)
+                except asyncio.TimeoutError:
+                    errors += len(waiting)
+                    waiting.clear()
+        finally:
+            self.telegram.listeners.remove(on_send)
+        return summarize("alerts", concurrency, latencies, errors, time.perf_counter() - started, "alerts/s")
+
+SCENARIOS = ("status", "logs", "tail", "graph", "alerts")
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        return ""
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _configure(telegram: FakeTelegram, socket_path: str, workdir: str, transport: str):
+    """Окружение бота - до импорта bot.config."""
+    if transport == "webhook":
+        port = _free_port()
+        os.environ.update({
+            "UPDATE_MODE": "webhook",
+            "WEBHOOK_URL": f"http://127.0.0.1:{port}/telegram",
+            "WEBHOOK_LISTEN": f"127.0.0.1:{port}",
+        })
+    else:
+        os.environ["UPDATE_MODE"] = "polling"
+    os.environ.update({
+        "BOT_TOKEN": "123456:BENCH",
+        "TELEGRAM_USER_ID": str(BENCH_USER_ID),
+        "TELEGRAM_API_URL": telegram.url,
+        "DOCKER_SOCKET": socket_path,
+        "HISTORY_DIR": os.path.join(workdir, "history"),
+        "LOG_INDEX_DIR": os.path.join(workdir, "logindex"),
+        # Нет cgroup - статистика контейнеров идет через фейковый API
+        "CGROUP_ROOT": os.path.join(workdir, "no-cgroup"),
+        "ALERT_RULES_FILE": os.path.join(workdir, "alert_rules.json"),
+        "METRICS_LISTEN": "",
+        "FLEET_MODE": "",
+    })
+
+async def main(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bot-bench-") as workdir:
+        telegram = FakeTelegram(BENCH_USER_ID, rtt=args.rtt / 1000)
+        docker = FakeDocker(os.path.join(workdir, "docker.sock"), args.containers)
+        await telegram.start()
+        await docker.start()
+        _configure(telegram, docker.socket_path, workdir, args.transport)
+
+        from bot.main import build_application
+        from bot.handlers import HOSTNAME
+        from bot.config import OUTBOX_CHAT_RATE, OUTBOX_GLOBAL_RATE, TAIL_FLUSH_INTERVAL, SAMPLE_INTERVAL
+
+        from bot.webhook import create_server
+
+        # Тот же порядок, что в Application.run_polling: initialize -> post_init -> polling/webhook -> start
+        application = build_application()
+        webhook = create_server(application) if args.transport == "webhook" else None
+        await application.initialize()
+        await application.post_init(application)
+        if webhook:
+            await webhook.start()
+        else:
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+        await application.start()
+
+        bench = Bench(telegram, docker, HOSTNAME)
+        results = []
+        try:
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    run = getattr(bench, f"run_{scenario}")
+                    result = await run(concurrency, args.requests, args.warmup)
+                    results.append(result)
+                    latency = result["latency_ms"]
+                    print(f"{scenario:<8} c={concurrency:<4} {result['throughput']:>8.1f} {result['throughput_unit']:<9}"
+                          f" p50 {latency['p50']:>8.1f} ms  p99 {latency['p99']:>8.1f} ms  errors {result['errors']}",
+                          flush=True)
+        finally:
+            if webhook:
+                await webhook.stop()
+            else:
+                await application.updater.stop()
+            await application.stop()
+            await application.post_shutdown(application)
+            await application.shutdown()
+            await docker.stop()
+            await telegram.stop()
+
+    return {
+        "meta": {
+            "git": _git_revision(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "api_rtt_ms": args.rtt,
+            "transport": args.transport,
+            "config": {
+                "OUTBOX_GLOBAL_RATE": OUTBOX_GLOBAL_RATE,
+                "OUTBOX_CHAT_RATE": OUTBOX_CHAT_RATE,
+                "TAIL_FLUSH_INTERVAL": TAIL_FLUSH_INTERVAL,
+                "SAMPLE_INTERVAL": SAMPLE_INTERVAL,
+            },
+            "telegram_calls": telegram.calls,
+            "docker_calls": docker.calls,
+        },
+        "results": results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the bot against fake Telegram and Docker APIs.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated, any of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="requests (lines, alerts) per level")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests before each level")
+    parser.add_argument("--containers", type=int, default=3, help="fake running containers")
+    parser.add_argument("--rtt", type=float, default=0, help="simulated Bot API round-trip time, ms")
+    parser.add_argument("--transport", choices=("polling", "webhook"), default="polling",
+                        help="how the bot receives updates from the fake Bot API")
+    parser.add_argument("--out", help="result file (default: bench/results/<time>-<git>.json)")
+    args = parser.parse_args(argv)
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    out = args.out or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['git'] or 'local'}.json",
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {out}")
+    sys.exit(0 if all(r["errors"] == 0 for r in report["results"]) else 1)
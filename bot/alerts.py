@@ -1,52 +1,51 @@
 import time
 import socket  # <--- Добавляем импорт
+from bot.config import ALERT_COOLDOWN, ALERT_RULES_FILE
 from bot.logger import setup_logger
-from bot.metrics import get_cpu_usage, get_ram_usage, get_disk_usage
+from bot.anomaly import anomaly_engine, ANOMALY_ACTIVE_FOR
+from bot.rules import RuleEngine, load_rules
+from bot.events import event_watcher
 
 logger = setup_logger()
 
 # Получаем имя хоста один раз при старте
 HOSTNAME = socket.gethostname()
 
-# Хранилище времени последнего алерта
-last_alert_time = {
-    "cpu": 0,
-    "ram": 0,
-    "disk": 0
-}
+# Правила алертов загружаются и компилируются один раз при старте
+rule_engine = RuleEngine(load_rules(ALERT_RULES_FILE), default_cooldown=ALERT_COOLDOWN)
 
-def check_alerts(cooldown: int):
-    """Проверяет метрики и возвращает сообщение, если порог превышен."""
-    current_time = time.time()
-    alerts = []
-
-    # CPU Check
-    cpu = get_cpu_usage()
-    if cpu > 85 and (current_time - last_alert_time["cpu"] > cooldown):
-        msg = f"🔥 CPU > 85% (Current: {cpu}%)"
-        alerts.append(msg)
-        last_alert_time["cpu"] = current_time
-        logger.warning(f"CPU Alert triggered: {cpu}%")
-
-    # RAM Check
-    ram = get_ram_usage()
-    if ram["percent"] > 90 and (current_time - last_alert_time["ram"] > cooldown):
-        msg = f"💧 RAM > 90% (Current: {ram['percent']:.1f}%)"
-        alerts.append(msg)
-        last_alert_time["ram"] = current_time
-        logger.warning(f"RAM Alert triggered: {ram['percent']}%")
-
-    # Disk Check
-    disk = get_disk_usage()
-    if disk["percent"] > 90 and (current_time - last_alert_time["disk"] > cooldown):
-        msg = f"💾 Disk > 90% (Current: {disk['percent']:.1f}%)"
-        alerts.append(msg)
-        last_alert_time["disk"] = current_time
-        logger.warning(f"Disk Alert triggered: {disk['percent']}%")
+# Время последнего алерта по аномалиям (у правил свое состояние внутри RuleEngine)
+last_alert_time = {}
 
+def _format(alerts: list):
     # Если есть алерты, добавляем имя сервера в шапку
     if alerts:
         header = f"🚨 *ALERT from {HOSTNAME}*\n\n"
         return header + "\n".join(alerts)
-    
-    return None
\ No newline at end of file
+    return None
+
+def check_alerts(cooldown: int, snapshot: dict):
+    """
+    Прогоняет снимок метрик через правила и детектор аномалий.
+    Возвращает сообщение с новыми алертами или None.
+    cooldown - пауза между повторами алерта по аномалии (у правил - свой cooldown).
+    """
+    current_time = time.time()
+    alerts = [message for _, message in rule_engine.evaluate(snapshot, current_time)]
+
+    # Статистические аномалии (EWMA-норма, обновляется сэмплером на каждом замере)
+    for key, msg in anomaly_engine.recent(ANOMALY_ACTIVE_FOR, current_time).items():
+        state_key = f"anomaly:{key}"
+        if current_time - last_alert_time.get(state_key, 0) > cooldown:
+            alerts.append(msg)
+            last_alert_time[state_key] = current_time
+
+    return _format(alerts)
+
+def active_alerts(snapshot: dict):
+    """Что горит прямо сейчас (для /alerts): состояние правил и cooldown не меняются."""
+    alerts = [message for _, message in rule_engine.firing(snapshot)]
+    alerts += anomaly_engine.recent(ANOMALY_ACTIVE_FOR).values()
+    if event_watcher:
+        alerts += event_watcher.active()
+    return _format(alerts)
@@ -0,0 +1,179 @@
+import math
+import time
+from bot.config import ANOMALY_ALPHA, ANOMALY_SIGMA, ANOMALY_WARMUP, ANOMALY_SEASONAL, CHECK_INTERVAL, SAMPLE_INTERVAL
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Минимальное отклонение от нормы, ниже которого всплеск не считается аномалией
+# (игнорируем idle-флуктуации: CPU 2% -> 6% это 5 сигм, но не проблема)
+MIN_DELTA = {
+    "cpu": 20.0,
+    "ram": 10.0,
+    "load1": 1.0,
+    "disk_growth": 0.05,
+    # Ряды контейнеров: containers.<имя>.cpu (100% = ядро) и containers.<имя>.mem_percent
+    "containers.*.cpu": 20.0,
+    "containers.*.mem_percent": 10.0,
+}
+DEFAULT_MIN_DELTA = 0.0
+# Метрики контейнеров из snapshot["containers"], которые проверяет детектор
+CONTAINER_SERIES = ("cpu", "mem_percent")
+
+# Сезонная норма: корзина на каждый час недели, помнит примерно столько последних недель
+WEEK = 7 * 24 * 3600
+SEASONAL_WEEKS = 4
+
+def _min_delta(key: str) -> float:
+    if key.startswith("containers."):
+        key = "containers.*." + key.rpartition(".")[2]
+    return MIN_DELTA.get(key, DEFAULT_MIN_DELTA)
+
+class Ewma:
+    """
+    Экспоненциально взвешенные среднее и дисперсия - O(1) на точку, O(1) памяти.
+    Старые данные забываются с весом (1 - alpha), поэтому норма подстраивается под дрейф нагрузки.
+    """
+
+    __slots__ = ("alpha", "mean", "var", "count")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, x: float):
+        if self.count == 0:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + diff * incr)
+        self.count += 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var)
+
+class _SeasonalBucket(Ewma):
+    """Норма одного часа недели; started - когда корзина получила первую точку."""
+
+    __slots__ = ("started",)
+
+    def __init__(self, alpha: float, started: float):
+        super().__init__(alpha)
+        self.started = started
+
+class AnomalyEngine:
+    """
+    Потоковый детектор аномалий для всех метрик снимка, включая CPU и память каждого контейнера.
+    Каждое значение сравнивается с нормой (EWMA) до ее обновления: z = (x - mean) / std.
+    Опционально держит сезонную норму по часу недели (168 корзин) - тогда ночной бэкап
+    в 03:00 со временем перестает быть "аномалией".
+    """
+
+    def __init__(self, alpha: float, sigma: float, warmup: int, seasonal: bool = False,
+                 sample_interval: float = 5.0):
+        self.alpha = alpha
+        self.sigma = sigma
+        self.warmup = warmup
+        self.seasonal = seasonal
+        # Корзина получает 3600 / sample_interval точек за визит раз в неделю: чтобы она помнила
+        # SEASONAL_WEEKS недель, а не последние минуты часа, ее alpha во столько же раз меньше
+        self.bucket_alpha = min(alpha, sample_interval / (SEASONAL_WEEKS * 3600))
+        self._baselines = {}
+        self._seasonal = {}
+        self._prev_disk = None
+        # Последняя обнаруженная аномалия по каждой метрике: key -> (ts, message)
+        self.active = {}
+
+    def _baseline(self, key: str, ts: float) -> tuple:
+        """Общая норма метрики и сезонная корзина текущего часа недели (или None)."""
+        base = self._baselines.get(key)
+        if base is None:
+            base = self._baselines[key] = Ewma(self.alpha)
+        if not self.seasonal:
+            return base, None
+        buckets = self._seasonal.get(key)
+        if buckets is None:
+            buckets = self._seasonal[key] = [None] * 168
+        t = time.localtime(ts)
+        slot = t.tm_wday * 24 + t.tm_hour
+        bucket = buckets[slot]
+        if bucket is None:
+            bucket = buckets[slot] = _SeasonalBucket(self.bucket_alpha, ts)
+        return base, bucket
+
+    def _warm(self, bucket: _SeasonalBucket, ts: float) -> bool:
+        """Корзина - норма, только если видела этот час хотя бы в двух неделях (прошел полный период)."""
+        return bucket.count >= self.warmup and ts - bucket.started >= WEEK
+
+    def observe(self, key: str, value: float, ts: float):
+        """Обновляет норму метрики и возвращает описание аномалии или None."""
+        base, bucket = self._baseline(key, ts)
+        ref = bucket if bucket is not None and self._warm(bucket, ts) else base
+
+        anomaly = None
+        if ref.count >= self.warmup:
+            delta = value - ref.mean
+            std = ref.std
+            if delta > _min_delta(key) and delta > self.sigma * std:
+                z = delta / std if std else float("inf")
+                anomaly = (
+                    f"📈 Anomaly: {key} = {value:.2f} "
+                    f"(norm {ref.mean:.2f} ± {std:.2f}, {z:.1f}σ)"
+                )
+
+        base.update(value)
+        if bucket is not None:
+            bucket.update(value)
+        if anomaly:
+            self.active[key] = (ts, anomaly)
+            logger.warning(anomaly)
+        return anomaly
+
+    def process(self, snapshot: dict):
+        """Подписчик sampler: прогоняет все метрики снимка через детектор."""
+        ts = snapshot["ts"]
+        keys = set()
+        for key, value in self.series(snapshot):
+            self.observe(key, value, ts)
+            keys.add(key)
+        # Нормы остановленных и удаленных контейнеров не копим
+        for key in [key for key in self._baselines if key.startswith("containers.") and key not in keys]:
+            del self._baselines[key]
+            self._seasonal.pop(key, None)
+            self.active.pop(key, None)
+
+    def series(self, snapshot: dict):
+        """Ряды для анализа: (ключ, значение). Скорость роста диска считаем по соседним снимкам."""
+        yield "cpu", snapshot["cpu"]
+        yield "ram", snapshot["ram"]["percent"]
+        yield "load1", snapshot["load"][0]
+
+        used, ts = snapshot["disk"]["used_gb"], snapshot["ts"]
+        if self._prev_disk is not None:
+            prev_used, prev_ts = self._prev_disk
+            if ts > prev_ts:
+                # ГБ в минуту
+                yield "disk_growth", (used - prev_used) * 60 / (ts - prev_ts)
+        self._prev_disk = (used, ts)
+
+        # Первый замер контейнера - без cpu (скорость считается по двум замерам)
+        for name, stats in (snapshot.get("containers") or {}).items():
+            for metric in CONTAINER_SERIES:
+                if stats.get(metric) is not None:
+                    yield f"containers.{name}.{metric}", stats[metric]
+
+    def recent(self, window: float, now: float = None) -> dict:
+        """Аномалии, обнаруженные за последние window секунд: key -> message."""
+        now = time.time() if now is None else now
+        return {key: msg for key, (ts, msg) in self.active.items() if now - ts <= window}
+
+# Общий детектор: обновляется сэмплером, читается check_alerts
+anomaly_engine = AnomalyEngine(ANOMALY_ALPHA, ANOMALY_SIGMA, ANOMALY_WARMUP, ANOMALY_SEASONAL, SAMPLE_INTERVAL)
+
+# Аномалия остается "активной" до следующей плановой проверки алертов
+ANOMALY_ACTIVE_FOR = CHECK_INTERVAL
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from collections import OrderedDict
+from bot.config import RESPONSE_CACHE_SIZE, CACHE_TTL_STATUS, CACHE_TTL_PS, CACHE_TTL_LOGS
+
+class ResponseCache:
+    """
+    Кэш ответов read-only команд перед хендлерами. Ключ - кортеж (команда, аргументы...),
+    TTL задается по команде (0 - команда не кэшируется), при переполнении вытесняется
+    давно не запрошенный ключ (LRU).
+    Одновременные одинаковые запросы (single-flight) ждут одно вычисление: оно идет отдельной
+    задачей, поэтому отмена одного хендлера не обрывает его для остальных. Ошибки не кэшируются.
+    Изменяющие команды (/restart, /fix) сбрасывают ключи через invalidate(); результат, посчитанный
+    до сброса, в кэш уже не попадает (поколение команды сменилось).
+    """
+
+    def __init__(self, max_entries: int, ttls: dict):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        # Ключ -> (monotonic-время истечения, значение); порядок - от давно запрошенных к свежим
+        self._entries = OrderedDict()
+        # Ключ -> задача вычисления, которую ждут все одинаковые запросы
+        self._inflight = {}
+        # Команда -> номер поколения, растет при каждом invalidate()
+        self._generation = {}
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key: tuple, compute):
+        """Значение по ключу; compute - функция без аргументов, возвращающая корутину."""
+        ttl = self.ttls.get(key[0], 0)
+        if ttl <= 0 or self.max_entries <= 0:
+            return await compute()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            generation = self._generation.get(key[0], 0)
+            task.add_done_callback(lambda done: self._store(key, ttl, generation, done))
+        return await asyncio.shield(task)
+
+    def _store(self, key: tuple, ttl: float, generation: int, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # exception() заодно помечает ошибку полученной, если все ждавшие уже отменены
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._generation.get(key[0], 0) != generation:
+            return
+        self._entries[key] = (time.monotonic() + ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, command: str, *args):
+        """Сбрасывает ключи команды (или только с данными аргументами) и вычисления в процессе."""
+        prefix = (command,) + args
+        self._generation[command] = self._generation.get(command, 0) + 1
+        for key in [key for key in self._entries if key[:len(prefix)] == prefix]:
+            del self._entries[key]
+        # Идущее вычисление доработает для тех, кто его уже ждет, новые запросы начнут свое
+        for key in [key for key in self._inflight if key[:len(prefix)] == prefix]:
+            del self._inflight[key]
+        self.stats["invalidations"] += 1
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, {
+    "status": CACHE_TTL_STATUS,
+    "ps": CACHE_TTL_PS,
+    "logs": CACHE_TTL_LOGS,
+})
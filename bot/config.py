@@ -6,9 +6,153 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 TELEGRAM_USER_ID = int(os.getenv("TELEGRAM_USER_ID", "0"))
+# Адрес Bot API (пусто - api.telegram.org), например, свой telegram-bot-api сервер
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "60"))
 ALERT_COOLDOWN = int(os.getenv("ALERT_COOLDOWN", "300"))
 
+# JSON-файл с правилами алертов (если файла нет - пороги по умолчанию: CPU 85%, RAM 90%, Disk 90%)
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE", "alert_rules.json")
+
+# Детектор аномалий: вес новой точки в EWMA, порог в сигмах, сколько замеров до первых срабатываний,
+# сезонная норма по часу недели
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+ANOMALY_SIGMA = float(os.getenv("ANOMALY_SIGMA", "3"))
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "30"))
+ANOMALY_SEASONAL = os.getenv("ANOMALY_SEASONAL", "false").lower() in ("1", "true", "yes")
+
+# Фоновый сбор метрик: период замера и максимальный возраст снимка для команд
+SAMPLE_INTERVAL = float(os.getenv("SAMPLE_INTERVAL", "5"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "15"))
+
+# История метрик на диске (пустой HISTORY_DIR - выключено) и срок хранения каждого уровня
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+HISTORY_RAW_HOURS = float(os.getenv("HISTORY_RAW_HOURS", "24"))
+HISTORY_MINUTE_DAYS = float(os.getenv("HISTORY_MINUTE_DAYS", "7"))
+HISTORY_HOUR_DAYS = float(os.getenv("HISTORY_HOUR_DAYS", "365"))
+
+# Сколько готовых PNG графиков держать в кэше
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "16"))
+
+# Заранее загружать matplotlib в фоне после старта (иначе - при первом /graph)
+GRAPH_PREWARM = os.getenv("GRAPH_PREWARM", "false").lower() in ("1", "true", "yes")
+
+# Бюджет времени запуска (мс): от старта процесса до начала приема обновлений
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+# Выполнение внешних команд: лимит одновременных процессов, таймаут (сек) и лимит вывода (байт)
+EXEC_CONCURRENCY = int(os.getenv("EXEC_CONCURRENCY", "4"))
+EXEC_TIMEOUT = float(os.getenv("EXEC_TIMEOUT", "120"))
+EXEC_MAX_OUTPUT = int(os.getenv("EXEC_MAX_OUTPUT", str(1024 * 1024)))
+
+# Docker Engine API: путь к сокету, размер пула keep-alive соединений, таймаут запроса (сек)
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+DOCKER_POOL_SIZE = int(os.getenv("DOCKER_POOL_SIZE", "4"))
+DOCKER_API_TIMEOUT = float(os.getenv("DOCKER_API_TIMEOUT", "30"))
+
+# /tail: как часто отправлять накопленные строки (сек), размер сообщения (символы), буфер строк
+TAIL_FLUSH_INTERVAL = float(os.getenv("TAIL_FLUSH_INTERVAL", "3"))
+TAIL_MESSAGE_LIMIT = int(os.getenv("TAIL_MESSAGE_LIMIT", "3500"))
+TAIL_QUEUE_LINES = int(os.getenv("TAIL_QUEUE_LINES", "2000"))
+
+# /dl_logs: строк по умолчанию, сжатие (gzip / zstd), размер части (байт, лимит Telegram - 50 МБ),
+# сколько байт архива держать в памяти до сброса во временный файл
+DL_LOGS_DEFAULT_LINES = int(os.getenv("DL_LOGS_DEFAULT_LINES", "2000"))
+DL_LOGS_COMPRESSION = os.getenv("DL_LOGS_COMPRESSION", "gzip").lower()
+DL_LOGS_PART_SIZE = int(os.getenv("DL_LOGS_PART_SIZE", str(45 * 1024 * 1024)))
+DL_LOGS_SPOOL_SIZE = int(os.getenv("DL_LOGS_SPOOL_SIZE", str(4 * 1024 * 1024)))
+
+# Индекс логов для /grep: каталог (по умолчанию пусто - выключен: индексатор постоянно читает логи
+# всех запущенных контейнеров), общий размер и размер сегмента (МБ),
+# за сколько часов подтянуть логи нового контейнера, как часто искать новые контейнеры (сек)
+LOG_INDEX_DIR = os.getenv("LOG_INDEX_DIR", "")
+LOG_INDEX_MAX_MB = float(os.getenv("LOG_INDEX_MAX_MB", "256"))
+LOG_INDEX_SEGMENT_MB = float(os.getenv("LOG_INDEX_SEGMENT_MB", "16"))
+LOG_INDEX_BACKFILL_HOURS = float(os.getenv("LOG_INDEX_BACKFILL_HOURS", "24"))
+LOG_INDEX_SCAN_INTERVAL = float(os.getenv("LOG_INDEX_SCAN_INTERVAL", "30"))
+GREP_MAX_RESULTS = int(os.getenv("GREP_MAX_RESULTS", "30"))
+
+# Статистика контейнеров (/top): корень cgroup v2 и /proc хоста (в контейнере - смонтированные с хоста)
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+HOST_PROC = os.getenv("HOST_PROC", "/proc")
+# /net: sysfs хоста (скорость линка) и как часто пересчитывать TCP-сокеты по состояниям (сек, 0 - не считать)
+HOST_SYS = os.getenv("HOST_SYS", "/sys")
+TCP_STATES_INTERVAL = float(os.getenv("TCP_STATES_INTERVAL", "15"))
+
+# /procs: окно замера CPU процессов (сек) и после какой паузы окно снимается заново
+PROCS_WINDOW = float(os.getenv("PROCS_WINDOW", "1"))
+PROCS_MAX_AGE = float(os.getenv("PROCS_MAX_AGE", "30"))
+
+# Режим флота: "" - каждый бот отвечает сам; "coordinator" - один бот отвечает сводной таблицей
+# за всех; "agent" - бот отправляет сводки координатору и не отвечает на /status, /cpu и т.д.
+FLEET_MODE = os.getenv("FLEET_MODE", "").lower()
+FLEET_LISTEN = os.getenv("FLEET_LISTEN", "0.0.0.0:8765")
+FLEET_COORDINATOR = os.getenv("FLEET_COORDINATOR", "127.0.0.1:8765")
+FLEET_TOKEN = os.getenv("FLEET_TOKEN", "")
+# Через сколько секунд без сводки хост помечается как не отвечающий
+FLEET_STALE = float(os.getenv("FLEET_STALE", "30"))
+
+# Очередь исходящих сообщений: общий лимит (msg/s), лимит и запас на чат, максимум сообщений /tail в очереди чата
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = float(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_MAX_PENDING = int(os.getenv("OUTBOX_MAX_PENDING", "100"))
+
+# /bash: сколько команд одновременно на хосте, лимит времени (сек, 0 - без лимита),
+# как часто обновлять сообщение с выводом (сек), сколько байт начала и конца вывода показывать
+BASH_MAX_JOBS = int(os.getenv("BASH_MAX_JOBS", "3"))
+BASH_TIMEOUT = float(os.getenv("BASH_TIMEOUT", "3600"))
+BASH_EDIT_INTERVAL = float(os.getenv("BASH_EDIT_INTERVAL", "3"))
+BASH_HEAD_BYTES = int(os.getenv("BASH_HEAD_BYTES", "1024"))
+BASH_TAIL_BYTES = int(os.getenv("BASH_TAIL_BYTES", "2560"))
+
+# Эндпоинт /metrics для Prometheus ("0.0.0.0:9101"); пусто - выключен
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "")
+
+# Инструментация: как часто замерять опоздание event loop (сек) и писать сводку /botstats в лог (сек, 0 - не писать)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+BOTSTATS_LOG_INTERVAL = float(os.getenv("BOTSTATS_LOG_INTERVAL", "0"))
+
+# Алерты по событиям Docker (падение, OOM, цикл перезапусков, unhealthy) без опроса демона:
+# сколько падений за окно (сек) считается циклом перезапусков, сколько смен health за окно - "миганием",
+# пауза между повторами алерта одного вида по контейнеру (сек)
+DOCKER_EVENTS = os.getenv("DOCKER_EVENTS", "true").lower() in ("1", "true", "yes")
+RESTART_LOOP_COUNT = int(os.getenv("RESTART_LOOP_COUNT", "3"))
+RESTART_LOOP_WINDOW = float(os.getenv("RESTART_LOOP_WINDOW", "300"))
+HEALTH_FLAP_COUNT = int(os.getenv("HEALTH_FLAP_COUNT", "4"))
+HEALTH_FLAP_WINDOW = float(os.getenv("HEALTH_FLAP_WINDOW", "600"))
+EVENT_ALERT_COOLDOWN = float(os.getenv("EVENT_ALERT_COOLDOWN", "300"))
+
+# /fix analyze: где смонтирован / хоста (пусто - бот видит ФС хоста), индекс размеров каталогов
+# (пусто - без индекса), потоки обхода, сколько файлов и каталогов показывать,
+# через сколько часов каталог обходится заново даже без изменений, до скольки МБ чистить журнал
+HOST_ROOT = os.getenv("HOST_ROOT", "")
+FIX_INDEX_FILE = os.getenv("FIX_INDEX_FILE", "data/diskindex.json")
+FIX_SCAN_WORKERS = int(os.getenv("FIX_SCAN_WORKERS", "8"))
+FIX_TOP_K = int(os.getenv("FIX_TOP_K", "10"))
+FIX_INDEX_MAX_HOURS = float(os.getenv("FIX_INDEX_MAX_HOURS", "24"))
+FIX_JOURNAL_MAX_MB = int(os.getenv("FIX_JOURNAL_MAX_MB", "500"))
+
+# Как получать апдейты: "polling" (getUpdates) или "webhook" - Telegram сам присылает их на WEBHOOK_URL
+# (https, порт 443/80/88/8443), бот слушает WEBHOOK_LISTEN. Секрет проверяется в каждом запросе
+# (пусто - случайный на каждый запуск); WEBHOOK_CERT/WEBHOOK_KEY - свой TLS без reverse proxy.
+# WEBHOOK_CONCURRENCY - сколько апдейтов обрабатывается одновременно
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0:8443")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_CERT = os.getenv("WEBHOOK_CERT", "")
+WEBHOOK_KEY = os.getenv("WEBHOOK_KEY", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "16"))
+
+# Кэш ответов read-only команд: сколько ключей держать и TTL по командам (сек, 0 - не кэшировать).
+# Одновременные одинаковые запросы ждут одно вычисление; /restart и /fix сбрасывают затронутые ключи
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "128"))
+CACHE_TTL_STATUS = float(os.getenv("CACHE_TTL_STATUS", "2"))
+CACHE_TTL_PS = float(os.getenv("CACHE_TTL_PS", "5"))
+CACHE_TTL_LOGS = float(os.getenv("CACHE_TTL_LOGS", "5"))
+
 def is_authorized(user_id: int) -> bool:
     """Проверяет, есть ли доступ у пользователя."""
     return user_id == TELEGRAM_USER_ID
\ No newline at end of file
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import psutil
+from bot.config import CGROUP_ROOT, HOST_PROC
+from bot.docker_api import docker, DockerError, DockerUnavailable
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Где лежит cgroup контейнера: systemd-драйвер и cgroupfs-драйвер Docker
+CGROUP_LAYOUTS = ("system.slice/docker-{id}.scope", "docker/{id}")
+
+def _read_kv(path: str) -> dict:
+    """Файлы вида 'key value' построчно (cpu.stat, memory.stat)."""
+    out = {}
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            out[key] = int(value)
+    return out
+
+def _read_int(path: str):
+    with open(path) as f:
+        value = f.read().strip()
+    return None if value == "max" else int(value)
+
+def _read_io(path: str) -> tuple:
+    """io.stat: '8:0 rbytes=1 wbytes=2 ...' по устройствам -> (прочитано, записано) байт."""
+    read = written = 0
+    with open(path) as f:
+        for line in f:
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "rbytes":
+                    read += int(value)
+                elif key == "wbytes":
+                    written += int(value)
+    return read, written
+
+def _read_net(pid: str) -> tuple:
+    """/proc/<pid>/net/dev в сетевом namespace контейнера -> (принято, отправлено) байт без lo."""
+    rx = tx = 0
+    with open(os.path.join(HOST_PROC, pid, "net", "dev")) as f:
+        for line in f.readlines()[2:]:
+            iface, _, data = line.partition(":")
+            if iface.strip() == "lo":
+                continue
+            fields = data.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+class ContainerStatsCollector:
+    """
+    CPU / память / сеть / блочный I/O всех запущенных контейнеров за один проход.
+    Основной путь - файлы cgroup v2 напрямую (один listdir и несколько read на контейнер);
+    если cgroup хоста не видна - один проход не-потоковых запросов stats к Docker API.
+    Скорости считаются как разница счетчиков между проходами (как DiskIOTracker).
+    """
+
+    def __init__(self, cgroup_root: str):
+        self.cgroup_root = cgroup_root
+        self.use_cgroup = os.path.exists(os.path.join(cgroup_root, "cgroup.controllers"))
+        self._paths = {}
+        # id -> (ts, cpu_usec, rx, tx, read, written)
+        self._state = {}
+        self._warned = False
+
+    def _cgroup_path(self, cid: str):
+        path = self._paths.get(cid)
+        if path is None:
+            for layout in CGROUP_LAYOUTS:
+                candidate = os.path.join(self.cgroup_root, layout.format(id=cid))
+                if os.path.isdir(candidate):
+                    path = self._paths[cid] = candidate
+                    break
+        return path
+
+    def _read_cgroup(self, cid: str):
+        """Сырые счетчики контейнера из cgroup v2 или None, если cgroup не найдена."""
+        path = self._cgroup_path(cid)
+        if path is None:
+            return None
+        cpu_usec = _read_kv(os.path.join(path, "cpu.stat"))["usage_usec"]
+        memory = _read_int(os.path.join(path, "memory.current"))
+        # Как docker stats: page cache (inactive_file) не считаем занятой памятью
+        memory -= _read_kv(os.path.join(path, "memory.stat")).get("inactive_file", 0)
+        limit = _read_int(os.path.join(path, "memory.max"))
+        read, written = _read_io(os.path.join(path, "io.stat"))
+        rx = tx = None
+        try:
+            with open(os.path.join(path, "cgroup.procs")) as f:
+                pid = f.readline().strip()
+            if pid:
+                rx, tx = _read_net(pid)
+        except (OSError, ValueError, IndexError):
+            # /proc хоста не смонтирован - сеть не показываем
+            pass
+        return cpu_usec, max(0, memory), limit, rx, tx, read, written
+
+    def _read_all(self, containers: list) -> dict:
+        """Блокирующее чтение cgroup всех контейнеров (в рабочем потоке)."""
+        counters = {}
+        for cid, name in containers:
+            try:
+                raw = self._read_cgroup(cid)
+            except (OSError, KeyError, ValueError):
+                # Контейнер остановился между списком и чтением
+                self._paths.pop(cid, None)
+                continue
+            if raw is not None:
+                counters[cid] = (name,) + raw
+        return counters
+
+    @staticmethod
+    def _parse_stats(name: str, stats: dict) -> tuple:
+        """Ответ /containers/{id}/stats -> те же сырые счетчики, что из cgroup."""
+        cpu_usec = stats["cpu_stats"]["cpu_usage"]["total_usage"] // 1000
+        memory_stats = stats.get("memory_stats") or {}
+        extra = memory_stats.get("stats") or {}
+        memory = memory_stats.get("usage", 0) - extra.get("inactive_file", extra.get("total_inactive_file", 0))
+        limit = memory_stats.get("limit")
+        networks = (stats.get("networks") or {}).values()
+        rx = sum(n.get("rx_bytes", 0) for n in networks)
+        tx = sum(n.get("tx_bytes", 0) for n in networks)
+        read = written = 0
+        for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or ():
+            op = entry.get("op", "").lower()
+            if op == "read":
+                read += entry.get("value", 0)
+            elif op == "write":
+                written += entry.get("value", 0)
+        return name, cpu_usec, max(0, memory), limit, rx, tx, read, written
+
+    async def _sweep_api(self, containers: list) -> dict:
+        async def one(cid, name):
+            try:
+                return cid, self._parse_stats(name, await docker.stats(cid))
+            except (DockerError, KeyError, TypeError):
+                return cid, None
+        results = await asyncio.gather(*(one(cid, name) for cid, name in containers))
+        return {cid: raw for cid, raw in results if raw is not None}
+
+    async def collect(self, now: float) -> dict:
+        """Источник сэмплера: {имя: {cpu, mem_mb, mem_limit_mb, mem_percent, net/blk скорости}}."""
+        try:
+            listed = await docker.containers()
+        except DockerUnavailable as e:
+            if not self._warned:
+                logger.warning(f"Container stats disabled: Docker socket unavailable ({e})")
+                self._warned = True
+            return {}
+        containers = [(c["Id"], c["Names"][0].lstrip("/")) for c in listed]
+        if self.use_cgroup:
+            counters = await asyncio.to_thread(self._read_all, containers)
+            missing = [(cid, name) for cid, name in containers if cid not in counters]
+            if missing and len(missing) == len(containers):
+                # Не нашли ни одной cgroup (другой драйвер/rootless) - дальше только через API
+                logger.warning("Container cgroups not found under CGROUP_ROOT, using the Docker stats API.")
+                self.use_cgroup = False
+                counters = await self._sweep_api(containers)
+        else:
+            counters = await self._sweep_api(containers)
+        return self._rates(counters, now)
+
+    def _rates(self, counters: dict, now: float) -> dict:
+        host_total = psutil.virtual_memory().total
+        out = {}
+        for cid, (name, cpu_usec, memory, limit, rx, tx, read, written) in counters.items():
+            # Лимит больше объема RAM хоста = лимита нет
+            limit = limit if limit and limit < host_total else host_total
+            stats = {
+                "mem_mb": memory / (1024 ** 2),
+                "mem_limit_mb": limit / (1024 ** 2),
+                "mem_percent": memory * 100 / limit,
+            }
+            prev = self._state.get(cid)
+            self._state[cid] = (now, cpu_usec, rx, tx, read, written)
+            if prev is not None and now > prev[0]:
+                dt = now - prev[0]
+                # 100% = одно ядро, как в docker stats
+                stats["cpu"] = max(0, cpu_usec - prev[1]) / (dt * 1e4)
+                if rx is not None and prev[2] is not None:
+                    stats["net_rx_kbps"] = max(0, rx - prev[2]) / dt / 1024
+                    stats["net_tx_kbps"] = max(0, tx - prev[3]) / dt / 1024
+                stats["blk_read_kbps"] = max(0, read - prev[4]) / dt / 1024
+                stats["blk_write_kbps"] = max(0, written - prev[5]) / dt / 1024
+            out[name] = stats
+        # Удаленные контейнеры не держим в таблице
+        for cid in self._state.keys() - counters.keys():
+            del self._state[cid]
+            self._paths.pop(cid, None)
+        return out
+
+# Общий сборщик: подключается к сэмплеру как источник snapshot["containers"]
+container_stats = ContainerStatsCollector(CGROUP_ROOT)
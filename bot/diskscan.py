@@ -0,0 +1,335 @@
+import asyncio
+import heapq
+import json
+import os
+import queue
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bot.config import (
+    HOST_ROOT, FIX_INDEX_FILE, FIX_SCAN_WORKERS, FIX_TOP_K, FIX_INDEX_MAX_HOURS, FIX_JOURNAL_MAX_MB,
+)
+from bot.docker_api import container_names, disk_usage
+from bot.executor import run_command
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Файлы не меньше этого размера хранятся в индексе поименно и перепроверяются stat'ом
+# даже в неизменившихся каталогах (mtime каталога не меняется, когда дописывают в файл)
+BIG_FILE = 1024 ** 2
+# Каталог, у которого один подкаталог занимает больше этой доли, в отчет не попадает - показываем подкаталог
+PASS_THROUGH = 0.8
+# json-лог контейнера: /var/lib/docker/containers/<id>/<id>-json.log
+CONTAINER_LOG_RE = re.compile(r"/containers/([0-9a-f]{64})/\1-json\.log$")
+JOURNAL_DIR = "/var/log/journal"
+
+# Запись индекса: [mtime_ns каталога, байт в мелких файлах, число файлов, {имя: байт} крупных, [подкаталоги], когда обходили]
+MTIME, SMALL, FILES, BIG, SUBDIRS, WALKED = range(6)
+
+def _usage(st) -> int:
+    """Место на диске, как у du (разреженные файлы не раздуваются)."""
+    return st.st_blocks * 512
+
+def _share(st) -> int:
+    """Доля файла с жесткими ссылками: все ссылки внутри обхода вместе дают размер файла один раз."""
+    return _usage(st) // max(1, st.st_nlink)
+
+def _scan_dir(path: str, device: int, cached, max_age: float, now: float):
+    """
+    Один каталог (в потоке пула). Возвращает (запись индекса, обходили ли заново)
+    или None, если каталог на другой файловой системе (как du -x).
+    Если mtime не изменился, список имен берется из индекса и перечитываются только крупные файлы.
+    """
+    st = os.stat(path, follow_symlinks=False)
+    if st.st_dev != device:
+        return None
+    if cached and cached[MTIME] == st.st_mtime_ns and now - cached[WALKED] < max_age:
+        big = {}
+        for name in cached[BIG]:
+            try:
+                big[name] = _share(os.stat(os.path.join(path, name), follow_symlinks=False))
+            except OSError:
+                continue
+        return [st.st_mtime_ns, cached[SMALL], cached[FILES], big, cached[SUBDIRS], cached[WALKED]], False
+
+    small = files = 0
+    big, subdirs = {}, []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                size = _share(entry.stat(follow_symlinks=False))
+            except OSError:
+                continue
+            files += 1
+            if size >= BIG_FILE:
+                big[entry.name] = size
+            else:
+                small += size
+    return [st.st_mtime_ns, small, files, big, subdirs, now], True
+
+def _under(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip("/") + "/")
+
+class DiskScanner:
+    """
+    Поиск того, что съело диск: параллельный обход каталогов (os.scandir в пуле потоков),
+    top-K крупнейших файлов и каталогов в ограниченных кучах и индекс размеров на диске.
+    Повторный анализ заново читает только каталоги с изменившимся mtime (и те, что не обходили
+    дольше FIX_INDEX_MAX_HOURS), у остальных перепроверяет stat'ом лишь крупные файлы.
+    """
+
+    def __init__(self, index_path: str, workers: int, top_k: int, max_age: float, host_root: str = ""):
+        self.index_path = index_path
+        self.workers = workers
+        self.top_k = top_k
+        self.max_age = max_age
+        # Где в файловой системе бота смонтирован / хоста ("" - бот видит ФС хоста напрямую)
+        self.host_root = host_root.rstrip("/")
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def real_path(self, path: str) -> str:
+        """Путь на хосте -> путь в файловой системе бота."""
+        path = os.path.normpath(os.path.join("/", path))
+        if not self.host_root:
+            return path
+        return self.host_root if path == "/" else self.host_root + path
+
+    def host_path(self, real: str) -> str:
+        return real[len(self.host_root):] or "/" if self.host_root else real
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Disk index {self.index_path} is unreadable, rebuilding: {e}")
+            return {}
+
+    def _save(self, index: dict):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+
+    def scan(self, path: str = "/") -> dict:
+        """Синхронный анализ (вызывать из рабочего потока)."""
+        started = time.perf_counter()
+        now = time.time()
+        root = self.real_path(path)
+        device = os.stat(root).st_dev
+        index = self._load() if self.index_path else {}
+
+        entries, walked, errors = {}, 0, 0
+        top_files = []
+        results = queue.SimpleQueue()
+        outstanding = 0
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="diskscan") as pool:
+            def submit(directory: str):
+                nonlocal outstanding
+                outstanding += 1
+                future = pool.submit(_scan_dir, directory, device, index.get(directory), self.max_age, now)
+                future.add_done_callback(lambda f: results.put((directory, f)))
+
+            submit(root)
+            while outstanding:
+                directory, future = results.get()
+                outstanding -= 1
+                try:
+                    result = future.result()
+                except OSError:
+                    # Нет прав или каталог удалили во время обхода
+                    errors += 1
+                    continue
+                if result is None:
+                    continue
+                entry, rewalked = result
+                entries[directory] = entry
+                walked += rewalked
+                for name, size in entry[BIG].items():
+                    item = (size, os.path.join(directory, name))
+                    if len(top_files) < self.top_k:
+                        heapq.heappush(top_files, item)
+                    elif item > top_files[0]:
+                        heapq.heapreplace(top_files, item)
+                for name in entry[SUBDIRS]:
+                    submit(os.path.join(directory, name))
+
+        # Размеры каталогов снизу вверх: дети глубже родителей
+        totals, max_child = {}, {}
+        for directory in sorted(entries, key=lambda p: p.count("/"), reverse=True):
+            entry = entries[directory]
+            total = totals.get(directory, 0) + entry[SMALL] + sum(entry[BIG].values())
+            totals[directory] = total
+            parent = os.path.dirname(directory)
+            if directory != root and parent in entries:
+                totals[parent] = totals.get(parent, 0) + total
+                max_child[parent] = max(max_child.get(parent, 0), total)
+        top_dirs = heapq.nlargest(self.top_k, (
+            (total, directory) for directory, total in totals.items()
+            if max_child.get(directory, 0) <= PASS_THROUGH * total
+        ))
+
+        if self.index_path:
+            # Каталоги вне обойденного поддерева (прошлые анализы других путей) остаются в индексе
+            merged = {p: e for p, e in index.items() if not _under(p, root)}
+            merged.update(entries)
+            try:
+                self._save(merged)
+            except OSError as e:
+                logger.error(f"Failed to save disk index: {e}")
+
+        journal = self.real_path(JOURNAL_DIR)
+        return {
+            "path": self.host_path(root),
+            "total": totals.get(root, 0),
+            "files": [(size, self.host_path(p)) for size, p in sorted(top_files, reverse=True)],
+            "dirs": [(size, self.host_path(p)) for size, p in top_dirs],
+            "journal": totals.get(journal),
+            "dirs_total": len(entries),
+            "dirs_walked": walked,
+            "errors": errors,
+            "seconds": time.perf_counter() - started,
+        }
+
+    async def analyze(self, path: str = "/"):
+        """Анализ в фоне + сводка Docker (что можно освободить) и имена контейнеров для их логов."""
+        async with self._lock:
+            report = await asyncio.to_thread(self.scan, path)
+        try:
+            report["docker"] = await disk_usage()
+            names = await container_names() if any(CONTAINER_LOG_RE.search(p) for _, p in report["files"]) else {}
+        except Exception as e:
+            logger.warning(f"Docker disk usage is unavailable: {e}")
+            report["docker"], names = None, {}
+        report["container_logs"] = {
+            p: names.get(match.group(1), match.group(1)[:12])
+            for _, p in report["files"] if (match := CONTAINER_LOG_RE.search(p))
+        }
+        return report
+
+    def truncate(self, log_path: str) -> int:
+        """Обнуляет json-лог контейнера (docker пишет с O_APPEND, файл можно обрезать на ходу)."""
+        real = self.real_path(log_path)
+        size = _usage(os.stat(real))
+        os.truncate(real, 0)
+        return size
+
+    async def vacuum_journal(self, max_mb: int = FIX_JOURNAL_MAX_MB) -> int:
+        """
+        Аналог `journalctl --vacuum-size`: удаляет архивные файлы журнала (с '@' в имени),
+        начиная со старых, пока журнал не станет меньше max_mb. Активные файлы не трогаются.
+        Если бот видит ФС хоста и journalctl есть - вызывается он сам.
+        """
+        if not self.host_root and shutil.which("journalctl"):
+            before = await asyncio.to_thread(self._journal_size)
+            result = await run_command(["journalctl", f"--vacuum-size={max_mb}M"], timeout=300)
+            if result.returncode != 0:
+                raise OSError(result.stderr.strip() or "journalctl failed")
+            return max(0, before - await asyncio.to_thread(self._journal_size))
+        return await asyncio.to_thread(self._vacuum_archived, max_mb * 1024 ** 2)
+
+    def _journal_files(self) -> list:
+        files = []
+        for directory, _, names in os.walk(self.real_path(JOURNAL_DIR)):
+            for name in names:
+                if name.endswith((".journal", ".journal~")):
+                    path = os.path.join(directory, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, path, name, _usage(st)))
+        return files
+
+    def _journal_size(self) -> int:
+        return sum(f[3] for f in self._journal_files())
+
+    def _vacuum_archived(self, max_bytes: int) -> int:
+        files = sorted(self._journal_files())
+        size = sum(f[3] for f in files)
+        freed = 0
+        for _, path, name, usage in files:
+            if size - freed <= max_bytes:
+                break
+            if "@" not in name:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove {path}: {e}")
+                continue
+            freed += usage
+        return freed
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+def _docker_reclaimable(df: dict) -> dict:
+    """Сколько можно освободить по данным /system/df: образы без контейнеров, тома без ссылок, кэш сборки."""
+    images = sum(
+        max(0, i.get("Size", 0) - max(0, i.get("SharedSize", 0)))
+        for i in df.get("Images") or [] if not i.get("Containers")
+    )
+    volumes = sum(
+        max(0, (v.get("UsageData") or {}).get("Size", 0))
+        for v in df.get("Volumes") or [] if (v.get("UsageData") or {}).get("RefCount") == 0
+    )
+    build = sum(b.get("Size", 0) for b in df.get("BuildCache") or [] if not b.get("InUse"))
+    return {"images": images, "volumes": volumes, "build": build}
+
+def format_report(report: dict) -> str:
+    """Отчет /fix analyze с подсказками, какой командой что чистить."""
+    lines = [
+        f"🔍 *Disk analysis* `{report['path']}`: {_format_size(report['total'])}",
+        f"_{report['dirs_total']} dirs, {report['dirs_walked']} re-read, "
+        f"{report['seconds']:.1f}s{', ' + str(report['errors']) + ' unreadable' if report['errors'] else ''}_",
+    ]
+    if report["files"]:
+        lines.append("\n📄 *Largest files:*")
+        lines += [f"`{_format_size(size):>8}` `{path}`" for size, path in report["files"]]
+    if report["dirs"]:
+        lines.append("\n📁 *Largest directories:*")
+        lines += [f"`{_format_size(size):>8}` `{path}`" for size, path in report["dirs"]]
+
+    actions = []
+    for path, name in report.get("container_logs", {}).items():
+        size = next(size for size, p in report["files"] if p == path)
+        actions.append(f"`/fix truncate {name}` - container log {_format_size(size)}")
+    if report.get("journal") and report["journal"] > FIX_JOURNAL_MAX_MB * 1024 ** 2:
+        actions.append(f"`/fix journal` - journald {_format_size(report['journal'])} → {FIX_JOURNAL_MAX_MB}MB")
+    if report.get("docker"):
+        reclaimable = _docker_reclaimable(report["docker"])
+        if reclaimable["images"]:
+            actions.append(f"`/fix images` - unused images {_format_size(reclaimable['images'])}")
+        if reclaimable["volumes"]:
+            actions.append(f"`/fix volumes` - dangling volumes {_format_size(reclaimable['volumes'])}")
+        if reclaimable["build"]:
+            actions.append(f"`/fix` - build cache {_format_size(reclaimable['build'])}")
+    if actions:
+        lines.append("\n🩹 *Cleanup:*")
+        lines += actions
+    return "\n".join(lines)
+
+# Общий анализатор диска для /fix analyze
+disk_scanner = DiskScanner(FIX_INDEX_FILE, FIX_SCAN_WORKERS, FIX_TOP_K, FIX_INDEX_MAX_HOURS * 3600, HOST_ROOT)
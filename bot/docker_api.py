@@ -0,0 +1,487 @@
+import asyncio
+import json
+from urllib.parse import urlencode, quote
+from bot.config import DOCKER_SOCKET, DOCKER_POOL_SIZE, DOCKER_API_TIMEOUT
+from bot.executor import run_command, spawn, kill_process_group
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+class DockerError(Exception):
+    """Ошибка Docker (ответ API с кодом >= 400 или ненулевой код CLI)."""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+class DockerUnavailable(Exception):
+    """Сокет Docker недоступен - нужно откатиться на CLI."""
+
+class DockerClient:
+    """
+    Минимальный асинхронный клиент Docker Engine API поверх Unix-сокета.
+    Говорит HTTP/1.1 напрямую и держит пул keep-alive соединений,
+    поэтому запрос стоит один round-trip без fork/exec docker CLI.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 4, timeout: float = 30):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = []
+
+    async def _connect(self):
+        try:
+            return await asyncio.open_unix_connection(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+            raise DockerUnavailable(str(e)) from e
+
+    async def _acquire(self):
+        # Берем живое соединение из пула, закрытые сервером выбрасываем
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await self._connect()
+        return reader, writer, False
+
+    def _release(self, reader, writer, keep_alive: bool):
+        if keep_alive and len(self._idle) < self.pool_size and not reader.at_eof():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    @staticmethod
+    def _build_request(method: str, path: str, params: dict = None, body=None) -> bytes:
+        if params:
+            query = {k: v for k, v in params.items() if v is not None}
+            if query:
+                path += "?" + urlencode(query)
+        head = f"{method} {path} HTTP/1.1\r\nHost: docker\r\nUser-Agent: DevOpsBot\r\n"
+        payload = b""
+        if body is not None:
+            payload = json.dumps(body).encode()
+            head += "Content-Type: application/json\r\n"
+        head += f"Content-Length: {len(payload)}\r\n\r\n"
+        return head.encode() + payload
+
+    @staticmethod
+    async def _read_head(reader):
+        """Читает строку статуса и заголовки. Возвращает (status, headers)."""
+        line = await reader.readline()
+        if not line:
+            raise ConnectionResetError("Docker closed the connection")
+        parts = line.decode("latin-1").split(" ", 2)
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    @staticmethod
+    async def _iter_body(reader, status: int, headers: dict, method: str):
+        """Отдает тело ответа по кускам (chunked / Content-Length / до закрытия)."""
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    raise ConnectionResetError("Unexpected EOF in chunked body")
+                size = int(size_line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Трейлеры (обычно пусто) до пустой строки
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise ConnectionResetError("Unexpected EOF in body")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while True:
+                chunk = await reader.read(64 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def _request_once(self, method, path, params, body):
+        reader, writer, reused = await self._acquire()
+        try:
+            writer.write(self._build_request(method, path, params, body))
+            await writer.drain()
+            status, headers = await self._read_head(reader)
+            data = bytearray()
+            async for chunk in self._iter_body(reader, status, headers, method):
+                data += chunk
+        except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as e:
+            writer.close()
+            e.reused_connection = reused
+            raise
+        except BaseException:
+            writer.close()
+            raise
+        keep_alive = headers.get("connection", "").lower() != "close" and (
+            "content-length" in headers or "chunked" in headers.get("transfer-encoding", "").lower()
+            or status in (204, 304)
+        )
+        self._release(reader, writer, keep_alive)
+        return status, headers, bytes(data), reused
+
+    async def request(self, method: str, path: str, params: dict = None, body=None, timeout: float = None):
+        """
+        Выполняет запрос и возвращает (status, headers, body).
+        Если переиспользованное соединение оказалось закрытым сервером, запрос повторяется на новом.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            status, headers, data, _ = await asyncio.wait_for(
+                self._request_once(method, path, params, body), timeout)
+        except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as e:
+            if not getattr(e, "reused_connection", False):
+                raise
+            # Соединение из пула умерло между запросами - пробуем один раз на свежем
+            await self.close()
+            status, headers, data, _ = await asyncio.wait_for(
+                self._request_once(method, path, params, body), timeout)
+        return status, headers, data
+
+    async def request_json(self, method: str, path: str, params: dict = None, body=None, timeout: float = None):
+        status, _, data = await self.request(method, path, params, body, timeout)
+        if status >= 400:
+            raise DockerError(_error_message(data), status)
+        return json.loads(data) if data else None
+
+    async def stream(self, method: str, path: str, params: dict = None, body=None):
+        """
+        Долгоживущий ответ (логи с follow, события): отдельное соединение,
+        которое закрывается по окончании. Отдает (headers, async-итератор кусков).
+        """
+        reader, writer = await self._connect()
+        try:
+            writer.write(self._build_request(method, path, params, body))
+            await writer.drain()
+            status, headers = await asyncio.wait_for(self._read_head(reader), self.timeout)
+            if status >= 400:
+                data = bytearray()
+                async for chunk in self._iter_body(reader, status, headers, method):
+                    data += chunk
+                raise DockerError(_error_message(bytes(data)), status)
+        except BaseException:
+            writer.close()
+            raise
+
+        async def chunks():
+            try:
+                async for chunk in self._iter_body(reader, status, headers, method):
+                    yield chunk
+            finally:
+                writer.close()
+
+        return headers, chunks()
+
+    # --- Высокоуровневые методы API ---
+
+    async def ping(self) -> bool:
+        status, _, _ = await self.request("GET", "/_ping")
+        return status == 200
+
+    async def containers(self, all: bool = False) -> list:
+        return await self.request_json("GET", "/containers/json", {"all": int(all)})
+
+    async def inspect(self, name: str) -> dict:
+        return await self.request_json("GET", f"/containers/{quote(name, safe='')}/json")
+
+    async def stats(self, name: str) -> dict:
+        """Один снимок статистики контейнера (one-shot: без секундного ожидания precpu_stats)."""
+        return await self.request_json("GET", f"/containers/{quote(name, safe='')}/stats",
+                                       {"stream": 0, "one-shot": 1})
+
+    async def restart(self, name: str, timeout: int = 10):
+        # Restart ждет остановки контейнера - даем запасной таймаут сверху
+        await self.request_json("POST", f"/containers/{quote(name, safe='')}/restart",
+                                {"t": timeout}, timeout=self.timeout + timeout)
+
+    async def logs(self, name: str, tail=None, since=None, timestamps: bool = False) -> str:
+        """Логи контейнера одной строкой (stdout и stderr вперемешку, как в docker logs)."""
+        out = bytearray()
+        async for _, payload in self.log_frames(name, tail=tail, since=since, timestamps=timestamps):
+            out += payload
+        return out.decode("utf-8", errors="replace")
+
+    async def open_logs(self, name: str, follow: bool = False, tail=None, since=None, timestamps: bool = False):
+        """
+        Открывает поток логов контейнера и возвращает async-итератор (stream, bytes) по кадрам.
+        Ошибки подключения (DockerUnavailable, DockerError) выбрасываются сразу, до чтения.
+        """
+        params = {
+            "stdout": 1, "stderr": 1, "follow": int(follow), "timestamps": int(timestamps),
+            "tail": tail if tail is not None else "all", "since": since,
+        }
+        headers, chunks = await self.stream("GET", f"/containers/{quote(name, safe='')}/logs", params)
+        return demux_stream(chunks, headers.get("content-type", ""))
+
+    async def log_frames(self, name: str, follow: bool = False, tail=None, since=None, timestamps: bool = False):
+        """Async-итератор (stream, bytes) по кадрам лога контейнера."""
+        async for frame in await self.open_logs(name, follow, tail, since, timestamps):
+            yield frame
+
+    async def events(self, since=None, filters: dict = None):
+        """
+        Открывает поток событий (/events) и возвращает async-итератор dict по событию.
+        Ошибки подключения выбрасываются сразу, до чтения.
+        """
+        params = {"since": since, "filters": json.dumps(filters) if filters else None}
+        _, chunks = await self.stream("GET", "/events", params)
+        return _json_lines(chunks)
+
+    async def prune_images(self) -> int:
+        """Аналог `docker image prune -a -f`: все образы без контейнеров. Возвращает освобожденные байты."""
+        result = await self.request_json("POST", "/images/prune", {"filters": json.dumps({"dangling": ["false"]})}, timeout=600)
+        return (result or {}).get("SpaceReclaimed", 0)
+
+    async def prune_volumes(self) -> int:
+        """Аналог `docker volume prune -f` (анонимные тома без контейнеров)."""
+        result = await self.request_json("POST", "/volumes/prune", timeout=600)
+        return (result or {}).get("SpaceReclaimed", 0)
+
+    async def disk_usage(self) -> dict:
+        """Аналог `docker system df -v`: образы, тома, кэш сборки с размерами."""
+        return await self.request_json("GET", "/system/df", timeout=120)
+
+    async def system_prune(self) -> int:
+        """Аналог `docker system prune -f`. Возвращает количество освобожденных байт."""
+        reclaimed = 0
+        for path, params in (
+            ("/containers/prune", None),
+            ("/networks/prune", None),
+            ("/images/prune", {"filters": json.dumps({"dangling": ["true"]})}),
+            ("/build/prune", None),
+        ):
+            try:
+                result = await self.request_json("POST", path, params, timeout=600)
+            except DockerError as e:
+                # build/prune отсутствует без BuildKit - это не ошибка очистки
+                if path == "/build/prune" and e.status == 404:
+                    continue
+                raise
+            reclaimed += (result or {}).get("SpaceReclaimed", 0)
+        return reclaimed
+
+def _error_message(data: bytes) -> str:
+    try:
+        return json.loads(data).get("message", "") or data.decode(errors="replace")
+    except (ValueError, AttributeError):
+        return data.decode(errors="replace")
+
+async def _json_lines(chunks):
+    """Поток JSON-объектов по одному на строку (события Docker, docker events --format json)."""
+    buf = bytearray()
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            end = buf.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(buf[:end]).strip()
+            del buf[:end + 1]
+            if line:
+                yield json.loads(line)
+
+async def demux_stream(chunks, content_type: str = ""):
+    """
+    Разбирает мультиплексированный поток Docker (8-байтный заголовок на кадр).
+    Для контейнеров с TTY поток сырой - тогда всё отдается как stdout.
+    """
+    buf = bytearray()
+    multiplexed = None
+    if "multiplexed" in content_type:
+        multiplexed = True
+    elif "raw-stream" in content_type:
+        multiplexed = False
+
+    async for chunk in chunks:
+        if multiplexed is False:
+            yield 1, chunk
+            continue
+        buf += chunk
+        if multiplexed is None:
+            if len(buf) < 8:
+                continue
+            # Старые API не шлют content-type: угадываем по заголовку кадра
+            multiplexed = buf[0] in (0, 1, 2) and buf[1:4] == b"\x00\x00\x00"
+            if not multiplexed:
+                yield 1, bytes(buf)
+                buf.clear()
+                continue
+        while len(buf) >= 8:
+            size = int.from_bytes(buf[4:8], "big")
+            if len(buf) < 8 + size:
+                break
+            yield buf[0], bytes(buf[8:8 + size])
+            del buf[:8 + size]
+    if buf:
+        yield 1, bytes(buf)
+
+# Общий клиент на весь процесс (пул соединений переиспользуется всеми командами)
+docker = DockerClient(DOCKER_SOCKET, DOCKER_POOL_SIZE, DOCKER_API_TIMEOUT)
+
+# --- Операции для хендлеров: сначала API, при недоступном сокете - docker CLI ---
+
+async def _cli(args, **kwargs) -> str:
+    result = await run_command(["docker"] + args, **kwargs)
+    if result.timed_out:
+        raise DockerError(f"docker {args[0]} timed out")
+    if result.returncode != 0:
+        raise DockerError(result.stderr.strip() or f"docker {args[0]} failed")
+    return result.stdout
+
+async def list_containers() -> str:
+    """Таблица NAMES / STATUS, как `docker ps --format 'table {{.Names}}\\t{{.Status}}'`."""
+    try:
+        rows = [(c["Names"][0].lstrip("/"), c["Status"]) for c in await docker.containers()]
+        width = max([len("NAMES")] + [len(name) for name, _ in rows]) + 3
+        lines = [f"{'NAMES':<{width}}STATUS"] + [f"{name:<{width}}{state}" for name, state in rows]
+        return "\n".join(lines) + "\n"
+    except DockerUnavailable:
+        return await _cli(["ps", "--format", "table {{.Names}}\t{{.Status}}"])
+
+async def running_containers() -> list:
+    """Имена запущенных контейнеров."""
+    try:
+        return [c["Names"][0].lstrip("/") for c in await docker.containers()]
+    except DockerUnavailable:
+        return (await _cli(["ps", "--format", "{{.Names}}"])).split()
+
+async def container_logs(name: str, tail=None, since=None, max_output: int = None) -> str:
+    try:
+        return await docker.logs(name, tail=tail, since=since)
+    except DockerUnavailable:
+        args = ["logs"]
+        if tail is not None:
+            args += ["--tail", str(tail)]
+        if since is not None:
+            args += ["--since", str(since)]
+        return await _cli(args + [name], max_output=max_output)
+
+async def _cli_stream(args):
+    """Потоковый вывод docker CLI (stdout и stderr вместе) кусками bytes."""
+    proc = await spawn(["docker"] + args, stderr=asyncio.subprocess.STDOUT)
+    try:
+        while True:
+            chunk = await proc.stdout.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        kill_process_group(proc)
+        await proc.wait()
+    if proc.returncode:
+        raise DockerError(f"docker {args[0]} exited with code {proc.returncode}")
+
+async def stream_logs(name: str, follow: bool = False, tail=None, since=None, timestamps: bool = False):
+    """
+    Логи контейнера потоком (куски bytes) без накопления в памяти.
+    since - unix-время (можно дробное), tail - число строк или None (все).
+    """
+    try:
+        frames = await docker.open_logs(name, follow=follow, tail=tail, since=since, timestamps=timestamps)
+    except DockerUnavailable:
+        args = ["logs"]
+        if follow:
+            args.append("--follow")
+        if timestamps:
+            args.append("--timestamps")
+        if tail is not None:
+            args += ["--tail", str(tail)]
+        if since is not None:
+            args += ["--since", str(since)]
+        async for chunk in _cli_stream(args + [name]):
+            yield chunk
+        return
+    async for _, payload in frames:
+        yield payload
+
+async def stream_events(since=None, filters: dict = None):
+    """События Docker потоком (dict на событие). since - unix-время, с которого повторить пропущенное."""
+    try:
+        events = await docker.events(since=since, filters=filters)
+    except DockerUnavailable:
+        args = ["events", "--format", "{{json .}}"]
+        if since is not None:
+            args += ["--since", str(since)]
+        for key, values in (filters or {}).items():
+            for value in values:
+                args += ["--filter", f"{key}={value}"]
+        async for event in _json_lines(_cli_stream(args)):
+            yield event
+        return
+    async for event in events:
+        yield event
+
+async def restart_container(name: str):
+    try:
+        await docker.restart(name)
+    except DockerUnavailable:
+        await _cli(["restart", name])
+
+async def container_log_path(name: str) -> str:
+    """Путь к json-логу контейнера на хосте (/var/lib/docker/containers/<id>/<id>-json.log)."""
+    try:
+        path = (await docker.inspect(name)).get("LogPath")
+    except DockerUnavailable:
+        path = (await _cli(["inspect", "--format", "{{.LogPath}}", name])).strip()
+    if not path:
+        raise DockerError(f"Container {name} has no log file (logging driver is not json-file)")
+    return path
+
+async def container_names() -> dict:
+    """Полный ID -> имя для всех контейнеров, в том числе остановленных."""
+    try:
+        return {c["Id"]: c["Names"][0].lstrip("/") for c in await docker.containers(all=True)}
+    except DockerUnavailable:
+        output = await _cli(["ps", "-a", "--no-trunc", "--format", "{{.ID}} {{.Names}}"])
+        return dict(line.split(" ", 1) for line in output.splitlines() if " " in line)
+
+async def disk_usage():
+    """Сводка `docker system df` или None, если API недоступен (у CLI нет машинного формата с размерами)."""
+    try:
+        return await docker.disk_usage()
+    except DockerUnavailable:
+        return None
+
+async def prune_images():
+    """Возвращает освобожденные байты (None через CLI - там только текст)."""
+    try:
+        return await docker.prune_images()
+    except DockerUnavailable:
+        await _cli(["image", "prune", "-a", "-f"], timeout=600)
+
+async def prune_volumes():
+    try:
+        return await docker.prune_volumes()
+    except DockerUnavailable:
+        await _cli(["volume", "prune", "-f"], timeout=600)
+
+async def system_prune():
+    try:
+        reclaimed = await docker.system_prune()
+        logger.info(f"Docker prune reclaimed {reclaimed / (1024 ** 2):.1f} MB")
+    except DockerUnavailable:
+        await _cli(["system", "prune", "-f"], timeout=600)
@@ -0,0 +1,208 @@
+import asyncio
+import socket
+import time
+from collections import deque
+from bot.config import (
+    DOCKER_EVENTS, TELEGRAM_USER_ID, RESTART_LOOP_COUNT, RESTART_LOOP_WINDOW,
+    HEALTH_FLAP_COUNT, HEALTH_FLAP_WINDOW, EVENT_ALERT_COOLDOWN,
+)
+from bot.docker_api import DockerError, stream_events
+from bot.cache import response_cache
+from bot.logger import setup_logger
+from bot.outbox import outbox, PRIORITY_ALERT
+
+logger = setup_logger()
+
+HOSTNAME = socket.gethostname()
+
+# Только события контейнеров, которые двигают автомат ниже
+EVENT_FILTERS = {"type": ["container"], "event": ["die", "oom", "kill", "stop", "start", "health_status", "destroy"]}
+# die в течение этого времени после kill/stop - штатная остановка, а не падение
+STOP_GRACE = 30
+# die сразу после oom - то же событие, второй алерт не нужен
+OOM_GRACE = 5
+RECONNECT_DELAY = (1, 30)
+
+
+class _ContainerState:
+    """Состояние одного контейнера: недавние падения, смены health и когда его останавливали вручную."""
+
+    __slots__ = ("deaths", "health", "health_changes", "stopping_until", "oom_at", "looping", "flapping")
+
+    def __init__(self):
+        self.deaths = deque()
+        self.health = None
+        self.health_changes = deque()
+        self.stopping_until = 0.0
+        self.oom_at = 0.0
+        self.looping = False
+        self.flapping = False
+
+
+def _trim(times: deque, window: float, now: float):
+    while times and now - times[0] > window:
+        times.popleft()
+
+
+class ContainerEventWatcher:
+    """
+    Подписка на поток событий Docker (/events) вместо опроса.
+    На каждый контейнер - маленький автомат: падение (die с ненулевым кодом не после stop/kill),
+    OOM, цикл перезапусков (RESTART_LOOP_COUNT падений за RESTART_LOOP_WINDOW секунд),
+    unhealthy и "мигающий" healthcheck. Алерт уходит сразу по событию, в обход JobQueue.
+    """
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.containers = {}
+        self.stats = {"events": 0, "alerts": 0, "reconnects": 0}
+        self._last_alert = {}
+        self._since = None
+        self._last_nano = 0
+        self._listeners = []
+        self._task = None
+
+    def subscribe(self, callback):
+        """callback(name, action) на каждое новое событие контейнера."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = RECONNECT_DELAY[0]
+        while True:
+            try:
+                async for event in stream_events(since=self._since, filters=EVENT_FILTERS):
+                    delay = RECONNECT_DELAY[0]
+                    alert = self.process(event)
+                    if alert:
+                        await self._send(alert)
+                logger.warning("Docker events stream closed, reconnecting.")
+            except (DockerError, OSError, ValueError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Docker events unavailable: {e}. Retrying in {delay}s")
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY[1])
+
+    def process(self, event: dict, now: float = None):
+        """Пропускает одно событие через автомат контейнера. Возвращает текст алерта или None."""
+        if event.get("Type", "container") != "container":
+            return None
+        # После переподключения с since Docker повторит события этой секунды - пропускаем уже виденные
+        stamp = event.get("timeNano") or 0
+        if stamp and stamp <= self._last_nano:
+            return None
+        self._last_nano = max(self._last_nano, stamp)
+        self.stats["events"] += 1
+        now = time.time() if now is None else now
+        self._since = event.get("time", int(now))
+        action = event.get("Action") or event.get("status") or ""
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        name = attributes.get("name") or (event.get("id") or "?")[:12]
+        # Каждое событие из EVENT_FILTERS меняет статус контейнера в /ps
+        response_cache.invalidate("ps")
+        for callback in self._listeners:
+            callback(name, action)
+
+        if action == "destroy":
+            self.containers.pop(name, None)
+            return None
+        state = self.containers.get(name)
+        if state is None:
+            state = self.containers[name] = _ContainerState()
+
+        if action in ("kill", "stop"):
+            state.stopping_until = now + STOP_GRACE
+        elif action == "oom":
+            state.oom_at = now
+            return self._alert(name, "oom", now, f"💥 Container `{name}` was OOM-killed.")
+        elif action == "die":
+            return self._on_die(name, state, attributes.get("exitCode", "?"), now)
+        elif action == "start":
+            _trim(state.deaths, RESTART_LOOP_WINDOW, now)
+            if state.looping and not state.deaths:
+                state.looping = False
+        elif action.startswith("health_status"):
+            return self._on_health(name, state, action.partition(":")[2].strip(), now)
+        return None
+
+    def _on_die(self, name: str, state: _ContainerState, exit_code: str, now: float):
+        if now < state.stopping_until:
+            # docker stop / restart / kill - ожидаемая остановка
+            state.stopping_until = 0.0
+            return None
+        state.deaths.append(now)
+        _trim(state.deaths, RESTART_LOOP_WINDOW, now)
+        if len(state.deaths) >= RESTART_LOOP_COUNT:
+            state.looping = True
+            return self._alert(
+                name, "loop", now,
+                f"🔁 Container `{name}` is in a restart loop: {len(state.deaths)} crashes "
+                f"in {RESTART_LOOP_WINDOW / 60:g} min (last exit code {exit_code})."
+            )
+        if now - state.oom_at < OOM_GRACE or exit_code == "0":
+            return None
+        return self._alert(name, "die", now, f"💀 Container `{name}` crashed (exit code {exit_code}).")
+
+    def _on_health(self, name: str, state: _ContainerState, status: str, now: float):
+        previous, state.health = state.health, status
+        if previous is None or previous == status or status == "starting":
+            return None
+        state.health_changes.append(now)
+        _trim(state.health_changes, HEALTH_FLAP_WINDOW, now)
+        state.flapping = len(state.health_changes) >= HEALTH_FLAP_COUNT
+        if state.flapping:
+            return self._alert(
+                name, "flap", now,
+                f"〰️ Healthcheck of `{name}` is flapping: {len(state.health_changes)} changes "
+                f"in {HEALTH_FLAP_WINDOW / 60:g} min (now {status})."
+            )
+        if status == "unhealthy":
+            return self._alert(name, "unhealthy", now, f"🩺 Container `{name}` is unhealthy.")
+        return None
+
+    def _alert(self, name: str, kind: str, now: float, message: str):
+        """Антиспам: один алерт каждого вида на контейнер за EVENT_ALERT_COOLDOWN."""
+        key = (name, kind)
+        if now - self._last_alert.get(key, 0) < EVENT_ALERT_COOLDOWN:
+            return None
+        self._last_alert[key] = now
+        return message
+
+    async def _send(self, message: str):
+        self.stats["alerts"] += 1
+        logger.info(f"Container event alert: {message}")
+        try:
+            await outbox.send_message(
+                self.chat_id, f"🚨 *ALERT from {HOSTNAME}*\n\n{message}",
+                priority=PRIORITY_ALERT, parse_mode="Markdown",
+            )
+        except Exception as e:
+            logger.error(f"Failed to send container event alert: {e}")
+
+    def active(self) -> list:
+        """Что происходит сейчас (для /alerts): контейнеры в цикле перезапусков, unhealthy, мигающие."""
+        out = []
+        for name, state in sorted(self.containers.items()):
+            if state.looping:
+                out.append(f"🔁 `{name}` restart loop ({len(state.deaths)} crashes)")
+            if state.flapping:
+                out.append(f"〰️ `{name}` healthcheck flapping")
+            elif state.health == "unhealthy":
+                out.append(f"🩺 `{name}` unhealthy")
+        return out
+
+
+# Наблюдатель за событиями Docker (None, если DOCKER_EVENTS выключен)
+event_watcher = ContainerEventWatcher(TELEGRAM_USER_ID) if DOCKER_EVENTS else None
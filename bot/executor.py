@@ -0,0 +1,131 @@
+import asyncio
+import os
+import signal
+import time
+from dataclasses import dataclass
+from bot.config import EXEC_CONCURRENCY, EXEC_TIMEOUT, EXEC_MAX_OUTPUT
+from bot.instrument import observe
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Сколько дочерних процессов бот может держать одновременно
+_semaphore = asyncio.Semaphore(EXEC_CONCURRENCY)
+
+CHUNK_SIZE = 64 * 1024
+
+# Сколько ждать EOF после kill: потомок, ушедший через setsid в свою группу, killpg не задевает
+# и может держать пайп открытым сколько угодно
+KILL_GRACE = 2
+
+@dataclass
+class CommandResult:
+    """Результат выполнения команды (аналог subprocess.CompletedProcess)."""
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+
+async def _read_capped(stream, buf: bytearray, limit: int) -> bool:
+    """
+    Читает поток до EOF, сохраняя не больше limit байт.
+    Остаток дочитывается и выбрасывается, чтобы процесс не завис на полном пайпе.
+    Возвращает True, если вывод был обрезан.
+    """
+    truncated = False
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            return truncated
+        free = limit - len(buf)
+        if free > 0:
+            buf += chunk[:free]
+        if len(chunk) > free:
+            truncated = True
+
+def kill_process_group(proc):
+    """Убивает процесс вместе с его группой (для shell=True убиваются и дети)."""
+    if proc.returncode is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+async def wait_killed(proc, tasks) -> None:
+    """
+    Ждет задачи чтения/ожидания процесса после kill_process_group не дольше KILL_GRACE и отменяет недождавшиеся.
+    proc.wait() тоже может не вернуться: на Python 3.12+ он ждет закрытия пайпов.
+    """
+    _, pending = await asyncio.wait(tasks, timeout=KILL_GRACE)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Pipes of killed process {proc.pid} are still open, abandoning them")
+        await asyncio.wait(pending)
+
+def program_name(args, shell: bool) -> str:
+    """Имя программы, а не вся команда - иначе ключей в статистике будет сколько угодно."""
+    words = args.split() if shell else list(args)
+    return os.path.basename(words[0]) if words else "sh"
+
+async def spawn(args, shell: bool = False, stderr=asyncio.subprocess.PIPE):
+    """Запускает процесс в отдельной группе с пайпами на stdout/stderr."""
+    if shell:
+        return await asyncio.create_subprocess_shell(
+            args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=stderr, start_new_session=True
+        )
+    return await asyncio.create_subprocess_exec(
+        *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+        stderr=stderr, start_new_session=True
+    )
+
+async def run_command(args, shell: bool = False, timeout: float = None, max_output: int = None) -> CommandResult:
+    """
+    Асинхронно выполняет команду, не блокируя event loop.
+    - timeout: по истечении процесс убивается, возвращается то, что успели прочитать.
+    - max_output: лимит байт для stdout и stderr, применяется во время чтения.
+    - отмена корутины (CancelledError) убивает дочерний процесс.
+    """
+    if timeout is None:
+        timeout = EXEC_TIMEOUT
+    if max_output is None:
+        max_output = EXEC_MAX_OUTPUT
+
+    async with _semaphore:
+        started = time.perf_counter()
+        proc = await spawn(args, shell=shell)
+        out, err = bytearray(), bytearray()
+        readers = [
+            asyncio.ensure_future(_read_capped(proc.stdout, out, max_output)),
+            asyncio.ensure_future(_read_capped(proc.stderr, err, max_output)),
+        ]
+        waiter = asyncio.ensure_future(proc.wait())
+        try:
+            _, pending = await asyncio.wait(readers + [waiter], timeout=timeout)
+            timed_out = bool(pending)
+            if timed_out:
+                logger.warning(f"Command timed out after {timeout}s: {args}")
+                kill_process_group(proc)
+                # Обычно после kill пайпы закрываются и читатели сами доходят до EOF
+                await wait_killed(proc, readers + [waiter])
+        except asyncio.CancelledError:
+            kill_process_group(proc)
+            for task in readers + [waiter]:
+                task.cancel()
+            raise
+
+        observe("subprocess", program_name(args, shell), time.perf_counter() - started)
+        return CommandResult(
+            # Пайпы брошены до того, как asyncio увидел выход процесса - но он точно убит
+            returncode=proc.returncode if proc.returncode is not None else -signal.SIGKILL,
+            stdout=out.decode("utf-8", errors="replace"),
+            stderr=err.decode("utf-8", errors="replace"),
+            timed_out=timed_out,
+            truncated=any(not t.cancelled() and t.result() for t in readers),
+        )
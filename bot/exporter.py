@@ -0,0 +1,205 @@
+import asyncio
+from bot.config import METRICS_LISTEN
+from bot.instrument import latency, errors
+from bot.logger import setup_logger
+from bot.outbox import outbox
+from bot.cache import response_cache
+
+logger = setup_logger()
+
+PREFIX = "monitor_bot_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Text:
+    """Сборщик текстового формата Prometheus: HELP/TYPE один раз на метрику, затем сэмплы."""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str, samples):
+        """samples - итерируемое (labels, value); семейство без сэмплов не пишется."""
+        rows = [f"{PREFIX}{name}{_labels(labels)} {_value(value)}" for labels, value in samples if value is not None]
+        if rows:
+            self.lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            self.lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            self.lines.extend(rows)
+
+    def histogram(self, name: str, help_text: str, histograms: dict, label: str = None):
+        if not histograms:
+            return
+        self.lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        self.lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = {label: key} if label else {}
+            for bound, count in histogram.cumulative():
+                self.lines.append(f"{PREFIX}{name}_bucket{_labels(dict(labels, le=_value(bound)))} {count}")
+            self.lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_value(histogram.sum)}")
+            self.lines.append(f"{PREFIX}{name}_count{_labels(labels)} {histogram.count}")
+
+    def encode(self) -> bytes:
+        return ("\n".join(self.lines) + "\n").encode() if self.lines else b""
+
+def render_snapshot(snapshot: dict) -> bytes:
+    """Метрики хоста и контейнеров из снимка сэмплера."""
+    out = _Text()
+    out.family("sample_timestamp_seconds", "gauge", "Time of the last metrics sample.", [({}, snapshot["ts"])])
+    out.family("cpu_percent", "gauge", "Host CPU usage, percent.", [({}, snapshot["cpu"])])
+    out.family("load", "gauge", "Load average.",
+               [({"period": period}, value) for period, value in zip(("1m", "5m", "15m"), snapshot["load"])])
+    ram = snapshot["ram"]
+    out.family("memory_used_bytes", "gauge", "Host memory in use.", [({}, ram["used_gb"] * GB)])
+    out.family("memory_total_bytes", "gauge", "Host memory size.", [({}, ram["total_gb"] * GB)])
+    out.family("memory_percent", "gauge", "Host memory usage, percent.", [({}, ram["percent"])])
+
+    mounts = snapshot.get("mounts") or {}
+    out.family("filesystem_used_bytes", "gauge", "Used space per mountpoint.",
+               [({"mountpoint": m}, u["used_gb"] * GB) for m, u in mounts.items()])
+    out.family("filesystem_free_bytes", "gauge", "Free space per mountpoint.",
+               [({"mountpoint": m}, u["free_gb"] * GB) for m, u in mounts.items()])
+    out.family("filesystem_percent", "gauge", "Used space per mountpoint, percent.",
+               [({"mountpoint": m}, u["percent"]) for m, u in mounts.items()])
+    out.family("filesystem_hours_to_full", "gauge", "Forecast until the mountpoint is full at the current fill rate.",
+               [({"mountpoint": m}, u.get("hours_to_full")) for m, u in mounts.items()])
+
+    disk_io = snapshot.get("disk_io") or {}
+    out.family("disk_read_bytes_per_second", "gauge", "Disk read throughput per device.",
+               [({"device": d}, r["read_mbps"] * MB) for d, r in disk_io.items()])
+    out.family("disk_write_bytes_per_second", "gauge", "Disk write throughput per device.",
+               [({"device": d}, r["write_mbps"] * MB) for d, r in disk_io.items()])
+    out.family("disk_read_iops", "gauge", "Disk read operations per second.",
+               [({"device": d}, r["read_iops"]) for d, r in disk_io.items()])
+    out.family("disk_write_iops", "gauge", "Disk write operations per second.",
+               [({"device": d}, r["write_iops"]) for d, r in disk_io.items()])
+
+    net_io = snapshot.get("net_io") or {}
+    for name, key, scale, help_text in (
+        ("network_receive_bytes_per_second", "rx_mbit", 1e6 / 8, "Network receive throughput per interface."),
+        ("network_transmit_bytes_per_second", "tx_mbit", 1e6 / 8, "Network transmit throughput per interface."),
+        ("network_receive_packets_per_second", "rx_pps", 1, "Received packets per second per interface."),
+        ("network_transmit_packets_per_second", "tx_pps", 1, "Transmitted packets per second per interface."),
+        ("network_errors_per_second", "errors", 1, "Receive and transmit errors per second per interface."),
+        ("network_drops_per_second", "drops", 1, "Dropped packets per second per interface."),
+        ("network_utilization_percent", "util", 1, "Busier direction of the interface, percent of link speed."),
+    ):
+        out.family(name, "gauge", help_text,
+                   [({"interface": i}, r[key] * scale if r[key] is not None else None) for i, r in net_io.items()])
+    tcp = snapshot.get("tcp") or {}
+    out.family("tcp_sockets", "gauge", "TCP sockets (IPv4 and IPv6) by state.",
+               [({"state": state}, count) for state, count in sorted(tcp.items())])
+
+    containers = snapshot.get("containers") or {}
+    for name, key, scale, help_text in (
+        ("container_cpu_percent", "cpu", 1, "Container CPU usage, 100 = one core."),
+        ("container_memory_bytes", "mem_mb", MB, "Container memory in use (without page cache)."),
+        ("container_memory_limit_bytes", "mem_limit_mb", MB, "Container memory limit (host RAM if unlimited)."),
+        ("container_network_receive_bytes_per_second", "net_rx_kbps", 1024, "Container network receive rate."),
+        ("container_network_transmit_bytes_per_second", "net_tx_kbps", 1024, "Container network transmit rate."),
+        ("container_blkio_read_bytes_per_second", "blk_read_kbps", 1024, "Container block device read rate."),
+        ("container_blkio_write_bytes_per_second", "blk_write_kbps", 1024, "Container block device write rate."),
+    ):
+        out.family(name, "gauge", help_text,
+                   [({"container": c}, s[key] * scale) for c, s in containers.items() if key in s])
+    return out.encode()
+
+def render_internal() -> bytes:
+    """Метрики самого бота - дешевые счетчики в памяти, собираются на каждый запрос."""
+    out = _Text()
+    out.histogram("handler_duration_seconds", "Command handler latency.", latency["handler"], "command")
+    out.family("handler_errors_total", "counter", "Unhandled exceptions in command handlers.",
+               [({"command": name}, count) for name, count in sorted(errors["handler"].items())])
+    out.histogram("job_duration_seconds", "Background job run time.", latency["job"], "job")
+    out.family("job_errors_total", "counter", "Unhandled exceptions in background jobs.",
+               [({"job": name}, count) for name, count in sorted(errors["job"].items())])
+    out.histogram("telegram_request_duration_seconds", "Telegram Bot API round-trip time.", latency["telegram"], "method")
+    out.histogram("subprocess_duration_seconds", "External command run time.", latency["subprocess"], "program")
+    out.histogram("event_loop_lag_seconds", "How late the event loop wakes up a sleeping task.", latency["loop"])
+    out.family("outbox_pending", "gauge", "Telegram requests waiting in the outbox.", [({}, outbox.pending())])
+    out.family("outbox_messages_total", "counter", "Outbox events: sent requests, merged and dropped messages.",
+               [({"event": event}, outbox.stats[event]) for event in ("sent", "merged", "dropped")])
+    out.family("telegram_errors_total", "counter", "Telegram Bot API errors by kind.",
+               [({"kind": "retry_after"}, outbox.stats["retry_after"]),
+                ({"kind": "network"}, outbox.stats["network_errors"]),
+                ({"kind": "rejected"}, outbox.stats["rejected"]),
+                ({"kind": "failed"}, outbox.stats["failed"])])
+    out.family("response_cache_requests_total", "counter",
+               "Cached command lookups: hit, shared (waited for an in-flight computation) and miss.",
+               [({"result": result}, response_cache.stats[key])
+                for result, key in (("hit", "hits"), ("shared", "shared"), ("miss", "misses"))])
+    out.family("response_cache_evictions_total", "counter", "Response cache entries evicted by the size limit.",
+               [({}, response_cache.stats["evictions"])])
+    out.family("response_cache_invalidations_total", "counter", "Response cache resets by mutating commands.",
+               [({}, response_cache.stats["invalidations"])])
+    out.family("response_cache_entries", "gauge", "Responses currently cached.", [({}, len(response_cache))])
+    return out.encode()
+
+class MetricsExporter:
+    """
+    HTTP-эндпоинт /metrics для Prometheus на голом asyncio.
+    Метрики хоста и контейнеров сериализуются один раз на замер сэмплера (подписчик),
+    поэтому scrape - это копия готового буфера плюс несколько строк внутренних счетчиков.
+    """
+
+    def __init__(self, listen: str):
+        self.listen = listen
+        self._body = b""
+        self._server = None
+
+    def record(self, snapshot: dict):
+        """Подписчик sampler."""
+        self._body = render_snapshot(snapshot)
+
+    async def start(self):
+        host, _, port = self.listen.rpartition(":")
+        self._server = await asyncio.start_server(self._handle, host or "0.0.0.0", int(port))
+        logger.info(f"Prometheus exporter listening on {self.listen}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            # Заголовки запроса не нужны - дочитываем до пустой строки
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            method, path = (request.decode("latin-1").split() + ["", ""])[:2]
+            if method not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", b"method not allowed\n"
+            elif path.split("?")[0] != "/metrics":
+                status, body = "404 Not Found", b"see /metrics\n"
+            else:
+                status, body = "200 OK", self._body + render_internal()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            )
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+# Эндпоинт /metrics (METRICS_LISTEN="host:port"; пусто - выключен)
+exporter = MetricsExporter(METRICS_LISTEN) if METRICS_LISTEN else None
@@ -0,0 +1,299 @@
+import asyncio
+import hmac
+import json
+import random
+import sys
+import time
+import psutil
+from bot.config import FLEET_MODE, FLEET_LISTEN, FLEET_COORDINATOR, FLEET_TOKEN, FLEET_STALE
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Протокол: TCP, по одному JSON-объекту на строку.
+# Агент -> {"type": "hello", "host", "token"}, координатор -> {"type": "ok"},
+# дальше агент шлет {"type": "snapshot", ...сводка} после каждого замера сэмплера.
+MAX_MESSAGE = 64 * 1024
+RECONNECT_DELAY = (1, 30)
+
+def _split_addr(addr: str, default_host: str = "0.0.0.0") -> tuple:
+    host, _, port = addr.rpartition(":")
+    return host or default_host, int(port)
+
+def summarize(snapshot: dict, host: str, ip: str) -> dict:
+    """Компактная сводка снимка сэмплера для координатора (несколько сотен байт)."""
+    mounts = snapshot.get("mounts") or {}
+    worst = max(mounts.items(), key=lambda item: item[1]["percent"], default=(None, None))
+    return {
+        "host": host,
+        "ip": ip,
+        "ts": snapshot["ts"],
+        "cpu": snapshot["cpu"],
+        "load": list(snapshot["load"]),
+        "ram": snapshot["ram"],
+        "disk": {"percent": snapshot["disk"]["percent"], "used_gb": snapshot["disk"]["used_gb"],
+                 "total_gb": snapshot["disk"]["total_gb"]},
+        "worst_mount": [worst[0], worst[1]["percent"]] if worst[0] else None,
+        "boot_time": psutil.boot_time(),
+        "containers": len(snapshot.get("containers") or {}),
+    }
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"expected a number, got {value!r}")
+    return value
+
+def check_summary(message: dict) -> dict:
+    """
+    Сводка агента в том виде, в каком ее читает render(): только известные поля нужных типов.
+    ValueError - сообщение не подходит (координатор закрывает соединение агента).
+    """
+    try:
+        ram, disk, mount = message["ram"], message["disk"], message.get("worst_mount")
+        summary = {
+            "ip": str(message.get("ip", "?")),
+            "ts": _number(message["ts"]),
+            "cpu": _number(message["cpu"]),
+            "load": [_number(x) for x in message["load"]],
+            "ram": {key: _number(ram[key]) for key in ("percent", "used_gb", "total_gb")},
+            "disk": {key: _number(disk[key]) for key in ("percent", "used_gb", "total_gb")},
+            "worst_mount": [str(mount[0]), _number(mount[1])] if mount else None,
+            "boot_time": _number(message["boot_time"]),
+            "containers": int(_number(message.get("containers", 0))),
+        }
+    except (KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"malformed snapshot ({type(e).__name__}: {e})")
+    if len(summary["load"]) != 3:
+        raise ValueError("malformed snapshot (load)")
+    return summary
+
+def _format_uptime(seconds: float) -> str:
+    days, rest = divmod(int(seconds), 86400)
+    return f"{days}d {rest // 3600}h" if days else f"{rest // 3600}h {rest % 3600 // 60}m"
+
+# Колонки сводных таблиц: команда -> [(заголовок, функция от сводки хоста)]
+TABLES = {
+    "status": [
+        ("CPU%", lambda h: f"{h['cpu']:.0f}"),
+        ("LOAD", lambda h: f"{h['load'][0]:.2f}"),
+        ("RAM%", lambda h: f"{h['ram']['percent']:.0f}"),
+        ("DISK%", lambda h: f"{h['disk']['percent']:.0f}"),
+        ("UP", lambda h: _format_uptime(h["ts"] - h["boot_time"])),
+    ],
+    "cpu": [
+        ("CPU%", lambda h: f"{h['cpu']:.1f}"),
+        ("LOAD 1/5/15", lambda h: "/".join(f"{x:.2f}" for x in h["load"])),
+    ],
+    "ram": [
+        ("RAM%", lambda h: f"{h['ram']['percent']:.1f}"),
+        ("USED/TOTAL GB", lambda h: f"{h['ram']['used_gb']:.1f}/{h['ram']['total_gb']:.1f}"),
+    ],
+    "disk": [
+        ("/ %", lambda h: f"{h['disk']['percent']:.0f}"),
+        ("FULLEST", lambda h: f"{h['worst_mount'][0]} {h['worst_mount'][1]:.0f}%" if h["worst_mount"] else "-"),
+    ],
+    "uptime": [
+        ("UPTIME", lambda h: _format_uptime(h["ts"] - h["boot_time"])),
+    ],
+    "hosts": [
+        ("IP", lambda h: h["ip"]),
+        ("CONTAINERS", lambda h: str(h["containers"])),
+    ],
+}
+
+class FleetCoordinator:
+    """
+    Координатор флота: принимает сводки агентов и хранит последнюю по каждому хосту.
+    Команды отвечают одной таблицей из этого кэша - время ответа не зависит от числа хостов.
+    """
+
+    def __init__(self, listen: str, token: str, stale: float):
+        self.listen = listen
+        self.token = token
+        self.stale = stale
+        self.hosts = {}
+        self.host = None
+        self.ip = None
+        self._server = None
+        # Задача обработчика соединения агента -> writer (на остановке закрываем и дожидаемся)
+        self._connections = {}
+
+    async def start(self, host: str, ip: str):
+        self.host, self.ip = host, ip
+        bind_host, port = _split_addr(self.listen)
+        if not self.token:
+            logger.warning("FLEET_TOKEN is empty: any agent that can reach the coordinator will be accepted.")
+        self._server = await asyncio.start_server(self._handle, bind_host, port, limit=MAX_MESSAGE)
+        logger.info(f"Fleet coordinator listening on {bind_host}:{port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Соединения агентов живут долго - закрываем их сами, иначе wait_closed их ждет
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def record(self, snapshot: dict):
+        """Подписчик sampler: координатор - тоже хост флота."""
+        self.hosts[self.host] = summarize(snapshot, self.host, self.ip)
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        host = None
+        self._connections[asyncio.current_task()] = writer
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), 10))
+            if not isinstance(hello, dict) or hello.get("type") != "hello" or not hmac.compare_digest(
+                str(hello.get("token", "")).encode(), self.token.encode()
+            ):
+                logger.warning(f"Fleet: rejected agent {peer}")
+                return
+            if not isinstance(hello.get("host"), str) or not hello["host"]:
+                raise ValueError("hello without a host name")
+            host = hello["host"]
+            writer.write(b'{"type": "ok"}\n')
+            await writer.drain()
+            logger.info(f"Fleet: agent {host} connected from {peer}")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise ValueError("message is not a JSON object")
+                if message.get("type") == "snapshot":
+                    # Проверяем сразу: кривая сводка в кэше ломала бы render() для всех команд
+                    summary = check_summary(message)
+                    summary["host"] = host
+                    summary["received"] = time.time()
+                    self.hosts[host] = summary
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError, KeyError, ConnectionError) as e:
+            logger.warning(f"Fleet: connection from {host or peer} dropped: {e}")
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+        if host:
+            logger.info(f"Fleet: agent {host} disconnected")
+
+    def render(self, command: str, target: str = None) -> str:
+        """Одна таблица по всем хостам (или по одному target) для команды из TABLES."""
+        columns = TABLES[command]
+        now = time.time()
+        hosts = sorted(self.hosts.values(), key=lambda h: h["host"])
+        if target is not None:
+            hosts = [h for h in hosts if h["host"] == target]
+            if not hosts:
+                return f"❓ Host {target} has not reported to the coordinator."
+        width = max([len("HOST")] + [len(h["host"]) for h in hosts]) + 2
+        header = f"{'HOST':<{width}}" + "".join(f"{title:<{max(len(title), 6) + 2}}" for title, _ in columns)
+        lines, offline = [header], 0
+        for h in hosts:
+            row = f"{h['host']:<{width}}" + "".join(
+                f"{fmt(h):<{max(len(title), 6) + 2}}" for title, fmt in columns
+            )
+            age = now - h.get("received", h["ts"])
+            if h["host"] != self.host and age > self.stale:
+                row += f" ⚠️ {age:.0f}s ago"
+                offline += 1
+            lines.append(row.rstrip())
+        summary = f"{len(hosts)} hosts" + (f", {offline} not reporting" if offline else "")
+        return "\n".join(lines) + f"\n\n{summary}"
+
+class FleetAgent:
+    """
+    Агент флота: держит одно TCP-соединение с координатором и отправляет сводку
+    после каждого замера. Отправляется только последняя сводка - очередь не копится.
+    """
+
+    def __init__(self, coordinator: str, token: str):
+        self.coordinator = coordinator
+        self.token = token
+        self.host = None
+        self.ip = None
+        self._latest = None
+        self._ready = asyncio.Event()
+        self._task = None
+
+    async def start(self, host: str, ip: str):
+        self.host, self.ip = host, ip
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish(self, snapshot: dict):
+        """Подписчик sampler."""
+        self._latest = summarize(snapshot, self.host, self.ip)
+        self._ready.set()
+
+    async def _run(self):
+        delay = RECONNECT_DELAY[0]
+        host, port = _split_addr(self.coordinator, "127.0.0.1")
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE)
+                writer.write(json.dumps({"type": "hello", "host": self.host, "token": self.token}).encode() + b"\n")
+                await writer.drain()
+                reply = json.loads(await asyncio.wait_for(reader.readline(), 10) or b"{}")
+                if not isinstance(reply, dict):
+                    raise ValueError(f"unexpected reply from coordinator: {reply!r}")
+                if reply.get("type") != "ok":
+                    raise ConnectionError("coordinator rejected the agent (check FLEET_TOKEN)")
+                logger.info(f"Fleet: connected to coordinator {host}:{port}")
+                delay = RECONNECT_DELAY[0]
+                while True:
+                    if self._latest is None:
+                        await self._ready.wait()
+                    self._ready.clear()
+                    message = dict(self._latest, type="snapshot")
+                    writer.write(json.dumps(message).encode() + b"\n")
+                    await writer.drain()
+                    await self._ready.wait()
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Fleet: coordinator {host}:{port} unavailable: {e}. Retrying in {delay}s")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY[1])
+
+# Режим флота (FLEET_MODE): coordinator отвечает за всех, agent только отправляет сводки
+coordinator = FleetCoordinator(FLEET_LISTEN, FLEET_TOKEN, FLEET_STALE) if FLEET_MODE == "coordinator" else None
+agent = FleetAgent(FLEET_COORDINATOR, FLEET_TOKEN) if FLEET_MODE == "agent" else None
+
+async def simulate(count: int, address: str, interval: float):
+    """Запускает count фейковых агентов (sim-1..N) со случайными метриками - проверка на localhost."""
+    agents = []
+    for i in range(1, count + 1):
+        fake = FleetAgent(address, FLEET_TOKEN)
+        await fake.start(f"sim-{i}", f"127.0.0.{i % 250 + 1}")
+        agents.append(fake)
+    total_gb = psutil.virtual_memory().total / 1024 ** 3
+    while True:
+        for fake in agents:
+            ram = random.uniform(10, 95)
+            fake.publish({
+                "ts": time.time(), "cpu": round(random.uniform(0, 100), 1),
+                "load": (random.uniform(0, 4), random.uniform(0, 4), random.uniform(0, 4)),
+                "ram": {"percent": ram, "used_gb": total_gb * ram / 100, "total_gb": total_gb},
+                "disk": {"percent": random.uniform(20, 95), "used_gb": 50.0, "total_gb": 100.0},
+            })
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    # python -m bot.fleet 20 127.0.0.1:8765 - 20 агентов для координатора на localhost
+    asyncio.run(simulate(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        sys.argv[2] if len(sys.argv) > 2 else FLEET_COORDINATOR,
+        5,
+    ))
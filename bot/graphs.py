@@ -1,30 +1,168 @@
-import matplotlib.pyplot as plt
 import io
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 import psutil
+from bot.config import GRAPH_CACHE_SIZE
+from bot.history import history
+from bot.logger import setup_logger
 
-# Говорим matplotlib, чтобы он не пытался открыть GUI (у нас сервер без монитора)
-plt.switch_backend('Agg')
+logger = setup_logger()
+
+# Какие ряды истории рисуются для метрики /graph и подпись оси Y
+GRAPH_METRICS = {
+    "cpu": (["cpu"], "CPU, %"),
+    "ram": (["ram"], "RAM, %"),
+    "disk": (["disk"], "Disk, %"),
+    "load": (["load1", "load5", "load15"], "Load Average"),
+}
+COLORS = ['#ff6b6b', '#339af0', '#51cf66']
+
+# Больше точек на графике шириной 8 дюймов все равно не видно
+MAX_POINTS = 1500
+
+# matplotlib не потокобезопасен, а рисуем мы из рабочих потоков
+_render_lock = threading.Lock()
+
+# Кэш готовых PNG: (метрика, диапазон, заголовок, версия данных) -> bytes
+_cache = OrderedDict()
+
+# Фигура для линейных графиков создается один раз и переиспользуется
+_line_fig = None
+
+# matplotlib.pyplot импортируется при первой отрисовке (импорт стоит сотни мс и десятки МБ)
+_plt = None
+
+def _pyplot():
+    """Ленивый импорт matplotlib.pyplot с backend без GUI."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        # Говорим matplotlib, чтобы он не пытался открыть GUI (у нас сервер без монитора)
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
+def prewarm():
+    """Заранее импортирует matplotlib и создает фигуру (вызывается в фоне после старта)."""
+    started = time.perf_counter()
+    with _render_lock:
+        _get_line_figure()
+    logger.info(f"Graph backend pre-warmed in {(time.perf_counter() - started) * 1000:.0f} ms.")
 
 def create_pie_chart():
     """Создает график использования RAM и возвращает байты изображения."""
     mem = psutil.virtual_memory()
-    
+
     # Данные для графика
     labels = [f'Used: {mem.percent}%', f'Free: {100-mem.percent}%']
     sizes = [mem.percent, 100 - mem.percent]
     colors = ['#ff6b6b', '#51cf66']
-    explode = (0.1, 0) 
+    explode = (0.1, 0)
 
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.pie(sizes, explode=explode, labels=labels, colors=colors,
-           autopct='%1.1f%%', shadow=True, startangle=90)
-    ax.axis('equal')  # Делает круг круглым
-    
-    plt.title(f"Memory Usage (Total: {mem.total/(1024**3):.1f} GB)")
+    with _render_lock:
+        plt = _pyplot()
+        fig, ax = plt.subplots(figsize=(6, 4))
+        ax.pie(sizes, explode=explode, labels=labels, colors=colors,
+               autopct='%1.1f%%', shadow=True, startangle=90)
+        ax.axis('equal')  # Делает круг круглым
+
+        plt.title(f"Memory Usage (Total: {mem.total/(1024**3):.1f} GB)")
+
+        # Сохраняем картинку в оперативную память (BytesIO), а не в файл
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        buf.seek(0)
+        plt.close(fig) # Важно закрывать фигуру, чтобы не течь память
+    return buf
+
+def _get_line_figure():
+    """Фигура, оси и линии для истории - создаются при первом вызове."""
+    global _line_fig
+    if _line_fig is None:
+        plt = _pyplot()
+        import matplotlib.dates as mdates
+        fig, ax = plt.subplots(figsize=(8, 4))
+        lines = [ax.plot([], [], color=color, linewidth=1.2)[0] for color in COLORS]
+        ax.grid(True, alpha=0.3)
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        # Фигура живет всё время работы бота - убираем ее из менеджера pyplot
+        plt.close(fig)
+        _line_fig = (fig, ax, lines)
+    return _line_fig
+
+def _downsample(ts: list, values: list, limit: int):
+    """Усредняет точки по корзинам, чтобы их было не больше limit."""
+    if len(ts) <= limit:
+        return ts, values
+    step = -(-len(ts) // limit)
+    out_ts, out_values = [], []
+    for i in range(0, len(ts), step):
+        chunk = values[i:i + step]
+        out_ts.append(ts[i])
+        out_values.append(sum(chunk) / len(chunk))
+    return out_ts, out_values
+
+def _render_history(metric: str, seconds: int, title: str):
+    series, ylabel = GRAPH_METRICS[metric]
+    end = time.time()
+    start = end - seconds
+
+    fig, ax, lines = _get_line_figure()
+    has_data = False
+    for line, name in zip(lines, series):
+        ts, avg, _ = history.query(name, start, end)
+        ts, avg = _downsample(ts, avg, MAX_POINTS)
+        line.set_data([datetime.fromtimestamp(t) for t in ts], avg)
+        line.set_label(name)
+        line.set_visible(bool(ts))
+        has_data = has_data or bool(ts)
+    for line in lines[len(series):]:
+        line.set_data([], [])
+        line.set_visible(False)
+    if not has_data:
+        return None
+
+    ax.relim(visible_only=True)
+    if ylabel.endswith("%"):
+        ax.set_ylim(0, 100)
+    else:
+        ax.set_ylim(auto=True)
+        ax.autoscale_view(scalex=False)
+        ax.set_ylim(bottom=0)
+    ax.set_xlim(datetime.fromtimestamp(start), datetime.fromtimestamp(end))
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    legend = ax.get_legend()
+    if len(series) > 1:
+        ax.legend(loc="upper left")
+    elif legend:
+        legend.remove()
 
-    # Сохраняем картинку в оперативную память (BytesIO), а не в файл
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    buf.seek(0)
-    plt.close(fig) # Важно закрывать фигуру, чтобы не течь память
-    return buf
\ No newline at end of file
+    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+    return buf.getvalue()
+
+def create_history_chart(metric: str, seconds: int, title: str):
+    """
+    Линейный график метрики из истории за последние seconds секунд.
+    Возвращает BytesIO с PNG или None, если данных еще нет.
+    Пока не записан новый снимок, повторный запрос отдается из кэша без отрисовки.
+    """
+    key = (metric, seconds, title, history.version)
+    with _render_lock:
+        png = _cache.get(key)
+        if png is not None:
+            _cache.move_to_end(key)
+        else:
+            png = _render_history(metric, seconds, title)
+            if png is None:
+                return None
+            _cache[key] = png
+            while len(_cache) > GRAPH_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return io.BytesIO(png)
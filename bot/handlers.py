@@ -1,13 +1,35 @@
-import subprocess
+import asyncio
 import socket
-import io
 import os
+import re
+import shlex
+import time
 from telegram import Update
 from telegram.ext import ContextTypes
-from bot.config import is_authorized, TELEGRAM_USER_ID
+from bot.config import (
+    is_authorized, TELEGRAM_USER_ID, TAIL_FLUSH_INTERVAL, DL_LOGS_DEFAULT_LINES, GREP_MAX_RESULTS, BASH_MAX_JOBS,
+    FIX_JOURNAL_MAX_MB,
+)
 from bot.logger import setup_logger
-from bot.metrics import get_cpu_usage, get_load_avg, get_ram_usage, get_disk_usage, get_uptime
-from bot.graphs import create_pie_chart
+from bot.outbox import outbox
+from bot.instrument import instrumentation, summary as instrument_summary
+from bot.metrics import get_uptime
+from bot.sampler import sampler
+from bot.jobs import start_job, jobs as bash_jobs
+from bot.docker_api import (
+    DockerError, list_containers, container_logs, restart_container, system_prune,
+    container_log_path, prune_images, prune_volumes,
+)
+from bot.diskscan import disk_scanner, format_report
+from bot.cache import response_cache
+from bot.tail import TailSession, sessions as tail_sessions
+from bot.logexport import export_logs
+from bot.logindex import log_index, log_feed
+# bot.graphs импортирует matplotlib только при первой отрисовке
+from bot.graphs import create_pie_chart, create_history_chart, GRAPH_METRICS
+from bot.history import history
+from bot.processes import process_table, top_processes, SORT_KEYS
+from bot.fleet import coordinator as fleet_coordinator, agent as fleet_agent
 
 logger = setup_logger()
 
@@ -29,11 +51,15 @@ if SERVER_IP == "Unknown":
     except Exception:
         pass
 
+async def reply(update: Update, text: str, **kwargs):
+    """Ответ в чат команды через общую очередь исходящих сообщений (лимиты Telegram, склейка)."""
+    return await outbox.send_message(update.effective_chat.id, text, **kwargs)
+
 async def check_access(update: Update) -> bool:
     """ Middleware для проверки доступа."""
     user_id = update.effective_user.id
     if not is_authorized(user_id):
-        await update.message.reply_text("⛔ Access Denied. You are not authorized.")
+        await reply(update, "⛔ Access Denied. You are not authorized.")
         logger.warning(f"Unauthorized access attempt from ID: {user_id}")
         return False
     return True
@@ -45,7 +71,7 @@ async def send_server_message(update: Update, text: str, **kwargs):
     """
     # Выводим как: Server: DB-Server (192.168.1.50)
     header = f"🖥️ *Server: {HOSTNAME} ({SERVER_IP})*\n\n"
-    await update.message.reply_text(header + text, **kwargs)
+    await reply(update, header + text, **kwargs)
 
 def check_target(context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
@@ -60,12 +86,79 @@ def check_target(context: ContextTypes.DEFAULT_TYPE) -> bool:
         return target_host == HOSTNAME
     return True
 
+def parse_target(context: ContextTypes.DEFAULT_TYPE, keywords=(), args=None) -> tuple:
+    """
+    Таргетинг для команд со своими аргументами (например, /graph cpu 24h).
+    Первый аргумент считается именем хоста, если он не является аргументом команды (keywords) или числом.
+    args - уже разобранные аргументы (по умолчанию context.args).
+    Возвращает (команда для нас?, аргументы без имени хоста).
+    """
+    args = list(context.args or []) if args is None else list(args)
+    if args and args[0] == HOSTNAME:
+        return True, args[1:]
+    if args and args[0] not in keywords and not args[0].isdigit():
+        return False, args
+    return True, args
+
+async def fleet_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str) -> bool:
+    """
+    Режим флота: координатор отвечает одной таблицей из кэша сводок, агенты молчат.
+    Возвращает True, если команда уже обработана (дальше хендлер ничего не делает).
+    """
+    if fleet_agent:
+        return True
+    if not fleet_coordinator:
+        return False
+    target = context.args[0] if context.args else None
+    table = fleet_coordinator.render(command, target)
+    # Обычно одно сообщение; очень большой флот делится по строкам под лимит Telegram
+    chunks, current = [], ""
+    for line in table.split("\n"):
+        if current and len(current) + len(line) > 3800:
+            chunks.append(current)
+            current = ""
+        current += line + "\n"
+    chunks.append(current)
+    for chunk in chunks:
+        await reply(update, f"🌐 *Fleet: /{command}*\n```\n{chunk}```", parse_mode="Markdown")
+    return True
+
+_DURATION_RE = re.compile(r"^(\d+)([smhdw])$")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# Имя хоста: буквы, цифры, точка, дефис, подчеркивание
+HOSTNAME_RE = re.compile(r"[\w.-]+")
+
+def quoted_args(update: Update) -> list:
+    """
+    Аргументы из исходного текста команды: кавычки группируют слова и остаются на аргументе,
+    обратные слеши (\\d, \\s в регулярках) сохраняются - в отличие от context.args и shlex в режиме posix.
+    """
+    parts = (update.effective_message.text or "").split(None, 1)
+    rest = parts[1] if len(parts) > 1 else ""
+    try:
+        return shlex.split(rest, posix=False)
+    except ValueError:
+        return rest.split()
+
+def unquote(arg: str) -> str:
+    if len(arg) >= 2 and arg[0] == arg[-1] and arg[0] in "\"'":
+        return arg[1:-1]
+    return arg
+
+def parse_duration(value: str) -> int:
+    """'30m', '24h', '7d' -> секунды. ValueError, если формат не распознан."""
+    match = _DURATION_RE.match(value.lower())
+    if not match:
+        raise ValueError(f"Bad duration: {value}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
 # --- Команды БЕЗ имени сервера (общие) ---
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
     
-    await update.message.reply_text(
+    await reply(update, 
         f"👋 Hello! Access granted.\n"
         f"Your ID: {TELEGRAM_USER_ID}\n"
         f"Use /status to check server health."
@@ -77,7 +170,8 @@ async def list_hosts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Команда обнаружения: каждый сервер в чате отзовется своим именем и IP.
     """
     if not await check_access(update): return
-    await update.message.reply_text(f"🖥️ Host Online: *{HOSTNAME}* IP: `{SERVER_IP}`", parse_mode="Markdown")
+    if await fleet_answer(update, context, "hosts"): return
+    await reply(update, f"🖥️ Host Online: *{HOSTNAME}* IP: `{SERVER_IP}`", parse_mode="Markdown")
     logger.info(f"Host {HOSTNAME} responded to /hosts")
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -91,44 +185,58 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔹 /hosts - 🌐 Показать список активных серверов\n\n"
 
         "💻 *Управление (Shell):*\n"
-        "🔹 /bash <cmd> - Выполнить команду (локально / на хосте)\n\n"
+        "🔹 /bash <cmd> - Выполнить команду (локально / на хосте)\n"
+        "🔹 /cancel [N] - 🛑 Остановить запущенную команду\n\n"
         
         "📊 *Мониторинг (Один или Все):*\n"
         "🔹 /status - Сводка (если пусто - ВСЕ, если /status server-1 - точечно)\n"
         "🔹 /cpu - Загрузка процессора\n"
         "🔹 /ram - Использование памяти\n"
         "🔹 /disk - Использование дискового пространства\n"
-        "🔹 /uptime - Время работы сервера\n\n"
+        "🔹 /net - 🌐 Трафик по интерфейсам и TCP-соединения\n"
+        "🔹 /uptime - Время работы сервера\n"
+        "🔹 /procs [cpu|mem|io] [N] - Самые тяжелые процессы\n\n"
         
         "🤖 *ChatOps (Управление Docker):*\n"
         "🔹 /ps - 🐳 Список контейнеров\n"
+        "🔹 /top [cpu|mem|net|io] - 📊 Ресурсы контейнеров\n"
         "🔹 /logs <name> - 📋 Логи контейнера (последние 20 строк)\n"
-        "🔹 /dl_logs <name> - 📥 Скачать файл логов (без сохранения на диск)\n"
+        "🔹 /dl_logs <name> [5000|6h|all] - 📥 Скачать сжатый файл логов\n"
         "🔹 /tail <name> - 👀 Мониторинг в реальном времени\n"
         "🔹 /stop_tail - 🛑 Остановить мониторинг\n"
+        "🔹 /grep \"pattern\" [name] [6h] - 🔎 Поиск по логам всех контейнеров\n"
         "🔹 /restart <name> - 🔄 Перезагрузка контейнера\n"
-        "🔹 /fix - 🩹 Авто-ремонт (очистка кэша)\n\n"
+        "🔹 /fix - 🩹 Авто-ремонт (очистка кэша)\n"
+        "🔹 /fix analyze [path] - 🔍 Что занимает диск + точечная очистка\n\n"
         
         "📈 *Визуализация:*\n"
         "🔹 /graph - 📈 График использования RAM\n"
-        "🔹 /alerts - Статус активных аномалий\n\n"
+        "🔹 /graph <cpu|ram|disk|load> <24h> - 📉 История метрики за период\n"
+        "🔹 /alerts - Статус активных аномалий\n"
+        "🔹 /botstats - ⏱️ Задержки и ошибки самого бота\n\n"
         
         "💡 *Пример:* `/logs server-1 nginx` покажет логи nginx только на server-1."
     )
     
-    await update.message.reply_text(help_text, parse_mode="Markdown")
+    await reply(update, help_text, parse_mode="Markdown")
     logger.info(f"User {update.effective_user.id} requested help.")
 
 # --- Команды С ИМЕНЕМ СЕРВЕРА (используем send_server_message) ---
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
+    if await fleet_answer(update, context, "status"): return
     if not check_target(context): return
 
-    cpu = get_cpu_usage()
-    load = get_load_avg()
-    ram = get_ram_usage()
-    disk = get_disk_usage()
+    text = await response_cache.get(("status",), status_text)
+    await send_server_message(update, text, parse_mode="Markdown")
+
+async def status_text() -> str:
+    snapshot = await sampler.get()
+    cpu = snapshot["cpu"]
+    load = snapshot["load"]
+    ram = snapshot["ram"]
+    disk = snapshot["disk"]
     uptime = get_uptime()
 
     text = (
@@ -137,13 +245,14 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"⚖ Load: {load[0]:.2f} / {load[1]:.2f} / {load[2]:.2f}\n"
         f"🧠 RAM: {ram['used_gb']:.2f}GB / {ram['total_gb']:.2f}GB ({ram['percent']}%)\n"
         f"💾 Disk: {disk['used_gb']:.2f}GB / {disk['total_gb']:.2f}GB ({disk['percent']}%)\n"
+        f"{format_net_summary(snapshot)}"
         f"⏳ Uptime: {uptime}"
     )
-    await send_server_message(update, text, parse_mode="Markdown")
+    return text
 
 async def bash_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Выполнение произвольной команды на сервере.
+    Выполнение произвольной команды на сервере в фоне, вывод обновляется в одном сообщении.
     Использование:
     /bash ls -la               (на текущем сервере)
     /bash server-1 ls -la       (на server-1)
@@ -151,7 +260,7 @@ async def bash_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
 
     if not context.args:
-        await update.message.reply_text("Usage: /bash <command> or /bash <hostname> <command>")
+        await reply(update, "Usage: /bash <command> or /bash <hostname> <command>")
         return
 
     # Анализ аргументов
@@ -169,68 +278,110 @@ async def bash_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Собираем команду в строку (shell=True)
     cmd_str = " ".join(command_parts)
+    if not cmd_str:
+        await reply(update, "Usage: /bash <command> or /bash <hostname> <command>")
+        return
 
-    await update.message.reply_text(f"🔄 Executing `{cmd_str}` on *{HOSTNAME}*...", parse_mode="Markdown")
-
-    try:
-        # Выполняем. Таймаут 15 секунд, чтобы не повесить бота
-        result = subprocess.run(cmd_str, shell=True, capture_output=True, text=True, timeout=15)
-
-        output = result.stdout
-        error = result.stderr
+    # Не ждем завершения: задача сама редактирует свое сообщение и присылает итог
+    job = start_job(update.effective_chat.id, cmd_str, HOSTNAME)
+    if job is None:
+        await send_server_message(update, 
+            f"⏳ Already running {BASH_MAX_JOBS} commands. Wait for them or use /cancel.",
+            parse_mode="Markdown"
+        )
+        return
+    logger.info(f"/bash job {job.id} started: {cmd_str}")
 
-        # Обрезаем вывод, если слишком длинный (Telegram limit ~4096)
-        MAX_LEN = 3000
-        if len(output) > MAX_LEN:
-            output = output[:MAX_LEN] + "\n... (truncated)"
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /cancel            - остановить все свои команды /bash
+    /cancel 3          - остановить задачу 3
+    /cancel server-1 3 - то же, только на server-1
+    """
+    if not await check_access(update): return
+    for_us, args = parse_target(context)
+    if not for_us: return
+
+    chat_id = update.effective_chat.id
+    own = [job for job in bash_jobs.values() if job.chat_id == chat_id]
+    if args:
+        own = [job for job in own if str(job.id) == args[0]]
+        if not own:
+            await send_server_message(update, f"ℹ️ No running job {args[0]}.")
+            return
+    if not own:
+        await send_server_message(update, "ℹ️ No running commands.")
+        return
+    for job in own:
+        job.cancel()
+    await send_server_message(update, "🛑 Cancelled: " + ", ".join(f"job {job.id}" for job in own))
 
-        response = f"🖥️ *Host: {HOSTNAME}*\n\n📝 *Output:*\n```\n{output}\n```"
-        
-        if error:
-             response += f"\n❌ *Errors:*\n```\n{error[:500]}\n```"
+async def graph_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /graph                 - круговая диаграмма RAM
+    /graph cpu 24h         - история метрики (cpu, ram, disk, load) за период (30m, 24h, 7d...)
+    /graph server-1 ram 7d - то же, только на server-1
+    """
+    if not await check_access(update): return
+    for_us, args = parse_target(context, GRAPH_METRICS)
+    if not for_us: return
 
-        await send_server_message(update, response, parse_mode="Markdown")
+    if not args:
+        await reply(update, "📊 Generating chart... please wait.")
+        try:
+            image_buffer = await asyncio.to_thread(create_pie_chart)
+            # Добавляем IP в подпись к фото
+            caption = f"💾 Memory Usage for *{HOSTNAME}* ({SERVER_IP})"
 
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("⏱️ Command timed out (15s limit).")
-    except Exception as e:
-        await update.message.reply_text(f"❌ Execution failed: {e}")
+            await outbox.call(update.effective_chat.id, "send_photo", 
+                photo=image_buffer,
+                caption=caption,
+                parse_mode="Markdown"
+            )
+            logger.info("Graph sent successfully.")
+        except Exception as e:
+            logger.error(f"Error generating graph: {e}")
+            await reply(update, "❌ Failed to generate graph.")
+        return
 
-async def graph_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not await check_access(update): return
-    if not check_target(context): return
+    metric = args[0]
+    period = args[1] if len(args) > 1 else "1h"
+    try:
+        seconds = parse_duration(period)
+    except ValueError:
+        await reply(update, f"Usage: /graph <{'|'.join(GRAPH_METRICS)}> <range: 30m, 24h, 7d>")
+        return
+    if history is None:
+        await reply(update, "ℹ️ Metrics history is disabled (HISTORY_DIR is empty).")
+        return
 
-    await update.message.reply_text("📊 Generating chart... please wait.")
-    
     try:
-        image_buffer = create_pie_chart()
-        # Добавляем IP в подпись к фото
-        caption = f"💾 Memory Usage for *{HOSTNAME}* ({SERVER_IP})"
-        
-        await update.message.reply_photo(
+        title = f"{metric.upper()} - last {period} ({HOSTNAME})"
+        image_buffer = await asyncio.to_thread(create_history_chart, metric, seconds, title)
+        if image_buffer is None:
+            await send_server_message(update, f"ℹ️ No {metric} history for the last {period} yet.")
+            return
+        await outbox.call(update.effective_chat.id, "send_photo", 
             photo=image_buffer,
-            caption=caption,
+            caption=f"📈 {metric.upper()} for *{HOSTNAME}* ({SERVER_IP}), last {period}",
             parse_mode="Markdown"
         )
-        logger.info("Graph sent successfully.")
     except Exception as e:
-        logger.error(f"Error generating graph: {e}")
-        await update.message.reply_text("❌ Failed to generate graph.")
+        logger.error(f"Error generating history graph: {e}")
+        await reply(update, "❌ Failed to generate graph.")
 
 async def docker_ps(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
     if not check_target(context): return
     
     try:
-        result = subprocess.run(['docker', 'ps', '--format', 'table {{.Names}}\t{{.Status}}'], 
-                                capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            await send_server_message(update, f"🐳 *Docker Containers:*\n```\n{result.stdout}\n```", parse_mode="Markdown")
-        else:
-            await update.message.reply_text("❌ Error executing docker ps")
+        table = await response_cache.get(("ps",), list_containers)
+        await send_server_message(update, f"🐳 *Docker Containers:*\n```\n{table}\n```", parse_mode="Markdown")
+    except DockerError as e:
+        logger.error(f"docker ps failed: {e}")
+        await reply(update, "❌ Error executing docker ps")
     except Exception as e:
-        await update.message.reply_text(f"Error: {e}")
+        await reply(update, f"Error: {e}")
 
 async def docker_logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
@@ -244,52 +395,74 @@ async def docker_logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Формат: /logs nginx
         container_name = context.args[0]
     else:
-        await update.message.reply_text("Usage: /logs <container_name> or /logs <hostname> <container_name>")
+        await reply(update, "Usage: /logs <container_name> or /logs <hostname> <container_name>")
         return
     
     try:
-        result = subprocess.run(['docker', 'logs', '--tail', '20', container_name], 
-                                capture_output=True, text=True)
-        await send_server_message(update, f"📋 *Logs for {container_name}:*\n```\n{result.stdout}\n```", parse_mode="Markdown")
+        logs = await response_cache.get(("logs", container_name), lambda: container_logs(container_name, tail=20))
+        await send_server_message(update, f"📋 *Logs for {container_name}:*\n```\n{logs}\n```", parse_mode="Markdown")
     except Exception as e:
-        await update.message.reply_text(f"❌ Could not fetch logs: {e}")
+        await reply(update, f"❌ Could not fetch logs: {e}")
+
+def _parse_log_range(value: str) -> tuple:
+    """Диапазон для /dl_logs: '5000' -> (tail=5000, since=None), '6h' -> (None, сейчас-6ч), 'all' -> (None, None)."""
+    if value.lower() == "all":
+        return None, None
+    if value.isdigit():
+        return int(value), None
+    return None, time.time() - parse_duration(value)
+
+def _is_log_range(value: str) -> bool:
+    try:
+        _parse_log_range(value)
+        return True
+    except ValueError:
+        return False
 
 async def docker_download_logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /dl_logs <name> [lines|range]          - 2000 строк по умолчанию, '20000', '6h', '2d' или 'all'
+    /dl_logs <hostname> <name> [lines|range]
+    Логи потоково сжимаются (gzip/zstd) и отправляются частями меньше лимита Telegram.
+    """
     if not await check_access(update): return
-    if not check_target(context): return
-    
-    container_name = ""
-    if len(context.args) >= 2:
-        container_name = context.args[1]
-    elif len(context.args) == 1:
-        container_name = context.args[0]
-    else:
-        await update.message.reply_text("Usage: /dl_logs <container_name> or /dl_logs <hostname> <container_name>")
+
+    args = list(context.args or [])
+    if args and args[0] == HOSTNAME:
+        args = args[1:]
+    elif len(args) >= 2 and not _is_log_range(args[1]):
+        # /dl_logs other-host nginx - команда для другого сервера
+        return
+    if not args or (len(args) >= 2 and not _is_log_range(args[1])):
+        await reply(update, 
+            "Usage: /dl_logs <container_name> [lines|range] or /dl_logs <hostname> <container_name> [lines|range]\n"
+            "Range: 5000 (lines), 6h, 2d or all"
+        )
         return
 
-    await update.message.reply_text(f"📥 Downloading logs for *{container_name}* (last 2000 lines)...", parse_mode="Markdown")
-    
-    try:
-        result = subprocess.run(['docker', 'logs', '--tail', '2000', container_name], 
-                                capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            await update.message.reply_text(f"❌ Error: {result.stderr}")
-            return
+    container_name = args[0]
+    period = args[1] if len(args) >= 2 else str(DL_LOGS_DEFAULT_LINES)
+    tail, since = _parse_log_range(period)
+    scope = f"last {tail} lines" if tail is not None else ("all" if since is None else f"last {period}")
 
-        log_data = io.BytesIO(result.stdout.encode('utf-8'))
-        log_data.name = f"{HOSTNAME}_{container_name}_logs.txt"
-        
-        await update.message.reply_document(
-            document=log_data,
-            caption=f"📂 Logs for *{container_name}* (Server: {HOSTNAME}) generated in memory.", 
-            filename=log_data.name,
+    await reply(update, f"📥 Downloading logs for *{container_name}* ({scope})...", parse_mode="Markdown")
+
+    async def send_part(fileobj, index: int, extension: str):
+        filename = f"{HOSTNAME}_{container_name}_logs.part{index}.txt.{extension}"
+        await outbox.call(update.effective_chat.id, "send_document", 
+            document=fileobj,
+            filename=filename,
+            caption=f"📂 Logs for *{container_name}* ({scope}, part {index}) - Server: {HOSTNAME}",
             parse_mode="Markdown"
         )
-        logger.info(f"User downloaded logs for {container_name}")
-        
+
+    try:
+        parts, raw_bytes = await export_logs(container_name, send_part, tail=tail, since=since)
+        logger.info(f"User downloaded logs for {container_name}: {raw_bytes} bytes in {parts} part(s)")
+    except DockerError as e:
+        await reply(update, f"❌ Error: {e}")
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to generate file: {e}")
+        await reply(update, f"❌ Failed to generate file: {e}")
 
 async def docker_tail_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
@@ -301,65 +474,103 @@ async def docker_tail_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif len(context.args) == 1:
         container_name = context.args[0]
     else:
-        await update.message.reply_text("Usage: /tail <container_name> or /tail <hostname> <container_name>")
+        await reply(update, "Usage: /tail <container_name> or /tail <hostname> <container_name>")
         return
     
     user_id = update.effective_user.id
-    job_name = f"tail_{user_id}"
-    
-    current_jobs = context.job_queue.get_jobs_by_name(job_name)
-    if current_jobs:
-        await update.message.reply_text(f"⚠️ You are already monitoring `{container_name}`. Use /stop_tail to stop.")
+
+    if user_id in tail_sessions:
+        await reply(update, f"⚠️ You are already monitoring `{tail_sessions[user_id].container}`. Use /stop_tail to stop.")
         return
 
-    await update.message.reply_text(f"👀 Started watching logs for *{container_name}*.\nI will update you every 10s.", parse_mode="Markdown")
-    
-    # Запускаем фоновую задачу. Передаем HOSTNAME чтобы коллбек знал откуда логи
-    context.job_queue.run_repeating(
-        callback=tail_callback,
-        interval=10, 
-        first=5,
-        data={"name": container_name, "user_id": user_id, "hostname": HOSTNAME},
-        name=job_name
+    await reply(update, 
+        f"👀 Started watching logs for *{container_name}*.\n"
+        f"New lines are streamed live (batched every {TAIL_FLUSH_INTERVAL:g}s).",
+        parse_mode="Markdown"
     )
 
-async def tail_callback(context: ContextTypes.DEFAULT_TYPE):
-    """Функция, которая вызывается каждые 10 секунд."""
-    job_data = context.job.data
-    container_name = job_data['name']
-    current_hostname = job_data['hostname']
-    
-    result = subprocess.run(['docker', 'logs', '--since', '10s', container_name], 
-                            capture_output=True, text=True)
-    
-    if result.stdout:
-        try:
-            # Добавляем HOSTNAME в сообщение логов
-            text = (
-                f"📝 *{current_hostname}* | Logs for `{container_name}`:\n"
-                f"```\n{result.stdout[:3000]}\n```"
-            )
-            await context.bot.send_message(
-                chat_id=job_data['user_id'],
-                text=text,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            logger.error(f"Failed to send tail update: {e}")
+    # Один долгоживущий поток логов на пользователя. HOSTNAME - чтобы было видно, откуда логи
+    # Если контейнер уже читает индексатор логов - подписываемся на его поток
+    source = log_feed.lines(container_name) if log_feed and log_feed.follows(container_name) else None
+    session = TailSession(user_id, container_name, HOSTNAME, source=source)
+    tail_sessions[user_id] = session
+    session.start()
 
 async def docker_tail_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Останавливает мониторинг."""
     if not await check_access(update): return
     
     user_id = update.effective_user.id
-    job_name = f"tail_{user_id}"
-    
-    current_jobs = context.job_queue.get_jobs_by_name(job_name)
-    if current_jobs:
-        current_jobs[0].schedule_removal()
-        await update.message.reply_text("✅ Stopped watching logs.")
+
+    session = tail_sessions.pop(user_id, None)
+    if session:
+        await session.stop()
+        await reply(update, "✅ Stopped watching logs.")
+    else:
+        await reply(update, "ℹ️ No active monitoring found.")
+
+async def grep_logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /grep [hostname] <pattern> [container] [since]
+    Поиск по локальному индексу логов всех контейнеров (регулярка без учета регистра).
+    Шаблон с пробелами берется в кавычки: /grep "connection refused" nginx 6h
+    Простое слово первым аргументом - имя хоста (как у остальных команд), поэтому шаблон
+    для всех хостов без символов регулярки тоже берется в кавычки: /grep "timeout"
+    """
+    if not await check_access(update): return
+
+    args = quoted_args(update)
+    if args and not HOSTNAME_RE.fullmatch(args[0]):
+        # Шаблон в кавычках или с символами регулярки не может быть именем хоста - команда для всех
+        for_us = True
     else:
-        await update.message.reply_text("ℹ️ No active monitoring found.")
+        for_us, args = parse_target(context, args=args)
+    if not for_us: return
+    args = [unquote(arg) for arg in args]
+    if not args:
+        await reply(update, 
+            "Usage: /grep [hostname] <pattern> [container] [since]\n"
+            "Without a hostname, quote a plain-word pattern: /grep \"timeout\"\n"
+            "Example: /grep \"timeout|refused\" nginx 6h"
+        )
+        return
+    if not log_index:
+        await send_server_message(update, "ℹ️ Log index is disabled (LOG_INDEX_DIR is empty).")
+        return
+
+    pattern, rest = args[0], args[1:]
+    since = None
+    if rest:
+        try:
+            since = time.time() - parse_duration(rest[-1])
+            rest = rest[:-1]
+        except ValueError:
+            pass
+    container = rest[0] if rest else None
+
+    started = time.perf_counter()
+    matches, scanned, total = await asyncio.to_thread(
+        log_index.search, pattern, container, since, GREP_MAX_RESULTS
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    scope = f"`{container}`" if container else "all containers"
+    footer = f"_{len(matches)} lines, {scanned}/{total} blocks read, {elapsed_ms:.0f} ms_"
+    if not matches:
+        await send_server_message(update, f"🔎 No matches in {scope}.\n{footer}", parse_mode="Markdown")
+        return
+
+    lines, size = [], 0
+    for ts, name, message in reversed(matches):
+        line = f"{time.strftime('%m-%d %H:%M:%S', time.localtime(ts))} {name} | {message[:300]}"
+        if size + len(line) > 3500:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    text = "\n".join(reversed(lines))
+    await send_server_message(
+        update, f"🔎 *grep* in {scope}:\n```\n{text}\n```\n{footer}", parse_mode="Markdown"
+    )
 
 async def docker_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
@@ -371,77 +582,347 @@ async def docker_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif len(context.args) == 1:
         container_name = context.args[0]
     else:
-        await update.message.reply_text("Usage: /restart <container_name> or /restart <hostname> <container_name>")
+        await reply(update, "Usage: /restart <container_name> or /restart <hostname> <container_name>")
         return
     
-    await update.message.reply_text(f"🔄 Restarting container *{container_name}*...", parse_mode="Markdown")
+    await reply(update, f"🔄 Restarting container *{container_name}*...", parse_mode="Markdown")
 
     try:
-        result = subprocess.run(['docker', 'restart', container_name], 
-                                capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            await send_server_message(update, f"✅ Container *{container_name}* restarted successfully!")
-        else:
-            await update.message.reply_text(f"❌ Failed to restart. Error: {result.stderr}")
+        await restart_container(container_name)
+        await send_server_message(update, f"✅ Container *{container_name}* restarted successfully!")
+    except DockerError as e:
+        await reply(update, f"❌ Failed to restart. Error: {e}")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await reply(update, f"❌ Error: {e}")
+    finally:
+        # Даже неудачный рестарт мог успеть остановить контейнер
+        response_cache.invalidate("ps")
+        response_cache.invalidate("logs", container_name)
+
+# Режимы /fix: анализ диска и точечная очистка
+FIX_ACTIONS = ("analyze", "truncate", "images", "volumes", "journal")
+FIX_USAGE = (
+    "Usage: /fix [hostname] - prune Docker cache if a disk is at 90%+\n"
+    "/fix analyze [path] - find what takes the space\n"
+    "/fix truncate <container> | images | volumes | journal - targeted cleanup"
+)
+# Что сбрасывать в кэше ответов после очистки: диск в /status, удаленные контейнеры в /ps, обрезанные логи
+FIX_INVALIDATES = ("status", "ps", "logs")
+
+def invalidate_after_fix():
+    for command in FIX_INVALIDATES:
+        response_cache.invalidate(command)
 
 async def fix_disk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/fix [hostname] [analyze [path] | truncate <container> | images | volumes | journal]"""
     if not await check_access(update): return
-    if not check_target(context): return
-    
-    disk = get_disk_usage()
-    if disk['percent'] < 90:
-        await update.message.reply_text("✅ Disk usage is normal. No action needed.")
+    for_us, args = parse_target(context, FIX_ACTIONS)
+    if not for_us: return
+
+    if not args:
+        await fix_prune(update)
+    elif args[0] == "analyze" and len(args) <= 2:
+        await fix_analyze(update, args[1] if len(args) == 2 else "/")
+    elif args[0] == "truncate" and len(args) == 2:
+        await fix_cleanup(update, f"truncate log of {args[1]}", _truncate_log(args[1]))
+    elif args[0] == "images" and len(args) == 1:
+        await fix_cleanup(update, "prune unused images", prune_images())
+    elif args[0] == "volumes" and len(args) == 1:
+        await fix_cleanup(update, "prune dangling volumes", prune_volumes())
+    elif args[0] == "journal" and len(args) == 1:
+        await fix_cleanup(update, f"vacuum journald to {FIX_JOURNAL_MAX_MB}MB", disk_scanner.vacuum_journal())
+    else:
+        await reply(update, FIX_USAGE)
+
+async def fix_analyze(update: Update, path: str):
+    if disk_scanner.running:
+        await reply(update, "⏳ Disk analysis is already running.")
+        return
+    await reply(update, f"🔍 Analyzing `{path}`...", parse_mode="Markdown")
+    try:
+        report = await disk_scanner.analyze(path)
+    except OSError as e:
+        await reply(update, f"❌ Cannot analyze {path}: {e}")
         return
+    await send_server_message(update, format_report(report), parse_mode="Markdown")
 
-    await update.message.reply_text(
-        f"⚠️ Disk is critical ({disk['percent']}%). Attempting to clean Docker cache...\n"
+async def _truncate_log(container: str) -> int:
+    log_path = await container_log_path(container)
+    return await asyncio.to_thread(disk_scanner.truncate, log_path)
+
+async def fix_cleanup(update: Update, title: str, action):
+    """Выполняет одно действие очистки (корутина возвращает освобожденные байты или None) и показывает диск после."""
+    await reply(update, f"🩹 Running: {title}...")
+    try:
+        freed = await action
+    except (DockerError, OSError) as e:
+        logger.error(f"Cleanup '{title}' failed: {e}")
+        await reply(update, f"❌ Cleanup failed: {e}")
+        return
+    finally:
+        invalidate_after_fix()
+    mounts = (await sampler.refresh())["mounts"]
+    usage = ", ".join(f"{mp} {u['percent']}%" for mp, u in mounts.items())
+    freed_text = f" Freed {freed / 1024 ** 2:.1f}MB." if freed is not None else ""
+    await send_server_message(update, f"✅ Done: {title}.{freed_text}\nDisk usage: {usage}")
+
+async def fix_prune(update: Update):
+    """Прежний /fix: docker system prune, если какая-то точка монтирования заполнена на 90%+."""
+    snapshot = await sampler.get()
+    critical = {mp: usage for mp, usage in snapshot["mounts"].items() if usage["percent"] >= 90}
+    if not critical:
+        await reply(update, "✅ Disk usage is normal. No action needed.")
+        return
+
+    usage_list = ", ".join(f"{mp} {usage['percent']}%" for mp, usage in critical.items())
+    await reply(update, 
+        f"⚠️ Disk is critical ({usage_list}). Attempting to clean Docker cache...\n"
         f"Running: `docker system prune -f`"
     )
 
     try:
-        result = subprocess.run(['docker', 'system', 'prune', '-f'], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            new_disk = get_disk_usage()
-            await send_server_message(update, f"✅ Cleanup complete!\nNew disk usage: {new_disk['percent']}%")
-        else:
-            await update.message.reply_text("❌ Cleanup failed.")
+        await system_prune()
+        invalidate_after_fix()
+        mounts = (await sampler.refresh())["mounts"]
+        new_usage = ", ".join(f"{mp} {mounts[mp]['percent']}%" for mp in critical if mp in mounts)
+        await send_server_message(update, f"✅ Cleanup complete!\nNew disk usage: {new_usage}")
+    except DockerError as e:
+        logger.error(f"docker system prune failed: {e}")
+        await reply(update, "❌ Cleanup failed.")
     except Exception as e:
-        await update.message.reply_text(f"❌ Error: {e}")
+        await reply(update, f"❌ Error: {e}")
 
 async def cmd_cpu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
+    if await fleet_answer(update, context, "cpu"): return
     if not check_target(context): return
-    await send_server_message(update, f"🖥 CPU Usage: {get_cpu_usage()}%")
+    snapshot = await sampler.get()
+    await send_server_message(update, f"🖥 CPU Usage: {snapshot['cpu']}%")
 
 async def cmd_ram(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
+    if await fleet_answer(update, context, "ram"): return
     if not check_target(context): return
-    ram = get_ram_usage()
+    ram = (await sampler.get())["ram"]
     await send_server_message(update, f"🧠 RAM: {ram['percent']}% ({ram['used_gb']:.2f}GB used)")
 
 async def cmd_disk(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
+    if await fleet_answer(update, context, "disk"): return
     if not check_target(context): return
-    disk = get_disk_usage()
-    await send_server_message(update, f"💾 Disk: {disk['percent']}% ({disk['used_gb']:.2f}GB used)")
+    snapshot = await sampler.get()
+    await send_server_message(update, format_disks(snapshot), parse_mode="Markdown")
+
+def _format_hours(hours: float) -> str:
+    return f"{hours / 24:.1f}d" if hours >= 48 else f"{hours:.1f}h"
+
+def format_disks(snapshot: dict) -> str:
+    """Все точки монтирования с прогнозом заполнения и I/O по устройствам."""
+    lines = ["💾 *Disks:*"]
+    for mountpoint, usage in snapshot["mounts"].items():
+        line = f"`{mountpoint}` {usage['percent']}% ({usage['used_gb']:.2f}GB / {usage['total_gb']:.2f}GB)"
+        if usage["hours_to_full"] is not None:
+            line += f" ⏳ full in ~{_format_hours(usage['hours_to_full'])} (+{usage['growth_gb_h']:.2f}GB/h)"
+        lines.append(line)
+    if snapshot["disk_io"]:
+        lines.append("\n📀 *I/O:*")
+        for device, io_rate in snapshot["disk_io"].items():
+            lines.append(
+                f"`{device}` R {io_rate['read_mbps']:.1f}MB/s ({io_rate['read_iops']:.0f} IOPS) | "
+                f"W {io_rate['write_mbps']:.1f}MB/s ({io_rate['write_iops']:.0f} IOPS)"
+            )
+    return "\n".join(lines)
+
+async def cmd_net(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_access(update): return
+    if not check_target(context): return
+    snapshot = await sampler.get()
+    await send_server_message(update, format_net(snapshot), parse_mode="Markdown")
+
+def _format_count(value: float) -> str:
+    return f"{value / 1000:.1f}k" if value >= 1000 else f"{value:.0f}"
+
+def _busiest_iface(net_io: dict):
+    return max(net_io.items(), key=lambda item: item[1]["rx_mbit"] + item[1]["tx_mbit"], default=(None, None))
+
+def format_net_summary(snapshot: dict) -> str:
+    """Строка для /status: самый загруженный интерфейс и установленные TCP-соединения."""
+    iface, rate = _busiest_iface(snapshot.get("net_io") or {})
+    if iface is None:
+        return ""
+    line = f"🌐 Net ({iface}): ↓ {rate['rx_mbit']:.1f} / ↑ {rate['tx_mbit']:.1f} Mbit/s"
+    if rate["util"] is not None:
+        line += f" ({rate['util']:.0f}%)"
+    tcp = snapshot.get("tcp")
+    if tcp:
+        line += f", TCP {_format_count(tcp.get('established', 0))} est."
+    return line + "\n"
+
+def format_net(snapshot: dict) -> str:
+    """Трафик, пакеты, ошибки и дропы по интерфейсам, TCP-сокеты по состояниям."""
+    lines = ["🌐 *Network:*"]
+    net_io = snapshot.get("net_io") or {}
+    if not net_io:
+        lines.append("No data yet (or /proc/net is unavailable).")
+    for iface, rate in sorted(net_io.items(), key=lambda item: -(item[1]["rx_mbit"] + item[1]["tx_mbit"])):
+        line = (
+            f"`{iface}` ↓ {rate['rx_mbit']:.1f} Mbit/s ({_format_count(rate['rx_pps'])} pps) | "
+            f"↑ {rate['tx_mbit']:.1f} Mbit/s ({_format_count(rate['tx_pps'])} pps)"
+        )
+        if rate["util"] is not None:
+            line += f" | {rate['util']:.0f}% of {rate['speed_mbit']} Mbit/s"
+        if rate["errors"] or rate["drops"]:
+            line += f"\n    ⚠️ errors {rate['errors']:.1f}/s, drops {rate['drops']:.1f}/s"
+        lines.append(line)
+    tcp = snapshot.get("tcp")
+    if tcp:
+        lines.append(f"\n🔌 *TCP:* {_format_count(sum(tcp.values()))} sockets")
+        lines.append(", ".join(f"{state} {_format_count(count)}" for state, count in sorted(tcp.items(), key=lambda item: -item[1])))
+    return "\n".join(lines)
+
+# Сортировка /top: ключ команды -> функция по статистике контейнера
+TOP_SORT = {
+    "cpu": lambda c: c.get("cpu", 0),
+    "mem": lambda c: c["mem_mb"],
+    "net": lambda c: c.get("net_rx_kbps", 0) + c.get("net_tx_kbps", 0),
+    "io": lambda c: c.get("blk_read_kbps", 0) + c.get("blk_write_kbps", 0),
+}
+
+def _rate(stats: dict, read_key: str, write_key: str) -> str:
+    if read_key not in stats:
+        return "-"
+    return f"{stats[read_key]:.0f}/{stats[write_key]:.0f}"
+
+def format_top(containers: dict, sort: str = "cpu", limit: int = 20) -> str:
+    """Таблица контейнеров: CPU (100% = ядро), память, сеть и блочный I/O в КБ/с."""
+    rows = sorted(containers.items(), key=lambda item: TOP_SORT[sort](item[1]), reverse=True)[:limit]
+    width = max([len("NAME")] + [len(name) for name, _ in rows]) + 2
+    lines = [f"{'NAME':<{width}}{'CPU%':>6}  {'MEM':<15}{'NET rx/tx':<12}BLK r/w"]
+    for name, c in rows:
+        cpu = f"{c['cpu']:.1f}" if "cpu" in c else "-"
+        mem = f"{c['mem_mb']:.0f}M {c['mem_percent']:.0f}%"
+        lines.append(
+            f"{name:<{width}}{cpu:>6}  {mem:<15}"
+            f"{_rate(c, 'net_rx_kbps', 'net_tx_kbps'):<12}{_rate(c, 'blk_read_kbps', 'blk_write_kbps')}"
+        )
+    return "\n".join(lines)
+
+async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/top [hostname] [cpu|mem|net|io] - статистика контейнеров из последнего снимка сэмплера."""
+    if not await check_access(update): return
+    for_us, args = parse_target(context, TOP_SORT)
+    if not for_us: return
+
+    sort = args[0] if args else "cpu"
+    if sort not in TOP_SORT:
+        await reply(update, "Usage: /top [hostname] [cpu|mem|net|io]")
+        return
+
+    snapshot = await sampler.get()
+    containers = snapshot.get("containers")
+    if not containers:
+        await send_server_message(update, "🐳 No running containers (or Docker is unavailable).")
+        return
+    await send_server_message(
+        update,
+        f"🐳 *Top containers* (by {sort}, KB/s):\n```\n{format_top(containers, sort)}\n```",
+        parse_mode="Markdown"
+    )
+
+def format_procs(rows: list) -> str:
+    lines = [f"{'PID':>7} {'USER':<10}{'CPU%':>6}{'RSS MB':>9}{'IO KB/s':>9}  NAME"]
+    for row in rows:
+        io_rate = f"{row['io_kbps']:.0f}" if row["io_kbps"] is not None else "-"
+        lines.append(
+            f"{row['pid']:>7} {row['user'][:9]:<10}{row['cpu']:>6.1f}{row['rss_mb']:>9.0f}{io_rate:>9}  {row['name'][:24]}"
+        )
+    return "\n".join(lines)
+
+async def cmd_procs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/procs [hostname] [cpu|mem|io] [N] - самые тяжелые процессы (CPU% - 100% на ядро)."""
+    if not await check_access(update): return
+    for_us, args = parse_target(context, SORT_KEYS)
+    if not for_us: return
+
+    sort, limit = "cpu", 10
+    for arg in args:
+        if arg in SORT_KEYS:
+            sort = arg
+        elif arg.isdigit():
+            limit = max(1, min(int(arg), 50))
+        else:
+            await reply(update, "Usage: /procs [hostname] [cpu|mem|io] [N]")
+            return
+
+    rows = top_processes(await process_table.get(), sort, limit)
+    await send_server_message(
+        update,
+        f"⚙️ *Top {len(rows)} processes* (by {sort}):\n```\n{format_procs(rows)}\n```",
+        parse_mode="Markdown"
+    )
 
 async def cmd_uptime(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
+    if await fleet_answer(update, context, "uptime"): return
     if not check_target(context): return
     await send_server_message(update, f"⏳ Server Uptime: {get_uptime()}")
 
 async def alerts_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_access(update): return
     if not check_target(context): return
-    from bot.alerts import check_alerts
-    
-    alert_msg = check_alerts(cooldown=0) 
+    from bot.alerts import active_alerts
+
+    snapshot = await sampler.get()
+    alert_msg = active_alerts(snapshot)
     
     if alert_msg:
         await send_server_message(update, f"🚨 *Active Alerts:* \n\n{alert_msg}", parse_mode="Markdown")
     else:
-        await send_server_message(update, "✅ No active alerts at the moment.")
\ No newline at end of file
+        await send_server_message(update, "✅ No active alerts at the moment.")
+
+def _format_timings(title: str, rows: dict, limit: int = 15) -> list:
+    """Таблица count/p50/p95/p99/max (мс) и ошибок по именам, самые частые сверху."""
+    items = sorted(rows.items(), key=lambda item: item[1]["count"], reverse=True)[:limit]
+    width = max([len(title)] + [len(name) for name, _ in items]) + 1
+    lines = [f"{title:<{width}}{'N':>6}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8} ERR"]
+    for name, row in items:
+        if not row["count"]:
+            lines.append(f"{name:<{width}}{'-':>6}{'':>32} {row['errors']}")
+            continue
+        lines.append(
+            f"{name:<{width}}{row['count']:>6}{row['p50']:>8.1f}{row['p95']:>8.1f}"
+            f"{row['p99']:>8.1f}{row['max']:>8.1f} {row.get('errors', '')}"
+        )
+    return lines
+
+def format_botstats(stats: dict, uptime: float) -> str:
+    """Сводка инструментации для /botstats: задержки (мс) по видам, очередь сообщений, задачи."""
+    hours, rest = divmod(int(uptime), 3600)
+    lines = [f"📈 *Bot stats* (up {hours}h {rest // 60}m, latency in ms)", "```"]
+    lag = stats.get("loop", {}).get("lag")
+    if lag:
+        lines.append(f"event loop lag: p50 {lag['p50']:.1f}  p99 {lag['p99']:.1f}  max {lag['max']:.1f}")
+    for kind, title in (("handler", "COMMAND"), ("job", "JOB"), ("telegram", "BOT API"), ("subprocess", "PROGRAM")):
+        if stats.get(kind):
+            lines.append("")
+            lines += _format_timings(title, stats[kind])
+    lines.append("")
+    lines.append(
+        f"outbox: {outbox.pending()} pending, {outbox.stats['sent']} sent, {outbox.stats['merged']} merged, "
+        f"{outbox.stats['dropped']} dropped, {outbox.stats['retry_after']} flood waits"
+    )
+    lines.append(f"running: {len(bash_jobs)} /bash, {len(tail_sessions)} /tail")
+    cache = response_cache.stats
+    lines.append(
+        f"cache: {len(response_cache)} entries, {cache['hits']} hits, {cache['shared']} shared, "
+        f"{cache['misses']} misses, {cache['evictions']} evicted, {cache['invalidations']} invalidated"
+    )
+    lines.append("```")
+    return "\n".join(lines)
+
+async def bot_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/botstats [hostname] - где бот тратит время: команды, задачи, Bot API, подпроцессы, event loop."""
+    if not await check_access(update): return
+    if not check_target(context): return
+    text = format_botstats(instrument_summary(), time.time() - instrumentation.started)
+    await send_server_message(update, text, parse_mode="Markdown")
@@ -0,0 +1,238 @@
+import mmap
+import os
+import re
+import struct
+import threading
+from bot.config import HISTORY_DIR, SAMPLE_INTERVAL, HISTORY_RAW_HOURS, HISTORY_MINUTE_DAYS, HISTORY_HOUR_DAYS
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+class RingSeries:
+    """
+    Кольцевой буфер фиксированного размера в файле, отображенном в память (mmap).
+    Колоночный формат: [заголовок][ts uint32 * N][avg float32 * N][max float32 * N].
+    Размер файла не меняется, старые точки перезаписываются новыми.
+    """
+
+    MAGIC = b"DOBTS1\x00\x00"
+    # magic, capacity, step (сек), written (сколько точек записано за всё время)
+    HEADER = struct.Struct("<8sIIQ")
+
+    def __init__(self, path: str, capacity: int, step: int):
+        self.path = path
+        self.capacity = capacity
+        self.step = step
+        size = self.HEADER.size + capacity * 12
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, cap, stp, written = self.HEADER.unpack_from(self._mm, 0)
+        if fresh or magic != self.MAGIC or cap != capacity or stp != step:
+            if not fresh:
+                logger.warning(f"History file {path} has a different layout, recreating.")
+            self._mm[:] = bytes(size)
+            written = 0
+        self.written = written
+
+        view = memoryview(self._mm)
+        off = self.HEADER.size
+        self.ts = view[off:off + capacity * 4].cast("I")
+        self.avg = view[off + capacity * 4:off + capacity * 8].cast("f")
+        self.max = view[off + capacity * 8:off + capacity * 12].cast("f")
+        self._save_header()
+
+    def _save_header(self):
+        self.HEADER.pack_into(self._mm, 0, self.MAGIC, self.capacity, self.step, self.written)
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def _phys(self, i: int) -> int:
+        """Логический индекс (0 = самая старая точка) -> индекс в файле."""
+        return (self.written - len(self) + i) % self.capacity
+
+    def last_ts(self) -> int:
+        return self.ts[self._phys(len(self) - 1)] if self.written else 0
+
+    def first_ts(self) -> int:
+        return self.ts[self._phys(0)] if self.written else 0
+
+    def append(self, ts: int, avg: float, peak: float):
+        # Время только растет: при скачке часов назад точку пропускаем
+        if self.written and ts <= self.last_ts():
+            return
+        i = self.written % self.capacity
+        self.ts[i] = ts
+        self.avg[i] = avg
+        self.max[i] = peak
+        self.written += 1
+        self._save_header()
+
+    def _bisect(self, ts: int) -> int:
+        """Первый логический индекс с меткой >= ts."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._phys(mid)] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start: int, end: int):
+        """Точки с start <= ts <= end. Возвращает (ts, avg, max) списками."""
+        lo, hi = self._bisect(start), self._bisect(end + 1)
+        if lo >= hi:
+            return [], [], []
+        a, b = self._phys(lo), self._phys(hi - 1) + 1
+        if a < b:
+            parts = [(a, b)]
+        else:
+            # Диапазон переходит через конец кольца
+            parts = [(a, self.capacity), (0, b)]
+        ts, avg, peak = [], [], []
+        for x, y in parts:
+            ts += self.ts[x:y].tolist()
+            avg += self.avg[x:y].tolist()
+            peak += self.max[x:y].tolist()
+        return ts, avg, peak
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self.ts.release()
+        self.avg.release()
+        self.max.release()
+        self._mm.close()
+
+class _Rollup:
+    """Накопитель агрегата (avg/max) для одного окна даунсемплинга."""
+
+    __slots__ = ("bucket", "total", "count", "peak")
+
+    def __init__(self):
+        self.bucket = None
+        self.total = 0.0
+        self.count = 0
+        self.peak = float("-inf")
+
+class HistoryStore:
+    """
+    Встроенное хранилище временных рядов метрик.
+    Каждая метрика - три кольцевых файла: raw (каждый замер), 1m и 1h (avg/max за окно).
+    Объем на диске фиксирован и задается сроками хранения каждого уровня.
+    """
+
+    def __init__(self, directory: str, raw_step: float, raw_hours: float, minute_days: float, hour_days: float):
+        self.directory = directory
+        raw_step = max(1, int(raw_step))
+        # (имя уровня, шаг в секундах, емкость в точках)
+        self.tiers = [
+            ("raw", raw_step, max(1, int(raw_hours * 3600 / raw_step))),
+            ("1m", 60, max(1, int(minute_days * 1440))),
+            ("1h", 3600, max(1, int(hour_days * 24))),
+        ]
+        self._series = {}
+        self._rollups = {}
+        # query() зовут из потока графиков, append() - из event loop: открытие ряда под замком,
+        # иначе оба потока могут открыть (и замапить) один и тот же файл дважды
+        self._open_lock = threading.Lock()
+        # Растет с каждым записанным снимком - по нему кэшируются графики
+        self.version = 0
+
+    def _open(self, metric: str):
+        series = self._series.get(metric)
+        if series is not None:
+            return series
+        if not _METRIC_RE.match(metric):
+            raise KeyError(metric)
+        with self._open_lock:
+            series = self._series.get(metric)
+            if series is None:
+                os.makedirs(self.directory, exist_ok=True)
+                series = [
+                    RingSeries(os.path.join(self.directory, f"{metric}.{name}.ring"), capacity, step)
+                    for name, step, capacity in self.tiers
+                ]
+                # Накопители раньше рядов: append() видит ряд только вместе с ними
+                self._rollups[metric] = [_Rollup(), _Rollup()]
+                self._series[metric] = series
+        return series
+
+    def append(self, metric: str, ts: float, value: float):
+        raw, *rolled = self._open(metric)
+        ts = int(ts)
+        raw.append(ts, value, value)
+        for (_, step, _), series, acc in zip(self.tiers[1:], rolled, self._rollups[metric]):
+            bucket = ts - ts % step
+            if acc.bucket != bucket:
+                if acc.count:
+                    series.append(acc.bucket, acc.total / acc.count, acc.peak)
+                acc.bucket, acc.total, acc.count, acc.peak = bucket, 0.0, 0, float("-inf")
+            acc.total += value
+            acc.count += 1
+            acc.peak = max(acc.peak, value)
+
+    def record(self, snapshot: dict):
+        """Записывает снимок сэмплера (подписчик sampler)."""
+        for metric, value in snapshot_series(snapshot):
+            self.append(metric, snapshot["ts"], value)
+        self.version += 1
+
+    def query(self, metric: str, start: float, end: float):
+        """
+        Точки метрики за [start, end]: берется самый подробный уровень, который еще
+        хранит start (или еще ни разу не перезаписывался - тогда в нем вся история).
+        Возвращает (ts, avg, max).
+        """
+        series = self._series.get(metric)
+        if series is None:
+            if not _METRIC_RE.match(metric):
+                raise KeyError(metric)
+            if not os.path.exists(os.path.join(self.directory, f"{metric}.raw.ring")):
+                return [], [], []
+            series = self._open(metric)
+        chosen = series[-1]
+        for ring in series:
+            if ring.written and (ring.first_ts() <= start or ring.written <= ring.capacity):
+                chosen = ring
+                break
+        return chosen.range(int(start), int(end))
+
+    def flush(self):
+        for series in self._series.values():
+            for ring in series:
+                ring.flush()
+
+    def close(self):
+        for series in self._series.values():
+            for ring in series:
+                ring.close()
+        self._series.clear()
+
+_METRIC_RE = re.compile(r"^[A-Za-z0-9_.\-]+$")
+
+def snapshot_series(snapshot: dict):
+    """Какие ряды пишем из снимка сэмплера: (имя метрики, значение)."""
+    yield "cpu", snapshot["cpu"]
+    yield "ram", snapshot["ram"]["percent"]
+    yield "disk", snapshot["disk"]["percent"]
+    load = snapshot["load"]
+    yield "load1", load[0]
+    yield "load5", load[1]
+    yield "load15", load[2]
+
+# Общее хранилище истории (None, если HISTORY_DIR пустой - история выключена)
+history = HistoryStore(
+    HISTORY_DIR, SAMPLE_INTERVAL, HISTORY_RAW_HOURS, HISTORY_MINUTE_DAYS, HISTORY_HOUR_DAYS
+) if HISTORY_DIR else None
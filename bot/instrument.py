@@ -0,0 +1,174 @@
+import asyncio
+import functools
+import json
+import time
+from telegram.ext import CommandHandler
+from bot.config import LOOP_LAG_INTERVAL, BOTSTATS_LOG_INTERVAL
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Границы корзин задержки (сек) для /metrics - как у клиентов Prometheus по умолчанию
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# HDR-подобные корзины: значения в микросекундах, каждая октава (степень двойки)
+# делится на 2^SUB_BITS равных корзин - относительная ошибка не больше 1/16 на любом масштабе
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+def _index(us: int) -> int:
+    if us < SUB_COUNT:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    return (shift + 1) * SUB_COUNT + (us >> shift) - SUB_COUNT
+
+def _upper(index: int) -> int:
+    """Верхняя граница корзины (мкс, не включительно)."""
+    if index < SUB_COUNT:
+        return index + 1
+    shift = index // SUB_COUNT - 1
+    return (index % SUB_COUNT + SUB_COUNT + 1) << shift
+
+class Histogram:
+    """
+    Гистограмма задержек с логарифмически-линейными корзинами (как HdrHistogram).
+    Запись - O(1) (bit_length и одно обновление dict), память - только занятые корзины.
+    """
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        index = _index(int(seconds * 1e6))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Значение q-го процентиля (0..100), сек; с точностью до ширины корзины."""
+        if not self.count:
+            return 0.0
+        rank, seen = q / 100 * self.count, 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_upper(index) / 1e6, self.max)
+        return self.max
+
+    def cumulative(self, bounds=LATENCY_BUCKETS) -> list:
+        """[(граница, сколько значений <= границы)] включая +Inf - формат bucket Prometheus."""
+        items = sorted((_upper(index) / 1e6, count) for index, count in self.counts.items())
+        out, total, i = [], 0, 0
+        for bound in bounds:
+            while i < len(items) and items[i][0] <= bound:
+                total += items[i][1]
+                i += 1
+            out.append((bound, total))
+        out.append((float("inf"), self.count))
+        return out
+
+# Задержки по видам: handler (команды), job (фоновые задачи), telegram (методы Bot API),
+# subprocess (внешние программы), loop (опоздание event loop) -> имя -> Histogram
+latency = {kind: {} for kind in ("handler", "job", "telegram", "subprocess", "loop")}
+# Ошибки по видам: вид -> имя (команда, задача, класс исключения Telegram) -> количество
+errors = {kind: {} for kind in ("handler", "job", "telegram")}
+
+def observe(kind: str, name: str, seconds: float):
+    histogram = latency[kind].get(name)
+    if histogram is None:
+        histogram = latency[kind][name] = Histogram()
+    histogram.observe(seconds)
+
+def error(kind: str, name: str):
+    errors[kind][name] = errors[kind].get(name, 0) + 1
+
+def timed(kind: str, name: str, callback):
+    """Оборачивает корутину (хендлер или задачу JobQueue): время в latency[kind][name], исключения в errors."""
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            error(kind, name)
+            raise
+        finally:
+            observe(kind, name, time.perf_counter() - started)
+    return wrapper
+
+def instrument_handlers(application):
+    """Оборачивает все зарегистрированные CommandHandler (вызывать после add_handler)."""
+    for group in application.handlers.values():
+        for handler in group:
+            if isinstance(handler, CommandHandler):
+                handler.callback = timed("handler", sorted(handler.commands)[0], handler.callback)
+
+def summary() -> dict:
+    """Сводка для /botstats и логов: count/p50/p95/p99/max (мс) и ошибки по каждому имени."""
+    out = {}
+    for kind, histograms in latency.items():
+        rows = {}
+        for name, h in histograms.items():
+            rows[name] = {
+                "count": h.count,
+                "p50": round(h.percentile(50) * 1000, 1),
+                "p95": round(h.percentile(95) * 1000, 1),
+                "p99": round(h.percentile(99) * 1000, 1),
+                "max": round(h.max * 1000, 1),
+            }
+            if name in errors.get(kind, {}):
+                rows[name]["errors"] = errors[kind][name]
+        # Ошибки без замеров (например, классы исключений Telegram)
+        for name, count in errors.get(kind, {}).items():
+            rows.setdefault(name, {"count": 0, "errors": count})
+        if rows:
+            out[kind] = rows
+    return out
+
+class Instrumentation:
+    """
+    Фоновые задачи инструментации:
+    - замер опоздания event loop: sleep(interval) должен проснуться вовремя, задержка сверх
+      interval - время, когда loop был занят чужим синхронным кодом;
+    - периодический дамп summary() в лог одной JSON-строкой (если log_interval > 0).
+    """
+
+    def __init__(self, lag_interval: float, log_interval: float):
+        self.lag_interval = lag_interval
+        self.log_interval = log_interval
+        self.started = time.time()
+        self._tasks = []
+
+    def start(self):
+        self._tasks.append(asyncio.create_task(self._probe_lag()))
+        if self.log_interval > 0:
+            self._tasks.append(asyncio.create_task(self._dump()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _probe_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            observe("loop", "lag", max(0.0, loop.time() - expected))
+
+    async def _dump(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            logger.info("botstats " + json.dumps(summary(), separators=(",", ":")))
+
+# Замер опоздания event loop и периодический дамп в лог (запускаются в post_init)
+instrumentation = Instrumentation(LOOP_LAG_INTERVAL, BOTSTATS_LOG_INTERVAL)
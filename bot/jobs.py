@@ -0,0 +1,235 @@
+import asyncio
+import html
+import itertools
+import time
+from bot.config import BASH_MAX_JOBS, BASH_TIMEOUT, BASH_EDIT_INTERVAL, BASH_HEAD_BYTES, BASH_TAIL_BYTES, DL_LOGS_PART_SIZE
+from bot.executor import spawn, kill_process_group, wait_killed, CHUNK_SIZE
+from bot.logexport import CompressedPart, pick_compression, PART_MARGIN
+from bot.instrument import observe
+from bot.logger import setup_logger
+from bot.outbox import outbox
+
+logger = setup_logger()
+
+# Запас под заголовок и HTML-разметку в сообщении с выводом
+TEXT_LIMIT = 3800
+
+class OutputBuffer:
+    """
+    Ограниченный буфер вывода: первые head и последние tail байт плюс счетчик всех байт.
+    Память не растет, сколько бы ни писала команда.
+    """
+
+    def __init__(self, head: int, tail: int):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        free = self.head_limit - len(self.head)
+        if free > 0:
+            self.head += data[:free]
+            data = data[free:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def skipped(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    @property
+    def overflowed(self) -> bool:
+        return self.skipped > 0
+
+    def render(self) -> str:
+        if not self.overflowed:
+            return (self.head + self.tail).decode("utf-8", errors="replace")
+        return (
+            self.head.decode("utf-8", errors="replace")
+            + f"\n... ({self.skipped} bytes skipped, full output will be attached) ...\n"
+            + self.tail.decode("utf-8", errors="replace")
+        )
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    return f"{size / 1024 ** 2:.1f} MB" if size >= 1024 ** 2 else f"{size / 1024:.1f} KB"
+
+class BashJob:
+    """
+    Одна команда /bash: процесс, ограниченный буфер вывода, сжатая копия полного вывода
+    и сообщение в чате, которое редактируется не чаще раза в BASH_EDIT_INTERVAL секунд.
+    """
+
+    def __init__(self, job_id: int, chat_id: int, command: str, hostname: str):
+        self.id = job_id
+        self.chat_id = chat_id
+        self.command = command
+        self.hostname = hostname
+        self.buffer = OutputBuffer(BASH_HEAD_BYTES, BASH_TAIL_BYTES)
+        self.compression = pick_compression()
+        # Полный вывод сжимается на лету; отправляется файлом, только если не влез в сообщение
+        self.spool = CompressedPart(self.compression)
+        self.spool_full = False
+        self.started = time.monotonic()
+        self.state = "running"
+        self.proc = None
+        self.message = None
+        self.task = None
+        self._shown = None
+        # Процесс убит через /cancel: дальше вывод дочитывается не дольше KILL_GRACE
+        self._killed = asyncio.Event()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        """/cancel: убиваем группу процессов, задача дочитает вывод (не дольше KILL_GRACE) и сама допишет итог."""
+        if self.state == "running":
+            self.state = "cancelled"
+            self._killed.set()
+            if self.proc is not None:
+                kill_process_group(self.proc)
+
+    def _text(self) -> str:
+        elapsed = time.monotonic() - self.started
+        if self.state == "running":
+            status = f"🔄 running {elapsed:.0f}s · /cancel {self.id}"
+        elif self.state == "cancelled":
+            status = f"🛑 cancelled after {elapsed:.1f}s"
+        elif self.state == "timeout":
+            status = f"⏱️ killed after {BASH_TIMEOUT:g}s timeout"
+        elif self.state == "error":
+            status = "❌ failed to start"
+        else:
+            icon = "✅" if self.proc.returncode == 0 else "⚠️"
+            status = f"{icon} exit {self.proc.returncode} in {elapsed:.1f}s"
+        header = (
+            f"🖥️ <b>{html.escape(self.hostname)}</b> · job {self.id} · {status}\n"
+            f"<code>$ {html.escape(self.command[:200])}</code>\n"
+            f"📝 {_format_size(self.buffer.total)} output\n"
+        )
+        body = html.escape(self.buffer.render()) or "(no output)"
+        # HTML-экранирование может раздуть текст - режем начало, конец вывода важнее
+        room = TEXT_LIMIT - len(header)
+        if len(body) > room:
+            body = "…" + body[len(body) - room + 1:]
+        # HTML, а не Markdown: произвольный вывод с ` и * не ломает разметку
+        return header + f"<pre>{body}</pre>"
+
+    async def _show(self):
+        text = self._text()
+        if text == self._shown:
+            return
+        try:
+            if self.message is None:
+                self.message = await outbox.send_message(self.chat_id, text, coalesce=False, parse_mode="HTML")
+            else:
+                await outbox.call(
+                    self.chat_id, "edit_message_text",
+                    message_id=self.message.message_id, text=text, parse_mode="HTML",
+                )
+            self._shown = text
+        except Exception as e:
+            logger.error(f"Failed to update /bash job {self.id} message: {e}")
+
+    async def _pump(self):
+        limit = DL_LOGS_PART_SIZE - PART_MARGIN
+        while True:
+            chunk = await self.proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            self.buffer.write(chunk)
+            if not self.spool_full:
+                self.spool.write(chunk)
+                # Файл должен пройти лимит Telegram на документ - дальше только хвост в сообщении
+                self.spool_full = self.spool.size() >= limit
+
+    async def _ticker(self):
+        while True:
+            await asyncio.sleep(BASH_EDIT_INTERVAL)
+            await self._show()
+
+    async def _run(self):
+        await self._show()
+        ticker = asyncio.create_task(self._ticker())
+        try:
+            # stderr в тот же пайп - вывод идет в том же порядке, что в терминале
+            self.proc = await spawn(self.command, shell=True, stderr=asyncio.subprocess.STDOUT)
+            if self.state == "cancelled":
+                kill_process_group(self.proc)
+            pump = asyncio.ensure_future(self._pump())
+            killed = asyncio.ensure_future(self._killed.wait())
+            done, _ = await asyncio.wait([pump, killed], timeout=BASH_TIMEOUT or None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            killed.cancel()
+            if pump in done:
+                await self.proc.wait()
+            else:
+                if not self._killed.is_set():
+                    logger.warning(f"/bash job {self.id} timed out after {BASH_TIMEOUT}s: {self.command}")
+                    self.state = "timeout"
+                    kill_process_group(self.proc)
+                # Потомок, ушедший через setsid, может держать пайп - ждем его не дольше KILL_GRACE
+                await wait_killed(self.proc, [pump, asyncio.ensure_future(self.proc.wait())])
+            observe("subprocess", "bash", time.monotonic() - self.started)
+            if self.state == "running":
+                self.state = "done"
+        except asyncio.CancelledError:
+            if self.proc is not None:
+                kill_process_group(self.proc)
+            raise
+        except OSError as e:
+            logger.error(f"/bash job {self.id} failed to start: {e}")
+            self.state = "error"
+            self.buffer.write(str(e).encode())
+        finally:
+            ticker.cancel()
+            jobs.pop(self.id, None)
+        await self._show()
+        try:
+            if self.buffer.overflowed:
+                await self._send_full_output()
+        finally:
+            self.spool.file.close()
+
+    async def _send_full_output(self):
+        extension = "zst" if self.compression == "zstd" else "gz"
+        if self.spool_full:
+            caption = f"📎 Output of job {self.id}: first {_format_size(self.spool.raw_bytes)} of {_format_size(self.buffer.total)}"
+        else:
+            caption = f"📎 Full output of job {self.id} ({_format_size(self.spool.raw_bytes)})"
+        try:
+            await outbox.call(
+                self.chat_id, "send_document",
+                document=self.spool.finish(),
+                filename=f"{self.hostname}_bash_{self.id}.txt.{extension}",
+                caption=caption,
+            )
+        except Exception as e:
+            logger.error(f"Failed to send /bash job {self.id} output: {e}")
+
+# Запущенные команды этого хоста: id -> BashJob
+jobs = {}
+_ids = itertools.count(1)
+
+def start_job(chat_id: int, command: str, hostname: str):
+    """Запускает команду в фоне. Возвращает BashJob или None, если занято BASH_MAX_JOBS слотов."""
+    if len(jobs) >= BASH_MAX_JOBS:
+        return None
+    job = BashJob(next(_ids), chat_id, command, hostname)
+    jobs[job.id] = job
+    job.start()
+    return job
+
+async def stop_all():
+    """При остановке бота: убиваем процессы и ждем, пока задачи допишут итог."""
+    running = list(jobs.values())
+    for job in running:
+        job.cancel()
+    await asyncio.gather(*(job.task for job in running), return_exceptions=True)
@@ -0,0 +1,89 @@
+import tempfile
+import zlib
+from bot.config import DL_LOGS_COMPRESSION, DL_LOGS_PART_SIZE, DL_LOGS_SPOOL_SIZE
+from bot.docker_api import stream_logs
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# zstd - опциональная зависимость: без пакета zstandard используем gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Запас под хвост компрессора (flush) и заголовки multipart при загрузке
+PART_MARGIN = 256 * 1024
+
+def pick_compression() -> str:
+    """Алгоритм сжатия из DL_LOGS_COMPRESSION с учетом установленных пакетов."""
+    if DL_LOGS_COMPRESSION == "zstd" and zstandard is None:
+        logger.warning("DL_LOGS_COMPRESSION=zstd, but zstandard is not installed. Falling back to gzip.")
+        return "gzip"
+    return DL_LOGS_COMPRESSION
+
+class CompressedPart:
+    """
+    Один файл-архив: инкрементальный компрессор пишет в SpooledTemporaryFile,
+    который держит в памяти не больше DL_LOGS_SPOOL_SIZE байт, остальное - во временном файле.
+    Каждая часть - самостоятельный архив, который распаковывается отдельно.
+    """
+
+    def __init__(self, compression: str):
+        self.file = tempfile.SpooledTemporaryFile(max_size=DL_LOGS_SPOOL_SIZE)
+        if compression == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            # wbits=31 - формат gzip (заголовок + CRC), открывается любым gunzip
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        self.raw_bytes = 0
+
+    def write(self, data: bytes):
+        self.raw_bytes += len(data)
+        self.file.write(self._compressor.compress(data))
+
+    def size(self) -> int:
+        return self.file.tell()
+
+    def finish(self):
+        self.file.write(self._compressor.flush())
+        self.file.seek(0)
+        return self.file
+
+async def export_logs(container: str, send_part, tail=None, since=None) -> tuple:
+    """
+    Потоково сжимает логи контейнера и отдает их частями через await send_part(file, index, extension).
+    Часть закрывается, когда сжатый размер подходит к DL_LOGS_PART_SIZE, - по границе строки.
+    Возвращает (количество частей, байт логов до сжатия).
+    """
+    compression = pick_compression()
+    extension = "zst" if compression == "zstd" else "gz"
+    limit = DL_LOGS_PART_SIZE - PART_MARGIN
+    part, index, total = CompressedPart(compression), 0, 0
+
+    async def flush_part(current):
+        nonlocal index
+        index += 1
+        try:
+            await send_part(current.finish(), index, extension)
+        finally:
+            current.file.close()
+
+    try:
+        async for chunk in stream_logs(container, tail=tail, since=since):
+            total += len(chunk)
+            if part.size() < limit:
+                part.write(chunk)
+                continue
+            # Часть заполнена: дописываем до конца строки, остаток начинает следующую
+            cut = chunk.find(b"\n") + 1
+            if cut:
+                part.write(chunk[:cut])
+            await flush_part(part)
+            part = CompressedPart(compression)
+            part.write(chunk[cut:])
+        if part.raw_bytes or index == 0:
+            await flush_part(part)
+    finally:
+        part.file.close()
+    return index, total
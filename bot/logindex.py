@@ -0,0 +1,573 @@
+import asyncio
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bot.config import (
+    LOG_INDEX_DIR, LOG_INDEX_MAX_MB, LOG_INDEX_SEGMENT_MB, LOG_INDEX_BACKFILL_HOURS,
+    LOG_INDEX_SCAN_INTERVAL, TAIL_QUEUE_LINES,
+)
+from bot.docker_api import DockerError, running_containers
+from bot.logger import setup_logger
+from bot.tail import LogFollower
+
+logger = setup_logger()
+
+# Блок - единица поиска: для каждого блока строим Bloom-фильтр по триграммам строк
+BLOCK_SIZE = 256 * 1024
+# 2^18 бит (32 КБ) на блок: ~40 тыс. уникальных триграмм дают ~7% ложных срабатываний на триграмму
+BLOOM_BITS_LOG2 = 18
+BLOOM_BYTES = (1 << BLOOM_BITS_LOG2) // 8
+_SHIFT = 32 - BLOOM_BITS_LOG2
+
+def _trigrams(text: str) -> set:
+    """Триграммы (по 3 байта UTF-8) текста в нижнем регистре."""
+    data = text.lower().encode("utf-8")
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+def _bloom_bits(trigram: bytes) -> tuple:
+    """Два бита фильтра для триграммы (мультипликативное хеширование, стабильно между запусками)."""
+    v = int.from_bytes(trigram, "little")
+    return ((v * 0x9E3779B1) & 0xFFFFFFFF) >> _SHIFT, ((v * 0x85EBCA77 + 0x165667B1) & 0xFFFFFFFF) >> _SHIFT
+
+def build_bloom(trigrams) -> bytearray:
+    bloom = bytearray(BLOOM_BYTES)
+    for trigram in trigrams:
+        for bit in _bloom_bits(trigram):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    return bloom
+
+def _literal_runs(pattern: str) -> list:
+    """
+    Подстроки, которые обязаны встретиться в любой строке, подходящей под регулярку.
+    Консервативно: альтернативы, группы, классы символов и необязательные символы пропускаются.
+    """
+    runs, current, depth, i = [], "", 0, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if depth or nxt.isalnum():
+                # \d, \w, \b ... - не литерал
+                runs.append(current)
+                current = ""
+            else:
+                current += nxt
+            continue
+        i += 1
+        if c == "[":
+            # Класс символов: пропускаем до закрывающей скобки
+            if i < len(pattern) and pattern[i] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            runs.append(current)
+            current = ""
+        elif c in "*?{":
+            # Предыдущий символ необязателен (или повторяется неизвестно сколько раз)
+            runs.append(current[:-1])
+            current = ""
+            if c == "{":
+                while i < len(pattern) and pattern[i] != "}":
+                    i += 1
+                i += 1
+        elif c == "|" and not depth:
+            # Альтернатива верхнего уровня: обязательных подстрок нет
+            return []
+        elif c == "(":
+            depth += 1
+            runs.append(current)
+            current = ""
+        elif c == ")":
+            depth = max(0, depth - 1)
+        elif c in ".^$+":
+            runs.append(current)
+            current = ""
+        elif not depth:
+            current += c
+    runs.append(current)
+    return [run for run in runs if len(run) >= 3]
+
+# С якорями и lookbehind совпадение в сообщении может не найтись в тексте блока целиком
+_ANCHORS_RE = re.compile(r"[\^$]|\\[AZ]|\(\?<[=!]")
+
+def compile_query(pattern: str) -> tuple:
+    """
+    Регулярка (без учета регистра), маски Bloom-фильтра, которые обязаны быть в блоке,
+    и можно ли отбрасывать блок одной проверкой регулярки по всему его тексту.
+    Если шаблон не является корректной регуляркой, ищем его как строку.
+    """
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+        runs = _literal_runs(pattern)
+    except re.error:
+        runs = [pattern]
+        pattern = re.escape(pattern)
+        regex = re.compile(pattern, re.IGNORECASE)
+    masks = set()
+    for run in runs:
+        for trigram in _trigrams(run):
+            for bit in _bloom_bits(trigram):
+                masks.add((bit >> 3, 1 << (bit & 7)))
+    return regex, sorted(masks), not _ANCHORS_RE.search(pattern)
+
+class _Block:
+    """Метаданные блока сегмента: смещение, диапазон времени, контейнеры и (пока в памяти) фильтр."""
+
+    __slots__ = ("offset", "length", "tmin", "tmax", "containers", "bloom")
+
+    def __init__(self, offset, length, tmin, tmax, containers, bloom=None):
+        self.offset = offset
+        self.length = length
+        self.tmin = tmin
+        self.tmax = tmax
+        self.containers = containers
+        self.bloom = bloom
+
+class _BlockBuilder:
+    """Накопитель текущего блока: фильтр строится один раз при закрытии блока."""
+
+    def __init__(self, offset: int):
+        self.offset = offset
+        self.length = 0
+        self.tmin = float("inf")
+        self.tmax = float("-inf")
+        self.containers = set()
+        self.messages = []
+
+    def add(self, container: str, ts: float, message: str, size: int):
+        self.length += size
+        self.tmin = min(self.tmin, ts)
+        self.tmax = max(self.tmax, ts)
+        self.containers.add(container)
+        self.messages.append(message)
+
+    def snapshot(self) -> _Block:
+        """Незакрытый блок для поиска (без фильтра - читается целиком)."""
+        return _Block(self.offset, self.length, self.tmin, self.tmax, frozenset(self.containers))
+
+    def seal(self) -> _Block:
+        bloom = build_bloom(_trigrams("\n".join(self.messages)))
+        return _Block(self.offset, self.length, self.tmin, self.tmax, frozenset(self.containers), bloom)
+
+def _parse_line(raw: str):
+    """'СЕК.НАНО\\tконтейнер\\tсообщение' -> (метка, контейнер, сообщение)."""
+    stamp, _, rest = raw.partition("\t")
+    container, _, message = rest.partition("\t")
+    return stamp, container, message
+
+class _Segment:
+    """
+    Сегмент индекса: файл строк (.seg) и, после закрытия, файл индекса (.idx):
+    [заголовок][JSON с метаданными блоков][Bloom-фильтры блоков по BLOOM_BYTES].
+    Фильтры закрытых сегментов читаются через mmap и не занимают память процесса.
+    """
+
+    MAGIC = b"DOBLX1\x00\x00"
+    # magic, log2 размера фильтра, длина JSON
+    HEADER = struct.Struct("<8sII")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path[:-4] + ".idx"
+        self.blocks = []
+        # Последняя метка каждого контейнера в сегменте: продолжение потока после перезапуска
+        self.last = {}
+        self.size = 0
+        self.mm = None
+        self.bloom_base = 0
+
+    def disk_size(self) -> int:
+        index = self.HEADER.size + len(self.blocks) * BLOOM_BYTES if self.mm is not None else 0
+        return self.size + index
+
+    def save_index(self):
+        meta = json.dumps({
+            "blocks": [[b.offset, b.length, b.tmin, b.tmax, sorted(b.containers)] for b in self.blocks],
+            "last": self.last,
+        }).encode("utf-8")
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, BLOOM_BITS_LOG2, len(meta)))
+            f.write(meta)
+            for block in self.blocks:
+                f.write(block.bloom)
+        os.replace(tmp, self.index_path)
+
+    def open_index(self):
+        """Загружает метаданные из .idx и переключает фильтры на mmap. ValueError - файл не подходит."""
+        with open(self.index_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, bits, meta_len = self.HEADER.unpack_from(mm, 0)
+            if magic != self.MAGIC or bits != BLOOM_BITS_LOG2:
+                raise ValueError("unknown index format")
+            meta = json.loads(mm[self.HEADER.size:self.HEADER.size + meta_len])
+            blocks = [_Block(o, n, t0, t1, frozenset(c)) for o, n, t0, t1, c in meta["blocks"]]
+            self.bloom_base = self.HEADER.size + meta_len
+            if len(mm) != self.bloom_base + len(blocks) * BLOOM_BYTES:
+                raise ValueError("truncated index")
+        except (struct.error, KeyError, TypeError, ValueError):
+            mm.close()
+            raise ValueError(f"bad index file {self.index_path}")
+        self.blocks = blocks
+        self.last = meta["last"]
+        self.size = os.path.getsize(self.path)
+        self.mm = mm
+
+    def reindex(self):
+        """Строит индекс заново по файлу строк (сегмент не был закрыт, например, после падения)."""
+        self.blocks, self.last, self.size = [], {}, 0
+        builder = _BlockBuilder(0)
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Недописанная строка в конце файла
+                    break
+                stamp, container, message = _parse_line(raw[:-1].decode("utf-8", errors="replace"))
+                try:
+                    ts = float(stamp)
+                except ValueError:
+                    continue
+                if builder.length and builder.length + len(raw) > BLOCK_SIZE:
+                    self.blocks.append(builder.seal())
+                    builder = _BlockBuilder(self.size)
+                builder.add(container, ts, message, len(raw))
+                self.last[container] = stamp
+                self.size += len(raw)
+        if builder.length:
+            self.blocks.append(builder.seal())
+        # Обрезаем хвост, который не вошел в индекс
+        os.truncate(self.path, self.size)
+        self.save_index()
+        self.open_index()
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+class LogIndex:
+    """
+    Локальный индекс логов контейнеров для /grep.
+    Строки дописываются в сегменты фиксированного размера; для каждого блока (~256 КБ) хранятся
+    диапазон времени, список контейнеров и Bloom-фильтр триграмм. Поиск читает только блоки,
+    которые проходят фильтры, начиная с самых новых. Общий размер ограничен: старые сегменты удаляются.
+    В event loop строка только дописывается в файл: фильтры закрытых блоков и .idx закрытых сегментов
+    строит отдельный поток по очереди (пока фильтра нет, блок при поиске читается целиком).
+    Поиск идет из рабочих потоков, общее состояние защищено блокировкой.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(BLOCK_SIZE, segment_bytes)
+        self.segments = []
+        self._active = None
+        self._file = None
+        self._builder = None
+        self._seq = 0
+        self._cursors = {}
+        self._lock = threading.Lock()
+        # Один поток: фильтры блоков готовы раньше, чем сегмент с ними пишется на диск
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logindex")
+
+    def load(self):
+        """Открывает сегменты, оставшиеся с прошлого запуска (блокирующая операция)."""
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".seg"))
+        with self._lock:
+            for name in names:
+                segment = _Segment(os.path.join(self.directory, name))
+                try:
+                    try:
+                        segment.open_index()
+                    except (OSError, ValueError):
+                        logger.info(f"Rebuilding log index for {name}")
+                        segment.reindex()
+                except (OSError, ValueError) as e:
+                    logger.error(f"Dropping unreadable log segment {name}: {e}")
+                    self._remove(segment)
+                    continue
+                self.segments.append(segment)
+                for container, stamp in segment.last.items():
+                    self._cursors[container] = stamp
+            if names:
+                self._seq = int(names[-1][:-4]) + 1
+            self._enforce_limit()
+        logger.info(f"Log index loaded: {len(self.segments)} segments, {self.total_bytes() / 1024 ** 2:.1f} MB")
+
+    def cursor(self, container: str):
+        """Метка последней проиндексированной строки контейнера (секунды, наносекунды) или None."""
+        stamp = self._cursors.get(container)
+        if stamp is None:
+            return None
+        seconds, _, nanos = stamp.partition(".")
+        return int(seconds), int(nanos or 0)
+
+    def add(self, container: str, ts: tuple, message: str):
+        """Добавляет строку лога; ts - (секунды, наносекунды) из LogFollower."""
+        stamp = f"{ts[0]}.{ts[1]:09d}"
+        raw = f"{stamp}\t{container}\t{message}\n".encode("utf-8", errors="replace")
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            elif self._active.size + len(raw) > self.segment_bytes:
+                self._seal_segment()
+                self._open_segment()
+            elif self._builder.length + len(raw) > BLOCK_SIZE:
+                self._close_block()
+                self._builder = _BlockBuilder(self._active.size)
+            self._file.write(raw)
+            self._builder.add(container, ts[0] + ts[1] / 1e9, message, len(raw))
+            self._active.size += len(raw)
+            self._active.last[container] = stamp
+            self._cursors[container] = stamp
+
+    def _open_segment(self):
+        self._active = _Segment(os.path.join(self.directory, f"{self._seq:08d}.seg"))
+        self._seq += 1
+        self._file = open(self._active.path, "ab")
+        self._builder = _BlockBuilder(0)
+
+    def _close_block(self):
+        """Блок сразу доступен поиску (без фильтра), фильтр достраивается в рабочем потоке."""
+        block = self._builder.snapshot()
+        self._active.blocks.append(block)
+        self._worker.submit(self._build_bloom, block, self._builder.messages)
+
+    def _seal_segment(self):
+        if self._builder.length:
+            self._close_block()
+        self._file.close()
+        self._file = None
+        # Закрытый сегмент ищется по файлу строк, пока рабочий поток пишет его .idx
+        self.segments.append(self._active)
+        self._worker.submit(self._finish_segment, self._active)
+        self._active = None
+
+    def _build_bloom(self, block: _Block, messages: list):
+        # Присваивание атомарно: поиск видит либо None (читает блок целиком), либо готовый фильтр
+        block.bloom = build_bloom(_trigrams("\n".join(messages)))
+
+    def _finish_segment(self, segment: _Segment):
+        """Рабочий поток: пишет .idx закрытого сегмента, переключает его фильтры на mmap, удаляет старые."""
+        try:
+            segment.save_index()
+            with self._lock:
+                segment.open_index()
+        except (OSError, ValueError) as e:
+            # Фильтры остаются в памяти; при следующем запуске сегмент переиндексируется
+            logger.error(f"Failed to write log index for {segment.path}: {e}")
+        with self._lock:
+            self._enforce_limit()
+
+    def _remove(self, segment: _Segment):
+        segment.close()
+        for path in (segment.path, segment.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def total_bytes(self) -> int:
+        active = self._active.size if self._active else 0
+        return active + sum(segment.disk_size() for segment in self.segments)
+
+    def _enforce_limit(self):
+        while self.segments and self.total_bytes() > self.max_bytes:
+            self._remove(self.segments.pop(0))
+
+    def search(self, pattern: str, container: str = None, since: float = None, limit: int = 30) -> tuple:
+        """
+        Последние limit строк, подходящих под pattern (регулярка без учета регистра).
+        Возвращает ([(ts, контейнер, строка)] по возрастанию времени, прочитано блоков, всего блоков).
+        """
+        regex, masks, whole_text = compile_query(pattern)
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            plan = [(segment, segment.mm, list(segment.blocks)) for segment in self.segments]
+            if self._active is not None:
+                blocks = list(self._active.blocks)
+                if self._builder.length:
+                    blocks.append(self._builder.snapshot())
+                plan.append((self._active, None, blocks))
+
+        matches, scanned, total = [], 0, 0
+        for segment, mm, blocks in reversed(plan):
+            total += len(blocks)
+            if len(matches) >= limit:
+                continue
+            try:
+                with open(segment.path, "rb") as f:
+                    for i in range(len(blocks) - 1, -1, -1):
+                        block = blocks[i]
+                        if since is not None and block.tmax < since:
+                            continue
+                        if container is not None and container not in block.containers:
+                            continue
+                        if block.bloom is not None:
+                            bloom, base = block.bloom, 0
+                        elif mm is not None:
+                            bloom, base = mm, segment.bloom_base + i * BLOOM_BYTES
+                        else:
+                            bloom = None
+                        if bloom is not None and not all(bloom[base + byte] & bit for byte, bit in masks):
+                            continue
+                        scanned += 1
+                        f.seek(block.offset)
+                        text = f.read(block.length).decode("utf-8", errors="replace")
+                        if whole_text and not regex.search(text):
+                            continue
+                        for raw in reversed(text.split("\n")):
+                            stamp, name, message = _parse_line(raw)
+                            if not message and not name:
+                                continue
+                            if container is not None and name != container:
+                                continue
+                            ts = float(stamp)
+                            if since is not None and ts < since:
+                                continue
+                            if regex.search(message):
+                                matches.append((ts, name, message))
+                                if len(matches) >= limit:
+                                    break
+                        if len(matches) >= limit:
+                            break
+            except (OSError, ValueError) as e:
+                # Сегмент удалили по лимиту размера во время поиска
+                logger.debug(f"Skipping log segment {segment.path}: {e}")
+        # Собирали от новых к старым; сортировка устойчивая - порядок строк с одной меткой сохраняется
+        matches.reverse()
+        matches.sort(key=lambda match: match[0])
+        return matches, scanned, total
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._seal_segment()
+        self._worker.shutdown(wait=True)
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+
+class LogFeed:
+    """
+    Постоянные потоки логов запущенных контейнеров (LogFollower, как у /tail).
+    Каждая строка пишется в индекс и раздается подписчикам - /tail по этому контейнеру
+    читает тот же поток, а не открывает свой.
+    Поток заканчивается вместе с контейнером (die/destroy), остановленные контейнеры не опрашиваются.
+    Снова поток открывается по событию start (on_event) или при следующем обходе запущенных
+    контейнеров - с курсора, так что строки между остановкой и запуском не теряются.
+    """
+
+    def __init__(self, index: LogIndex, scan_interval: float, backfill: float):
+        self.index = index
+        self.scan_interval = scan_interval
+        self.backfill = backfill
+        self._followers = {}
+        self._subscribers = {}
+        self._task = None
+
+    def follows(self, container: str) -> bool:
+        return container in self._followers
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._followers.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._followers.clear()
+
+    async def _run(self):
+        await asyncio.to_thread(self.index.load)
+        while True:
+            try:
+                for name in await running_containers():
+                    self._ensure(name)
+            except Exception as e:
+                logger.error(f"Log index: failed to list containers: {e}")
+            await asyncio.sleep(self.scan_interval)
+
+    def _ensure(self, name: str):
+        if name not in self._followers:
+            self._followers[name] = asyncio.create_task(self._follow(name))
+
+    def on_event(self, name: str, action: str):
+        """Подписчик event_watcher: поток открывается и закрывается сразу, не дожидаясь обхода."""
+        if self._task is None:
+            return
+        if action == "start":
+            self._ensure(name)
+        elif action in ("die", "destroy"):
+            # Недочитанные строки подтянутся с курсора при следующем запуске
+            task = self._followers.pop(name, None)
+            if task is not None:
+                task.cancel()
+            if action == "destroy":
+                self._close_subscribers(name)
+
+    def _close_subscribers(self, name: str):
+        for queue in self._subscribers.get(name, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def _follow(self, name: str):
+        cursor = self.index.cursor(name)
+        follower = LogFollower(name, since=time.time() - self.backfill, cursor=cursor)
+        try:
+            async for ts, line in follower.lines(reconnect=False):
+                if ts is None:
+                    now = time.time_ns()
+                    ts = (now // 10 ** 9, now % 10 ** 9)
+                self.index.add(name, ts, line)
+                for queue in self._subscribers.get(name, ()):
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait((ts, line))
+        except DockerError as e:
+            # 404 - контейнер удален: /tail подписчиков заканчивается
+            logger.info(f"Log index: stopped following {name}: {e}")
+            self._close_subscribers(name)
+        finally:
+            # После die/start на этом месте может быть уже новый поток
+            if self._followers.get(name) is asyncio.current_task():
+                del self._followers[name]
+
+    async def lines(self, container: str):
+        """
+        Async-итератор (ts, line) по общему потоку контейнера - источник для TailSession.
+        Переживает рестарт контейнера (строки пойдут от следующего потока), заканчивается при удалении.
+        """
+        queue = asyncio.Queue(maxsize=TAIL_QUEUE_LINES)
+        subscribers = self._subscribers.setdefault(container, set())
+        subscribers.add(queue)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    raise DockerError(f"log stream for {container} closed", 404)
+                yield item
+        finally:
+            subscribers.discard(queue)
+
+# Общий индекс логов и его поток (None, если LOG_INDEX_DIR пустой - /grep выключен)
+log_index = LogIndex(
+    LOG_INDEX_DIR, int(LOG_INDEX_MAX_MB * 1024 ** 2), int(LOG_INDEX_SEGMENT_MB * 1024 ** 2)
+) if LOG_INDEX_DIR else None
+log_feed = LogFeed(log_index, LOG_INDEX_SCAN_INTERVAL, LOG_INDEX_BACKFILL_HOURS * 3600) if log_index else None
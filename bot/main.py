@@ -1,18 +1,59 @@
+import time
+# Засекаем как можно раньше - до тяжелых импортов
+_STARTED = time.perf_counter()
+
 import asyncio
+import psutil
 from telegram import Update, BotCommand, MenuButtonCommands
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
-from bot.config import BOT_TOKEN, CHECK_INTERVAL, ALERT_COOLDOWN, TELEGRAM_USER_ID
+from bot.config import BOT_TOKEN, TELEGRAM_API_URL, UPDATE_MODE, WEBHOOK_URL, WEBHOOK_CONCURRENCY, CHECK_INTERVAL, ALERT_COOLDOWN, TELEGRAM_USER_ID, GRAPH_PREWARM, STARTUP_BUDGET_MS, HOST_PROC
 from bot.logger import setup_logger
 from bot.handlers import (
-    start, status, cmd_cpu, cmd_ram, cmd_disk, cmd_uptime, alerts_status, 
+    start, status, cmd_cpu, cmd_ram, cmd_disk, cmd_net, cmd_uptime, alerts_status, 
     help_command, graph_command, fix_disk, docker_ps, docker_logs, docker_restart,
-    docker_download_logs, docker_tail_start, docker_tail_stop,
-    list_hosts, bash_command
+    docker_download_logs, docker_tail_start, docker_tail_stop, grep_logs,
+    list_hosts, bash_command, cancel_command, cmd_top, cmd_procs, bot_stats, HOSTNAME, SERVER_IP
 )
 from bot.alerts import check_alerts
+from bot.sampler import sampler
+from bot.history import history
+from bot.anomaly import anomaly_engine
+from bot.containers import container_stats
+from bot.fleet import coordinator as fleet_coordinator, agent as fleet_agent
+from bot.outbox import outbox, PRIORITY_ALERT
+from bot.tail import stop_all as stop_all_tails
+from bot.jobs import stop_all as stop_all_jobs
+from bot.logindex import log_index, log_feed
+from bot.exporter import exporter
+from bot.webhook import run_webhook
+from bot.events import event_watcher
+from bot.instrument import instrument_handlers, instrumentation, timed
 
 logger = setup_logger()
 
+# В контейнере процессы хоста видны только через /proc хоста (HOST_PROC=/host/proc).
+# PROCFS_PATH - глобальная настройка psutil: все чтения psutil в боте (метрики, сэмплер, алерты, /procs)
+# идут из /proc хоста - бот отчитывается о хосте, а не о своем контейнере
+if HOST_PROC != "/proc":
+    psutil.PROCFS_PATH = HOST_PROC
+
+def check_startup_budget() -> bool:
+    """Логирует время запуска с начала импорта bot.main и сверяет его с STARTUP_BUDGET_MS."""
+    elapsed_ms = (time.perf_counter() - _STARTED) * 1000
+    if elapsed_ms > STARTUP_BUDGET_MS:
+        logger.warning(f"Startup took {elapsed_ms:.0f} ms, over the {STARTUP_BUDGET_MS:.0f} ms budget.")
+        return False
+    logger.info(f"Startup took {elapsed_ms:.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms).")
+    return True
+
+async def prewarm_graphs():
+    """Фоновая загрузка matplotlib, чтобы первый /graph не ждал импорта."""
+    from bot.graphs import prewarm
+    try:
+        await asyncio.to_thread(prewarm)
+    except Exception as e:
+        logger.error(f"Graph pre-warm failed: {e}")
+
 async def setup_bot_commands(application):
     """
     Устанавливает список команд для бота.
@@ -22,83 +63,164 @@ async def setup_bot_commands(application):
         BotCommand("help", "❓ Справка"),
         BotCommand("hosts", "🌐 Список хостов"),
         BotCommand("bash", "💻 Выполнить команду (Shell)"), 
+        BotCommand("cancel", "🛑 Остановить команду /bash"),
         BotCommand("status", "📊 Сводка (ВСЕ / ИМЯ)"),
-        BotCommand("graph", "📈 График RAM (ВСЕ / ИМЯ)"),
+        BotCommand("graph", "📈 График RAM / истории метрик (ВСЕ / ИМЯ)"),
         BotCommand("fix", "🩹 Ремонт диска (ВСЕ / ИМЯ)"),
         
         # ChatOps команды
         BotCommand("ps", "🐳 Список контейнеров (ВСЕ / ИМЯ)"),
+        BotCommand("top", "📊 Ресурсы контейнеров (ВСЕ / ИМЯ)"),
         BotCommand("logs", "📋 Логи контейнера (ВСЕ / ИМЯ)"),
         BotCommand("dl_logs", "📥 Скачать логи (ВСЕ / ИМЯ)"),
         BotCommand("tail", "👀 Мониторинг логов (ВСЕ / ИМЯ)"),
         BotCommand("stop_tail", "🛑 Остановить мониторинг"),
+        BotCommand("grep", "🔎 Поиск по логам (ВСЕ / ИМЯ)"),
         BotCommand("restart", "🔄 Рестарт контейнера (ВСЕ / ИМЯ)"),
         
         # Метрики
         BotCommand("cpu", "🖥 Загрузка CPU (ВСЕ / ИМЯ)"),
         BotCommand("ram", "🧠 Использование RAM (ВСЕ / ИМЯ)"),
         BotCommand("disk", "💾 Использование диска (ВСЕ / ИМЯ)"),
+        BotCommand("net", "🌐 Сеть и TCP-соединения (ВСЕ / ИМЯ)"),
         BotCommand("uptime", "⏳ Время работы (ВСЕ / ИМЯ)"),
+        BotCommand("procs", "⚙️ Тяжелые процессы (ВСЕ / ИМЯ)"),
         BotCommand("alerts", "🚨 Статус алертов (ВСЕ / ИМЯ)"),
+        BotCommand("botstats", "⏱️ Задержки бота (ВСЕ / ИМЯ)"),
     ]
     
     await application.bot.set_my_commands(commands)
     await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
     logger.info("Bot commands and menu button updated.")
 
+async def post_init(application):
+    """Запуск после инициализации: команды бота и фоновый сбор метрик."""
+    await setup_bot_commands(application)
+    outbox.start(application.bot)
+    instrumentation.start()
+    if history:
+        sampler.subscribe(history.record)
+    sampler.add_source("containers", container_stats.collect)
+    sampler.subscribe(anomaly_engine.process)
+    if exporter:
+        sampler.subscribe(exporter.record)
+        await exporter.start()
+    if fleet_coordinator:
+        sampler.subscribe(fleet_coordinator.record)
+        await fleet_coordinator.start(HOSTNAME, SERVER_IP)
+    if fleet_agent:
+        sampler.subscribe(fleet_agent.publish)
+        await fleet_agent.start(HOSTNAME, SERVER_IP)
+    sampler.start()
+    if event_watcher:
+        event_watcher.start()
+    if log_feed:
+        log_feed.start()
+        if event_watcher:
+            event_watcher.subscribe(log_feed.on_event)
+    if GRAPH_PREWARM:
+        application.create_task(prewarm_graphs())
+
+async def post_shutdown(application):
+    await stop_all_tails()
+    await stop_all_jobs()
+    if event_watcher:
+        await event_watcher.stop()
+    if fleet_coordinator:
+        await fleet_coordinator.stop()
+    if fleet_agent:
+        await fleet_agent.stop()
+    if log_feed:
+        await log_feed.stop()
+        log_index.close()
+    if exporter:
+        await exporter.stop()
+    await sampler.stop()
+    await outbox.stop()
+    await instrumentation.stop()
+    if history:
+        history.close()
+    logger.info("Bot shutdown.")
+
 async def alarm_job(context: ContextTypes.DEFAULT_TYPE):
     """Фоновая задача для проверки алертов."""
     logger.info("Running scheduled alert check...")
-    alert_msg = check_alerts(ALERT_COOLDOWN)
+    snapshot = await sampler.get()
+    alert_msg = check_alerts(ALERT_COOLDOWN, snapshot)
     if alert_msg:
-        await context.bot.send_message(
-            chat_id=context.job.data, 
-            text=alert_msg
-        )
+        await outbox.send_message(context.job.data, alert_msg, priority=PRIORITY_ALERT)
         logger.info("Alert sent to Telegram")
 
-def main():
-    if not BOT_TOKEN:
-        logger.critical("BOT_TOKEN is not set in environment variables.")
-        return
-
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    application.post_init = setup_bot_commands
-    application.post_shutdown = lambda app: logger.info("Bot shutdown.")
+def build_application():
+    """Application со всеми хендлерами и задачами, но без запуска (его же поднимает bench/)."""
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if TELEGRAM_API_URL:
+        # Свой сервер Bot API (telegram-bot-api) или фейковый из bench/
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    if UPDATE_MODE == "webhook":
+        # Апдейты приходят параллельно по нескольким соединениям - и обрабатываются параллельно
+        builder = builder.concurrent_updates(WEBHOOK_CONCURRENCY)
+    application = builder.build()
+    application.post_init = post_init
+    application.post_shutdown = post_shutdown
 
     # Регистрируем обработчики команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("hosts", list_hosts))
     application.add_handler(CommandHandler("bash", bash_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(CommandHandler("status", status))
     application.add_handler(CommandHandler("graph", graph_command))
     application.add_handler(CommandHandler("fix", fix_disk))
     
     # ChatOps обработчики
     application.add_handler(CommandHandler("ps", docker_ps))
+    application.add_handler(CommandHandler("top", cmd_top))
     application.add_handler(CommandHandler("logs", docker_logs))
     application.add_handler(CommandHandler("dl_logs", docker_download_logs))
     application.add_handler(CommandHandler("tail", docker_tail_start))
     application.add_handler(CommandHandler("stop_tail", docker_tail_stop))
+    application.add_handler(CommandHandler("grep", grep_logs))
     application.add_handler(CommandHandler("restart", docker_restart))
     
     # Метрики
     application.add_handler(CommandHandler("cpu", cmd_cpu))
     application.add_handler(CommandHandler("ram", cmd_ram))
     application.add_handler(CommandHandler("disk", cmd_disk))
+    application.add_handler(CommandHandler("net", cmd_net))
     application.add_handler(CommandHandler("uptime", cmd_uptime))
+    application.add_handler(CommandHandler("procs", cmd_procs))
     application.add_handler(CommandHandler("alerts", alerts_status))
+    application.add_handler(CommandHandler("botstats", bot_stats))
+
+    # Время выполнения каждой команды (/botstats, /metrics)
+    instrument_handlers(application)
 
     # Добавляем задачу в очередь (JobQueue)
     job_queue = application.job_queue
     if job_queue:
-        job_queue.run_repeating(alarm_job, interval=CHECK_INTERVAL, first=10, data=TELEGRAM_USER_ID)
+        job_queue.run_repeating(timed("job", "alarm", alarm_job), interval=CHECK_INTERVAL, first=10, data=TELEGRAM_USER_ID)
     else:
         logger.error("JobQueue is not initialized.")
+    return application
+
+def main():
+    if not BOT_TOKEN:
+        logger.critical("BOT_TOKEN is not set in environment variables.")
+        return
 
-    logger.info("Bot started successfully.")
-    application.run_polling()
+    if UPDATE_MODE == "webhook" and not WEBHOOK_URL:
+        logger.critical("UPDATE_MODE=webhook requires WEBHOOK_URL.")
+        return
+
+    application = build_application()
+    logger.info(f"Bot started successfully ({UPDATE_MODE}).")
+    check_startup_budget()
+    if UPDATE_MODE == "webhook":
+        run_webhook(application)
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
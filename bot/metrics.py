@@ -1,36 +1,12 @@
 import psutil
 import os
+import re
+from collections import Counter
 from datetime import datetime
-from collections import deque
-import statistics
-
-from collections import deque
-import statistics
-
-# Храним последние 100 измерений
-cpu_history = deque(maxlen=100)
-
-def check_anomaly(current_cpu):
-    cpu_history.append(current_cpu)
-    
-    if len(cpu_history) < 20:
-        return False, "Not enough data"
-
-    # Считаем среднее и стандартное отклонение (сигму)
-    mean = statistics.mean(cpu_history)
-    stdev = statistics.stdev(cpu_history)
-    
-    # Если текущее значение больше чем Среднее + 2*Сигма (правило 2-х сигм)
-    threshold = mean + (2 * stdev)
-    
-    if current_cpu > threshold and current_cpu > 20: # Игнорируем idle-флуктуации
-        return True, f"Anomaly! CPU {current_cpu}% > Norm {threshold:.1f}% (Avg: {mean:.1f}%)"
-    
-    return False, ""
-
-def get_cpu_usage():
-    """Загрузка CPU в %."""
-    return psutil.cpu_percent(interval=1)
+
+def get_cpu_usage(interval=1):
+    """Загрузка CPU в %. interval=None - без ожидания (с момента прошлого вызова)."""
+    return psutil.cpu_percent(interval=interval)
 
 def get_load_avg():
     """Load Average (1, 5, 15 min)."""
@@ -57,4 +33,205 @@ def get_disk_usage():
 def get_uptime():
     """Время работы сервера в человекочитаемом формате."""
     boot_time = datetime.fromtimestamp(psutil.boot_time())
-    return str(datetime.now() - boot_time).split('.')[0]
\ No newline at end of file
+    return str(datetime.now() - boot_time).split('.')[0]
+# Псевдо-ФС и образы, которые не заполняются данными - их не мониторим
+PSEUDO_FS = {
+    "tmpfs", "devtmpfs", "squashfs", "overlay", "proc", "sysfs", "cgroup", "cgroup2",
+    "devpts", "mqueue", "nsfs", "autofs", "fuse.lxcfs", "tracefs", "debugfs", "securityfs",
+}
+
+def get_mounts():
+    """Точки монтирования реальных ФС (одно устройство - одна точка). '/' присутствует всегда."""
+    mounts, devices = ["/"], set()
+    for part in psutil.disk_partitions(all=False):
+        if part.fstype in PSEUDO_FS or part.device in devices or part.mountpoint in mounts:
+            continue
+        devices.add(part.device)
+        mounts.append(part.mountpoint)
+    return mounts
+
+def get_mount_usage(mountpoint: str):
+    """Использование одной точки монтирования в % и ГБ."""
+    disk = psutil.disk_usage(mountpoint)
+    return {
+        "percent": disk.percent,
+        "used_gb": disk.used / (1024 ** 3),
+        "free_gb": disk.free / (1024 ** 3),
+        "total_gb": disk.total / (1024 ** 3)
+    }
+
+class DiskIOTracker:
+    """
+    Пропускная способность и IOPS по устройствам как разница счетчиков между замерами.
+    Хранит только последние счетчики каждого устройства: device -> (ts, read_b, write_b, reads, writes).
+    """
+
+    # Виртуальные устройства без реального I/O
+    SKIP_PREFIXES = ("loop", "ram", "zram", "dm-")
+
+    def __init__(self):
+        self._state = {}
+
+    def sample(self, now: float) -> dict:
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        rates = {}
+        for device, c in counters.items():
+            if device.startswith(self.SKIP_PREFIXES):
+                continue
+            prev = self._state.get(device)
+            self._state[device] = (now, c.read_bytes, c.write_bytes, c.read_count, c.write_count)
+            if prev is None or now <= prev[0]:
+                continue
+            dt = now - prev[0]
+            rates[device] = {
+                "read_mbps": max(0, c.read_bytes - prev[1]) / dt / (1024 ** 2),
+                "write_mbps": max(0, c.write_bytes - prev[2]) / dt / (1024 ** 2),
+                "read_iops": max(0, c.read_count - prev[3]) / dt,
+                "write_iops": max(0, c.write_count - prev[4]) / dt,
+            }
+        # Отключенные устройства не держим в таблице
+        for device in self._state.keys() - counters.keys():
+            del self._state[device]
+        return rates
+
+def read_net_dev(net_dir: str) -> dict:
+    """
+    Счетчики интерфейсов из <net_dir>/dev (то же, что psutil.net_io_counters(pernic=True),
+    но для любого сетевого namespace - в контейнере это /proc хоста, pid 1).
+    iface -> (rx_bytes, rx_packets, rx_errs, rx_drop, tx_bytes, tx_packets, tx_errs, tx_drop)
+    """
+    counters = {}
+    with open(os.path.join(net_dir, "dev")) as f:
+        for line in f.readlines()[2:]:
+            iface, _, data = line.partition(":")
+            fields = data.split()
+            counters[iface.strip()] = tuple(int(fields[i]) for i in (0, 1, 2, 3, 8, 9, 10, 11))
+    return counters
+
+def get_link_speed(sys_root: str, iface: str):
+    """Скорость линка в Мбит/с из sysfs; None для виртуальных интерфейсов и выключенного линка."""
+    try:
+        with open(os.path.join(sys_root, "class", "net", iface, "speed")) as f:
+            speed = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return speed if speed > 0 else None
+
+class NetIOTracker:
+    """
+    Трафик, пакеты, ошибки и дропы по сетевым интерфейсам как разница счетчиков между замерами
+    (как DiskIOTracker). Скорость линка перечитывается раз в минуту - по ней считается загрузка NIC.
+    """
+
+    # lo и veth-концы контейнеров (их трафик уже виден в /top)
+    SKIP_PREFIXES = ("lo", "veth")
+
+    def __init__(self, net_dir: str, sys_root: str):
+        self.net_dir = net_dir
+        self.sys_root = sys_root
+        # iface -> (ts, счетчики read_net_dev)
+        self._state = {}
+        self._speeds = {}
+        self._speeds_ts = 0
+
+    def sample(self, now: float) -> dict:
+        counters = {
+            iface: c for iface, c in read_net_dev(self.net_dir).items() if not iface.startswith(self.SKIP_PREFIXES)
+        }
+        if now - self._speeds_ts > 60 or counters.keys() - self._speeds.keys():
+            self._speeds = {iface: get_link_speed(self.sys_root, iface) for iface in counters}
+            self._speeds_ts = now
+        rates = {}
+        for iface, c in counters.items():
+            prev = self._state.get(iface)
+            self._state[iface] = (now, c)
+            if prev is None or now <= prev[0]:
+                continue
+            dt = now - prev[0]
+            # Счетчик мог сброситься (интерфейс пересоздан) - отрицательная разница считается нулем
+            d = [max(0, value - old) / dt for value, old in zip(c, prev[1])]
+            speed = self._speeds.get(iface)
+            rx_mbit, tx_mbit = d[0] * 8 / 1e6, d[4] * 8 / 1e6
+            rates[iface] = {
+                "rx_mbit": rx_mbit,
+                "tx_mbit": tx_mbit,
+                "rx_pps": d[1],
+                "tx_pps": d[5],
+                "errors": d[2] + d[6],
+                "drops": d[3] + d[7],
+                "speed_mbit": speed,
+                # Линк дуплексный - загрузка по более занятому направлению
+                "util": max(rx_mbit, tx_mbit) * 100 / speed if speed else None,
+            }
+        for iface in self._state.keys() - counters.keys():
+            del self._state[iface]
+        return rates
+
+# Поле st в /proc/net/tcp* (include/net/tcp_states.h)
+TCP_STATES = {
+    b"01": "established", b"02": "syn_sent", b"03": "syn_recv", b"04": "fin_wait1",
+    b"05": "fin_wait2", b"06": "time_wait", b"07": "close", b"08": "close_wait",
+    b"09": "last_ack", b"0A": "listen", b"0B": "closing", b"0C": "new_syn_recv",
+}
+# Состояние идет сразу после порта удаленного адреса ("0A000002:1F90 01 "); другие поля
+# с ":XXXX " в строке не встречаются, поэтому полный разбор строки не нужен
+_TCP_STATE_RE = re.compile(rb":[0-9A-F]{4} ([0-9A-F]{2}) ")
+
+def get_tcp_states(net_dir: str) -> dict:
+    """
+    Число TCP-сокетов (IPv4 + IPv6) по состояниям: один потоковый проход по <net_dir>/tcp и tcp6
+    кусками по 1 МБ, состояние вынимается регулярным выражением без разбора строк в Python.
+    psutil.net_connections для этого не годится: на 100k сокетов он строит объект на каждый
+    и обходит /proc/<pid>/fd всех процессов.
+    """
+    counts = Counter()
+    for name in ("tcp", "tcp6"):
+        try:
+            f = open(os.path.join(net_dir, name), "rb")
+        except FileNotFoundError:
+            # IPv6 выключен
+            continue
+        with f:
+            rest = b""
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                data = rest + chunk
+                end = data.rfind(b"\n") + 1
+                counts.update(_TCP_STATE_RE.findall(data, 0, end))
+                rest = data[end:]
+    return {TCP_STATES.get(code, code.decode()): count for code, count in counts.items()}
+
+class FillRateTracker:
+    """
+    Скорость заполнения каждой точки монтирования и прогноз "до заполнения".
+    Скорость пересчитывается не чаще раза в window секунд и сглаживается EWMA,
+    чтобы кратковременные всплески записи не давали ложных прогнозов.
+    """
+
+    def __init__(self, window: float = 60, alpha: float = 0.3):
+        self.window = window
+        self.alpha = alpha
+        # mountpoint -> [anchor_ts, anchor_used_gb, rate_gb_per_hour]
+        self._state = {}
+
+    def update(self, mountpoint: str, used_gb: float, free_gb: float, now: float):
+        """Возвращает (рост ГБ/ч, часов до заполнения или None, если диск не растет)."""
+        state = self._state.get(mountpoint)
+        if state is None:
+            self._state[mountpoint] = [now, used_gb, None]
+            return None, None
+        anchor_ts, anchor_used, rate = state
+        if now - anchor_ts >= self.window:
+            current = (used_gb - anchor_used) * 3600 / (now - anchor_ts)
+            rate = current if rate is None else rate + self.alpha * (current - rate)
+            state[:] = [now, used_gb, rate]
+        if rate is None:
+            return None, None
+        hours_to_full = free_gb / rate if rate > 1e-6 else None
+        return rate, hours_to_full
+
+    def forget(self, mountpoints):
+        for mountpoint in self._state.keys() - set(mountpoints):
+            del self._state[mountpoint]
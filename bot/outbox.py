@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter, BadRequest, Forbidden, NetworkError, TimedOut
+from bot.config import OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_MAX_PENDING
+from bot.instrument import observe, error
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Классы приоритета: меньше - раньше. Алерты обгоняют ответы, ответы обгоняют поток /tail
+PRIORITY_ALERT = 0
+PRIORITY_REPLY = 1
+PRIORITY_TAIL = 2
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Повторы при сетевых ошибках (кроме таймаута - сообщение могло уже уйти)
+MAX_ATTEMPTS = 3
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше burst про запас."""
+
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до следующего токена (0 - можно отправлять)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+class _Item:
+    """Запрос к Bot API в очереди: метод, аргументы и future всех, кто его ждет."""
+
+    __slots__ = ("priority", "seq", "method", "kwargs", "futures", "coalesce", "attempts", "files")
+
+    def __init__(self, priority, seq, method, kwargs, coalesce):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.kwargs = kwargs
+        self.futures = [asyncio.get_running_loop().create_future()]
+        self.coalesce = coalesce
+        self.attempts = 0
+        # Файлы (document, photo...) и их начальные позиции: попытка вычитывает файл до конца
+        self.files = {
+            key: value.tell() for key, value in kwargs.items()
+            if hasattr(value, "read") and hasattr(value, "seekable") and value.seekable()
+        }
+
+    def rewind(self):
+        """Перед каждой попыткой файлы отдаются с начала, иначе повтор загрузит пустой файл."""
+        for key, position in self.files.items():
+            self.kwargs[key].seek(position)
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def can_merge(self, other) -> bool:
+        """Два текста в один чат с одинаковыми параметрами и суммарно в пределах лимита."""
+        if not (self.coalesce and other.coalesce and self.priority == other.priority):
+            return False
+        if {k: v for k, v in self.kwargs.items() if k != "text"} != {k: v for k, v in other.kwargs.items() if k != "text"}:
+            return False
+        return len(self.kwargs["text"]) + len(other.kwargs["text"]) + 2 <= MESSAGE_LIMIT
+
+class _Chat:
+    """Очередь и лимит одного чата. Скорость снижается вдвое на каждый 429 и медленно восстанавливается."""
+
+    __slots__ = ("queue", "bucket", "paused_until", "busy", "max_rate")
+
+    def __init__(self, rate: float, burst: float):
+        self.queue = []
+        self.bucket = TokenBucket(rate, burst)
+        self.max_rate = rate
+        self.paused_until = 0.0
+        self.busy = False
+
+    def slow_down(self):
+        self.bucket.rate = max(self.max_rate / 16, self.bucket.rate / 2)
+
+    def speed_up(self):
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate * 0.05)
+
+class Outbox:
+    """
+    Единая очередь исходящих сообщений бота.
+    Отправка идет по приоритету (алерты -> ответы -> /tail) с общим лимитом Telegram (~30 msg/s)
+    и token bucket на каждый чат (~1 msg/s). Подряд идущие короткие тексты в один чат
+    склеиваются в одно сообщение. На RetryAfter чат ставится на паузу, а его скорость снижается.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, max_pending: int):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_pending = max_pending
+        self.bot = None
+        self.stats = {"sent": 0, "merged": 0, "retry_after": 0, "network_errors": 0, "rejected": 0, "dropped": 0, "failed": 0}
+        self._chats = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+
+    def start(self, bot):
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._inflight)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def submit(self, chat_id: int, method: str, priority: int = PRIORITY_REPLY, coalesce: bool = False, **kwargs):
+        """Ставит вызов bot.<method>(chat_id=..., **kwargs) в очередь. Возвращает future с результатом."""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+        item = _Item(priority, next(self._seq), method, kwargs, coalesce)
+        heapq.heappush(chat.queue, item)
+        if len(chat.queue) > self.max_pending:
+            self._drop_oldest_tail(chat)
+        self._wakeup.set()
+        return item.futures[0]
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_REPLY,
+                           coalesce: bool = True, **kwargs):
+        """
+        Текстовое сообщение через очередь; ждет фактической отправки и возвращает Message.
+        coalesce=False - сообщение не склеивается с соседними (например, его потом редактируют).
+        """
+        coalesce = coalesce and "reply_markup" not in kwargs
+        return await self.submit(chat_id, "send_message", priority, coalesce, text=text, **kwargs)
+
+    async def call(self, chat_id: int, method: str, priority: int = PRIORITY_REPLY, **kwargs):
+        """Любой метод Bot API (send_document, send_photo...) через очередь и лимиты."""
+        return await self.submit(chat_id, method, priority, **kwargs)
+
+    def pending(self) -> int:
+        """Сколько запросов ждет в очередях всех чатов."""
+        return sum(len(chat.queue) for chat in self._chats.values())
+
+    def _drop_oldest_tail(self, chat: _Chat):
+        """Переполнение: выбрасываем самое старое сообщение /tail (алерты и ответы не теряем)."""
+        tails = [item for item in chat.queue if item.priority >= PRIORITY_TAIL]
+        if not tails:
+            return
+        oldest = min(tails, key=lambda item: item.seq)
+        chat.queue.remove(oldest)
+        heapq.heapify(chat.queue)
+        for future in oldest.futures:
+            if not future.done():
+                future.set_result(None)
+        self.stats["dropped"] += 1
+
+    def _pick(self, now: float):
+        """Чат, который можно обслужить сейчас (лучший приоритет), или (None, сколько ждать)."""
+        global_wait = self.global_bucket.wait_time(now)
+        best, best_chat, wait = None, None, None
+        for chat_id, chat in self._chats.items():
+            if not chat.queue or chat.busy:
+                continue
+            ready_in = max(global_wait, chat.paused_until - now, chat.bucket.wait_time(now))
+            if ready_in > 0:
+                wait = ready_in if wait is None else min(wait, ready_in)
+                continue
+            head = chat.queue[0]
+            if best is None or head < best:
+                best, best_chat = head, chat_id
+        return best_chat, wait
+
+    def _pop(self, chat: _Chat) -> _Item:
+        item = heapq.heappop(chat.queue)
+        while chat.queue and item.can_merge(chat.queue[0]):
+            nxt = heapq.heappop(chat.queue)
+            item.kwargs = dict(item.kwargs, text=item.kwargs["text"] + "\n\n" + nxt.kwargs["text"])
+            item.futures += nxt.futures
+            self.stats["merged"] += 1
+        return item
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            chat_id, wait = self._pick(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            chat = self._chats[chat_id]
+            item = self._pop(chat)
+            self.global_bucket.take(now)
+            chat.bucket.take(now)
+            # Один запрос на чат в полете - порядок сообщений в чате сохраняется
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(chat_id, chat, item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id: int, chat: _Chat, item: _Item):
+        started = time.perf_counter()
+        item.rewind()
+        try:
+            try:
+                result = await getattr(self.bot, item.method)(chat_id=chat_id, **item.kwargs)
+            finally:
+                observe("telegram", item.method, time.perf_counter() - started)
+        except RetryAfter as e:
+            error("telegram", type(e).__name__)
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+            logger.warning(f"Telegram flood limit for chat {chat_id}: retry after {delay:.0f}s")
+            self.stats["retry_after"] += 1
+            chat.paused_until = time.monotonic() + delay
+            chat.slow_down()
+            heapq.heappush(chat.queue, item)
+        except (BadRequest, Forbidden) as e:
+            # Подклассы NetworkError, но повтор не поможет (разметка, бот заблокирован) - чат не ждет
+            error("telegram", type(e).__name__)
+            self.stats["rejected"] += 1
+            self._fail(item, e)
+        except NetworkError as e:
+            error("telegram", type(e).__name__)
+            self.stats["network_errors"] += 1
+            item.attempts += 1
+            if isinstance(e, TimedOut) or item.attempts >= MAX_ATTEMPTS:
+                self._fail(item, e)
+            else:
+                chat.paused_until = time.monotonic() + 2 ** item.attempts
+                heapq.heappush(chat.queue, item)
+        except Exception as e:
+            error("telegram", type(e).__name__)
+            self._fail(item, e)
+        else:
+            self.stats["sent"] += 1
+            chat.speed_up()
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            chat.busy = False
+            self._wakeup.set()
+
+    def _fail(self, item: _Item, error: Exception):
+        logger.error(f"Failed to deliver {item.method}: {error}")
+        self.stats["failed"] += 1
+        for future in item.futures:
+            if not future.done():
+                future.set_exception(error)
+
+# Общая очередь исходящих сообщений (запускается в post_init с application.bot)
+outbox = Outbox(OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_MAX_PENDING)
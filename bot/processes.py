@@ -0,0 +1,88 @@
+import asyncio
+import time
+import psutil
+from bot.config import PROCS_MAX_AGE, PROCS_WINDOW
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Только то, что нужно для отчета: process_iter читает их под oneshot() одним проходом по /proc/<pid>
+ATTRS = ["name", "username", "cpu_times", "memory_info", "io_counters"]
+
+# Сортировка /procs: ключ команды -> поле строки
+SORT_KEYS = {"cpu": "cpu", "mem": "rss_mb", "io": "io_kbps"}
+
+class ProcessTable:
+    """
+    Таблица процессов, живущая между замерами.
+    Хранит объекты psutil.Process (их же переиспользует process_iter) и прошлые счетчики
+    CPU-времени и I/O, поэтому CPU% - честная разница между замерами, без блокирующего interval.
+    Процессы хоста в контейнере видны через psutil.PROCFS_PATH (задается в bot/main.py).
+    """
+
+    def __init__(self, max_age: float, window: float):
+        self.max_age = max_age
+        self.window = window
+        # pid -> (Process, cpu_seconds, read_bytes, write_bytes)
+        self._state = {}
+        self._ts = None
+        self._rows = []
+        self._lock = asyncio.Lock()
+
+    def scan(self) -> list:
+        """Один проход по процессам (в рабочем потоке). Возвращает строки с дельтами от прошлого прохода."""
+        now = time.monotonic()
+        dt = now - self._ts if self._ts is not None else None
+        state, rows = {}, []
+        for proc in psutil.process_iter(ATTRS, ad_value=None):
+            info = proc.info
+            times, memory, io = info["cpu_times"], info["memory_info"], info["io_counters"]
+            if times is None or memory is None:
+                continue
+            cpu_seconds = times.user + times.system
+            read, written = (io.read_bytes, io.write_bytes) if io is not None else (None, None)
+            state[proc.pid] = (proc, cpu_seconds, read, written)
+
+            prev = self._state.get(proc.pid)
+            # Тот же объект Process - тот же процесс (process_iter отличает переиспользованный pid)
+            if prev is None or prev[0] is not proc or not dt:
+                continue
+            io_kbps = None
+            if read is not None and prev[2] is not None:
+                io_kbps = (max(0, read - prev[2]) + max(0, written - prev[3])) / dt / 1024
+            rows.append({
+                "pid": proc.pid,
+                "name": info["name"] or "?",
+                "user": info["username"] or "?",
+                "cpu": max(0.0, cpu_seconds - prev[1]) * 100 / dt,
+                "rss_mb": memory.rss / (1024 ** 2),
+                "io_kbps": io_kbps,
+            })
+        # Завершившиеся процессы выпадают из таблицы сами
+        self._state = state
+        self._ts = now
+        return rows
+
+    async def get(self) -> list:
+        """
+        Строки за последнее окно. Свежий результат отдается из кэша; если прошлый проход
+        старше max_age, делается базовый проход и второй через window секунд (не блокируя loop).
+        """
+        async with self._lock:
+            age = time.monotonic() - self._ts if self._ts is not None else None
+            if age is not None and age < self.window:
+                return self._rows
+            if age is None or age > self.max_age:
+                await asyncio.to_thread(self.scan)
+                await asyncio.sleep(self.window)
+            started = time.perf_counter()
+            self._rows = await asyncio.to_thread(self.scan)
+            logger.debug(f"Process scan: {len(self._rows)} processes in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return self._rows
+
+def top_processes(rows: list, sort: str = "cpu", limit: int = 10) -> list:
+    key = SORT_KEYS[sort]
+    return sorted(rows, key=lambda row: row[key] or 0, reverse=True)[:limit]
+
+# Общая таблица процессов для /procs
+process_table = ProcessTable(PROCS_MAX_AGE, PROCS_WINDOW)
@@ -0,0 +1,215 @@
+import json
+import operator
+import os
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+SEVERITY_EMOJI = {"critical": "🔴", "warning": "🟠", "info": "🔵"}
+SEVERITY_ORDER = {"critical": 0, "warning": 1, "info": 2}
+
+# Правила по умолчанию - те же пороги, что были зашиты в check_alerts (диск - по всем точкам монтирования)
+DEFAULT_RULES = [
+    {"name": "cpu_high", "metric": "cpu", "op": ">", "threshold": 85, "severity": "critical",
+     "message": "🔥 CPU > 85% (Current: {value}%)"},
+    {"name": "ram_high", "metric": "ram.percent", "op": ">", "threshold": 90, "severity": "critical",
+     "message": "💧 RAM > 90% (Current: {value:.1f}%)"},
+    {"name": "disk_high", "metric": "mounts.*.percent", "op": ">", "threshold": 90, "severity": "critical",
+     "message": "💾 Disk {match} > 90% (Current: {value:.1f}%)"},
+    {"name": "disk_full_soon", "metric": "mounts.*.hours_to_full", "op": "<", "threshold": 24, "clear": 36,
+     "severity": "warning", "message": "⏳ Disk {match} will be full in ~{value:.1f}h at the current rate"},
+    {"name": "container_mem_high", "metric": "containers.*.mem_percent", "op": ">", "threshold": 90, "clear": 85,
+     "for": 60, "severity": "warning", "message": "🐳 Container {match} memory > 90% of its limit (Current: {value:.1f}%)"},
+]
+
+def flatten(snapshot: dict, prefix: str = "", out: dict = None) -> dict:
+    """
+    Плоский вид снимка для правил: {"ram": {"percent": 5}} -> {"ram.percent": 5},
+    кортежи/списки индексируются: load -> load.0, load.1, load.2. Нечисловые значения пропускаются.
+    """
+    if out is None:
+        out = {}
+    for key, value in snapshot.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flatten(value, name + ".", out)
+        elif isinstance(value, (list, tuple)):
+            flatten(dict(enumerate(value)), name + ".", out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+class Rule:
+    """Скомпилированное правило алерта."""
+
+    __slots__ = ("name", "metric", "compare", "op", "threshold", "clear", "duration",
+                 "cooldown", "severity", "message", "prefix", "suffix")
+
+    def __init__(self, spec: dict, default_cooldown: float):
+        self.name = spec["name"]
+        self.metric = spec["metric"]
+        self.op = spec.get("op", ">")
+        if self.op not in OPERATORS:
+            raise ValueError(f"unknown op {self.op!r}")
+        self.compare = OPERATORS[self.op]
+        self.threshold = float(spec["threshold"])
+        # Гистерезис: алерт гаснет, только когда значение перестало удовлетворять порогу clear
+        self.clear = float(spec.get("clear", self.threshold))
+        self.duration = float(spec.get("for", 0))
+        self.cooldown = float(spec.get("cooldown", default_cooldown))
+        self.severity = spec.get("severity", "warning")
+        if self.severity not in SEVERITY_ORDER:
+            raise ValueError(f"unknown severity {self.severity!r}")
+        self.message = spec.get("message")
+
+        # Шаблон с одним '*' ("mounts.*.percent") матчится по префиксу и суффиксу
+        if self.metric.count("*") > 1:
+            raise ValueError("only one '*' is supported in metric")
+        if "*" in self.metric:
+            self.prefix, _, self.suffix = self.metric.partition("*")
+        else:
+            self.prefix = self.suffix = None
+
+    def render(self, key: str, value: float) -> str:
+        match = key[len(self.prefix):len(key) - len(self.suffix)] if self.prefix is not None else key
+        fields = {"value": value, "threshold": self.threshold, "key": key, "name": self.name, "match": match}
+        if self.message:
+            try:
+                return self.message.format(**fields)
+            except (KeyError, ValueError, IndexError) as e:
+                logger.error(f"Bad message template in rule {self.name}: {e}")
+        return f"{SEVERITY_EMOJI[self.severity]} {self.name}: {key} {self.op} {self.threshold:g} (Current: {value:.1f})"
+
+class _State:
+    """Состояние пары (правило, метрика)."""
+
+    __slots__ = ("pending_since", "firing", "last_alert")
+
+    def __init__(self):
+        self.pending_since = None
+        self.firing = False
+        self.last_alert = None
+
+class RuleEngine:
+    """
+    Декларативные правила алертов.
+    Правила компилируются один раз и индексируются по имени метрики (точные) и по последнему
+    сегменту имени (шаблоны с '*'), поэтому проход по снимку стоит O(число метрик),
+    а не O(правила x метрики): сотни правил стоят почти как одно.
+    """
+
+    def __init__(self, specs: list, default_cooldown: float):
+        self.rules = []
+        self._exact = {}
+        self._wildcard = {}
+        self._generic = []
+        self._states = {}
+        for spec in specs:
+            try:
+                rule = Rule(spec, default_cooldown)
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f"Skipping invalid alert rule {spec!r}: {e}")
+                continue
+            self.rules.append(rule)
+            if rule.prefix is None:
+                self._exact.setdefault(rule.metric, []).append(rule)
+            elif rule.suffix.startswith("."):
+                self._wildcard.setdefault(self._tail(rule.suffix), []).append(rule)
+            else:
+                # '*' в конце или внутри сегмента - такие шаблоны проверяются для каждой метрики
+                self._generic.append(rule)
+
+    @staticmethod
+    def _tail(name: str) -> str:
+        return name.rsplit(".", 1)[-1]
+
+    @staticmethod
+    def _fits(rule: Rule, key: str) -> bool:
+        return (len(key) > len(rule.prefix) + len(rule.suffix)
+                and key.startswith(rule.prefix) and key.endswith(rule.suffix))
+
+    def _matches(self, flat: dict):
+        """Пары (правило, ключ, значение) для всех метрик снимка."""
+        for key, value in flat.items():
+            for rule in self._exact.get(key, ()):
+                yield rule, key, value
+            for rule in self._wildcard.get(self._tail(key), ()):
+                if self._fits(rule, key):
+                    yield rule, key, value
+            for rule in self._generic:
+                if self._fits(rule, key):
+                    yield rule, key, value
+
+    def evaluate(self, snapshot: dict, now: float) -> list:
+        """
+        Один проход по снимку. Обновляет состояние правил и возвращает алерты к отправке:
+        список (severity, message), критичные первыми.
+        """
+        alerts = []
+        flat = flatten(snapshot)
+        for rule, key, value in self._matches(flat):
+            state_key = (rule.name, key)
+            state = self._states.get(state_key)
+            if state is None:
+                state = self._states[state_key] = _State()
+
+            if state.firing:
+                if not rule.compare(value, rule.clear):
+                    state.firing = False
+                    state.pending_since = None
+                    logger.info(f"Alert {rule.name} ({key}) resolved: {value}")
+                    continue
+            elif rule.compare(value, rule.threshold):
+                if state.pending_since is None:
+                    state.pending_since = now
+                if now - state.pending_since < rule.duration:
+                    continue
+                state.firing = True
+            else:
+                state.pending_since = None
+                continue
+
+            # Правило горит: напоминаем не чаще, чем раз в cooldown
+            if state.last_alert is None or now - state.last_alert > rule.cooldown:
+                state.last_alert = now
+                message = rule.render(key, value)
+                alerts.append((rule.severity, message))
+                logger.warning(f"Alert {rule.name} triggered: {key} = {value}")
+
+        # Метрики пропавших контейнеров и точек монтирования: их состояние больше не нужно
+        for state_key in [state_key for state_key in self._states if state_key[1] not in flat]:
+            del self._states[state_key]
+        alerts.sort(key=lambda alert: SEVERITY_ORDER[alert[0]])
+        return alerts
+
+    def firing(self, snapshot: dict) -> list:
+        """Какие правила сейчас выполняются (без учета 'for' и cooldown, состояние не меняется)."""
+        alerts = [
+            (rule.severity, rule.render(key, value))
+            for rule, key, value in self._matches(flatten(snapshot))
+            if rule.compare(value, rule.threshold)
+        ]
+        alerts.sort(key=lambda alert: SEVERITY_ORDER[alert[0]])
+        return alerts
+
+def load_rules(path: str) -> list:
+    """Читает правила из JSON-файла (список объектов). Если файла нет - правила по умолчанию."""
+    if not path or not os.path.exists(path):
+        return DEFAULT_RULES
+    try:
+        with open(path, encoding="utf-8") as f:
+            specs = json.load(f)
+        logger.info(f"Loaded {len(specs)} alert rules from {path}")
+        return specs
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load alert rules from {path}: {e}. Using defaults.")
+        return DEFAULT_RULES
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+from bot.config import SAMPLE_INTERVAL, SNAPSHOT_MAX_AGE, HOST_PROC, HOST_SYS, TCP_STATES_INTERVAL
+from bot.instrument import observe
+from bot.logger import setup_logger
+from bot.metrics import (
+    get_cpu_usage, get_load_avg, get_ram_usage, get_disk_usage, get_mounts, get_mount_usage,
+    DiskIOTracker, FillRateTracker, NetIOTracker, get_tcp_states
+)
+
+logger = setup_logger()
+
+class MetricsSampler:
+    """
+    Фоновый сборщик метрик.
+    Раз в interval секунд снимает CPU/RAM/Disk/Load в отдельном потоке и хранит
+    последний снимок. Хендлеры и алерты читают снимок мгновенно, не блокируя event loop.
+    """
+
+    def __init__(self, interval: float, max_age: float):
+        self.interval = interval
+        self.max_age = max_age
+        self._snapshot = None
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._primed = False
+        self._listeners = []
+        self._sources = []
+        self._disk_io = DiskIOTracker()
+        self._fill = FillRateTracker()
+        # /proc/net - сеть namespace текущего процесса; в контейнере сеть хоста видна через pid 1
+        self._net_dir = "/proc/net" if HOST_PROC == "/proc" else os.path.join(HOST_PROC, "1", "net")
+        self._net_io = NetIOTracker(self._net_dir, HOST_SYS)
+        # Проход по /proc/net/tcp* дорогой на больших хостах - пересчитываем раз в TCP_STATES_INTERVAL
+        self._tcp = {}
+        self._tcp_ts = 0
+        # Список точек монтирования меняется редко - перечитываем раз в минуту
+        self._mounts = None
+        self._mounts_ts = 0
+
+    def collect(self) -> dict:
+        """Снимает метрики синхронно. Вызывается только из рабочего потока."""
+        if not self._primed:
+            # Первый вызов cpu_percent(None) всегда возвращает 0.0 - делаем короткий замер
+            cpu = get_cpu_usage(interval=0.5)
+            self._primed = True
+        else:
+            # Неблокирующий замер: CPU с момента предыдущего вызова
+            cpu = get_cpu_usage(interval=None)
+
+        now = time.time()
+        return {
+            "ts": now,
+            "cpu": cpu,
+            "load": get_load_avg(),
+            "ram": get_ram_usage(),
+            "disk": get_disk_usage(),
+            "mounts": self._collect_mounts(now),
+            "disk_io": self._disk_io.sample(now),
+            "net_io": self._collect_net(now),
+            "tcp": self._collect_tcp(now),
+        }
+
+    def _collect_net(self, now: float) -> dict:
+        try:
+            return self._net_io.sample(now)
+        except OSError as e:
+            # /proc хоста не смонтирован или нет прав на /proc/1/net
+            logger.debug(f"Network counters unavailable: {e}")
+            return {}
+
+    def _collect_tcp(self, now: float) -> dict:
+        if TCP_STATES_INTERVAL > 0 and now - self._tcp_ts >= TCP_STATES_INTERVAL:
+            self._tcp_ts = now
+            try:
+                self._tcp = get_tcp_states(self._net_dir)
+            except OSError as e:
+                logger.debug(f"TCP states unavailable: {e}")
+                self._tcp = {}
+        return self._tcp
+
+    def _collect_mounts(self, now: float) -> dict:
+        """Все точки монтирования + скорость заполнения и прогноз до заполнения."""
+        if self._mounts is None or now - self._mounts_ts > 60:
+            self._mounts = get_mounts()
+            self._mounts_ts = now
+            self._fill.forget(self._mounts)
+        mounts = {}
+        for mountpoint in self._mounts:
+            try:
+                usage = get_mount_usage(mountpoint)
+            except OSError:
+                # Точку отмонтировали между перечитываниями списка
+                continue
+            growth, hours_to_full = self._fill.update(mountpoint, usage["used_gb"], usage["free_gb"], now)
+            usage["growth_gb_h"] = growth
+            usage["hours_to_full"] = hours_to_full
+            mounts[mountpoint] = usage
+        return mounts
+
+    def add_source(self, key: str, collect):
+        """
+        Регистрирует асинхронный источник: snapshot[key] = await collect(ts) после каждого замера
+        (для данных, которые нельзя снять в рабочем потоке, например, через Docker API).
+        """
+        self._sources.append((key, collect))
+
+    async def _collect_sources(self, snapshot: dict):
+        for key, collect in self._sources:
+            try:
+                snapshot[key] = await collect(snapshot["ts"])
+            except Exception as e:
+                logger.error(f"Snapshot source {key} failed: {e}")
+                snapshot[key] = {}
+
+    def subscribe(self, callback):
+        """Регистрирует callback(snapshot), вызываемый после каждого нового снимка."""
+        self._listeners.append(callback)
+
+    def _notify(self, snapshot: dict):
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Snapshot listener {getattr(callback, '__qualname__', callback)} failed: {e}")
+
+    async def refresh(self) -> dict:
+        """Принудительно обновляет снимок (одновременные вызовы делят один замер)."""
+        started = time.time()
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог обновить кто-то другой
+            if self._snapshot and self._snapshot["ts"] >= started:
+                return self._snapshot
+            collect_started = time.perf_counter()
+            snapshot = await asyncio.to_thread(self.collect)
+            await self._collect_sources(snapshot)
+            observe("job", "sampler", time.perf_counter() - collect_started)
+            self._snapshot = snapshot
+            self._notify(snapshot)
+        return self._snapshot
+
+    async def get(self, max_age: float = None) -> dict:
+        """Возвращает снимок не старше max_age секунд (по умолчанию SNAPSHOT_MAX_AGE)."""
+        if max_age is None:
+            max_age = self.max_age
+        snapshot = self._snapshot
+        if snapshot is None or time.time() - snapshot["ts"] > max_age:
+            snapshot = await self.refresh()
+        return snapshot
+
+    def start(self):
+        """Запускает фоновую задачу сбора (вызывать внутри работающего event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Metrics sampler started (interval: {self.interval}s).")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Metrics sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+# Общий сборщик для всех команд и фоновых задач
+sampler = MetricsSampler(SAMPLE_INTERVAL, SNAPSHOT_MAX_AGE)
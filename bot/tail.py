@@ -0,0 +1,211 @@
+import asyncio
+import calendar
+import time
+from bot.config import TAIL_FLUSH_INTERVAL, TAIL_MESSAGE_LIMIT, TAIL_QUEUE_LINES
+from bot.docker_api import DockerError, stream_logs
+from bot.logger import setup_logger
+from bot.outbox import outbox, PRIORITY_TAIL
+
+logger = setup_logger()
+
+# Длинные строки режем, чтобы одна строка не съела всё сообщение
+MAX_LINE_LEN = 1000
+# Пауза перед переподключением, если поток закрылся (рестарт/остановка контейнера)
+RECONNECT_DELAY = 3
+
+
+def parse_timestamp(ts: str) -> tuple:
+    """RFC3339Nano от Docker ('2024-05-01T12:00:00.123456789Z') -> (секунды, наносекунды)."""
+    base, _, frac = ts.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(base, "%Y-%m-%dT%H:%M:%S"))
+    nanos = int((frac + "000000000")[:9]) if frac else 0
+    return seconds, nanos
+
+
+class LogFollower:
+    """
+    Один долгоживущий поток логов контейнера (follow + timestamps).
+    Отдает каждую строку ровно один раз: временная метка последней строки служит курсором,
+    при переподключении поток открывается с since=курсор, а уже выданные строки пропускаются.
+    """
+
+    def __init__(self, container: str, since: float = None, cursor: tuple = None):
+        self.container = container
+        # cursor - продолжить с уже сохраненной строки (секунды, наносекунды), она не повторится
+        self.cursor = cursor
+        # Сколько строк с меткой == cursor уже выдано (метки могут совпадать)
+        self._at_cursor = 1 if cursor is not None else 0
+        self._skip = 0
+        self._since = since if since is not None else time.time()
+
+    def _since_param(self) -> str:
+        if self.cursor is None:
+            return f"{self._since:.9f}"
+        return f"{self.cursor[0]}.{self.cursor[1]:09d}"
+
+    def _accept(self, raw: bytes):
+        """Разбирает строку 'TIMESTAMP message'. Возвращает (ts, text) или None для дубликата."""
+        text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        stamp, _, message = text.partition(" ")
+        try:
+            ts = parse_timestamp(stamp)
+        except ValueError:
+            # Строка без метки (не должно случаться с timestamps=1) - отдаем как есть
+            return self.cursor, text
+        if self.cursor is not None:
+            if ts < self.cursor:
+                return None
+            if ts == self.cursor:
+                if self._skip > 0:
+                    self._skip -= 1
+                    return None
+                self._at_cursor += 1
+                return ts, message
+        self.cursor = ts
+        self._at_cursor = 1
+        return ts, message
+
+    async def lines(self, reconnect: bool = True):
+        """
+        Async-итератор (ts, line); после обрыва потока (рестарт/остановка контейнера) переподключается.
+        reconnect=False - заканчивается вместе с потоком: остановленный контейнер не опрашивается.
+        """
+        while True:
+            # При переподключении Docker заново отдаст строки с меткой == cursor
+            self._skip = self._at_cursor
+            buf = bytearray()
+            try:
+                chunks = stream_logs(self.container, follow=True, timestamps=True, since=self._since_param())
+                async for chunk in chunks:
+                    buf += chunk
+                    while True:
+                        end = buf.find(b"\n")
+                        if end < 0:
+                            break
+                        item = self._accept(bytes(buf[:end]))
+                        del buf[:end + 1]
+                        if item:
+                            yield item
+                if buf:
+                    item = self._accept(bytes(buf))
+                    if item:
+                        yield item
+            except (DockerError, ConnectionError, asyncio.IncompleteReadError) as e:
+                if isinstance(e, DockerError) and e.status == 404:
+                    # Контейнера нет (или его удалили) - переподключаться бессмысленно
+                    raise
+                logger.warning(f"Log stream for {self.container} interrupted: {e}")
+            if not reconnect:
+                return
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+class TailSession:
+    """
+    /tail для одного пользователя: читатель потока логов + отправитель сообщений.
+    Между ними ограниченная очередь: если контейнер пишет быстрее, чем мы успеваем
+    отправлять в Telegram, старые строки выбрасываются с пометкой, память не растет.
+    """
+
+    def __init__(self, chat_id: int, container: str, hostname: str, source=None):
+        self.chat_id = chat_id
+        self.container = container
+        self.hostname = hostname
+        self.queue = asyncio.Queue(maxsize=TAIL_QUEUE_LINES)
+        self.dropped = 0
+        self._carry = None
+        # Готовый поток (ts, line) - например, общий поток индексатора логов; иначе свой LogFollower
+        self.source = source
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._read()),
+            asyncio.create_task(self._send_loop()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _read(self):
+        source = self.source or LogFollower(self.container).lines()
+        try:
+            await self._pump(source)
+            reason = "log stream closed"
+        except Exception as e:
+            # Не только DockerError: обрыв сокета (OSError, IncompleteReadError) тоже завершает поток
+            reason = str(e) or type(e).__name__
+        logger.error(f"Tail for {self.container} stopped: {reason}")
+        # Сессию снимаем при любом завершении потока, иначе /tail в этом чате не запустить заново
+        if sessions.get(self.chat_id) is self:
+            del sessions[self.chat_id]
+        self._tasks[1].cancel()
+        try:
+            await outbox.send_message(self.chat_id, f"❌ Tail for {self.container} stopped: {reason}")
+        except Exception as e:
+            logger.error(f"Failed to send tail update: {e}")
+
+    async def _pump(self, source):
+        async for _, line in source:
+            if len(line) > MAX_LINE_LEN:
+                line = line[:MAX_LINE_LEN] + "…"
+            if self.queue.full():
+                # Backpressure: выбрасываем самую старую строку и считаем потери
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(line)
+
+    async def _collect(self) -> list:
+        """Ждет первую строку, затем копит до лимита размера или до TAIL_FLUSH_INTERVAL."""
+        if self._carry is not None:
+            lines, self._carry = [self._carry], None
+        else:
+            lines = [await self.queue.get()]
+        size = len(lines[0]) + 1
+        deadline = time.monotonic() + TAIL_FLUSH_INTERVAL
+        while size < TAIL_MESSAGE_LIMIT:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                line = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(line) + 1 > TAIL_MESSAGE_LIMIT:
+                # Не влезает - строка откроет следующее сообщение
+                self._carry = line
+                break
+            lines.append(line)
+            size += len(line) + 1
+        return lines
+
+    async def _send_loop(self):
+        while True:
+            lines = await self._collect()
+            text = "\n".join(lines)
+            if self.dropped:
+                text = f"... ({self.dropped} lines skipped: too much output)\n" + text
+                self.dropped = 0
+            try:
+                # Низкий приоритет: алерты и ответы на команды уходят раньше потока логов
+                await outbox.send_message(
+                    self.chat_id,
+                    f"📝 *{self.hostname}* | Logs for `{self.container}`:\n```\n{text}\n```",
+                    priority=PRIORITY_TAIL,
+                    parse_mode="Markdown"
+                )
+            except Exception as e:
+                logger.error(f"Failed to send tail update: {e}")
+
+
+# Активные /tail по chat_id (личный чат = user_id)
+sessions = {}
+
+
+async def stop_all():
+    for session in list(sessions.values()):
+        await session.stop()
+    sessions.clear()
@@ -0,0 +1,178 @@
+import asyncio
+import hmac
+import json
+import secrets
+import signal
+import ssl
+from urllib.parse import urlsplit
+from telegram import Update
+from bot.config import (
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_SECRET, WEBHOOK_CERT, WEBHOOK_KEY, WEBHOOK_MAX_CONNECTIONS,
+)
+from bot.logger import setup_logger
+
+logger = setup_logger()
+
+# Заголовок, в котором Telegram повторяет secret_token из setWebhook
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+# Апдейт Telegram - несколько КБ; больше - это не Telegram
+MAX_BODY = 1024 ** 2
+# Сколько держать простаивающее keep-alive соединение и сколько ждать заголовки/тело запроса (сек)
+IDLE_TIMEOUT = 120
+READ_TIMEOUT = 10
+
+
+class WebhookServer:
+    """
+    Прием апдейтов от Telegram (setWebhook) на голом asyncio вместо long polling getUpdates.
+    Соединения keep-alive: Telegram держит до WEBHOOK_MAX_CONNECTIONS соединений и шлет по ним
+    апдейты подряд. Запрос проверяется по секрету (X-Telegram-Bot-Api-Secret-Token), апдейт
+    кладется в update_queue приложения, и 200 отвечается сразу, не дожидаясь хендлера -
+    параллельность обработки задает concurrent_updates приложения (WEBHOOK_CONCURRENCY).
+    """
+
+    def __init__(self, application, url: str, listen: str, secret: str = "", cert: str = "", key: str = "",
+                 max_connections: int = 40):
+        self.application = application
+        self.url = url
+        self.path = urlsplit(url).path or "/"
+        self.listen = listen
+        # Без настройки - случайный секрет на каждый запуск (setWebhook все равно вызывается при старте)
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.cert = cert
+        self.key = key
+        self.max_connections = max_connections
+        self.stats = {"updates": 0, "rejected": 0, "connections": 0}
+        self._server = None
+        # Задача обработчика соединения -> writer (на остановке закрываем и дожидаемся)
+        self._connections = {}
+
+    async def start(self):
+        """Поднимает сервер и регистрирует webhook в Bot API."""
+        ssl_context = None
+        if self.cert:
+            # Свой (в том числе самоподписанный) сертификат - без reverse proxy перед ботом
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(self.cert, self.key or None)
+        host, _, port = self.listen.rpartition(":")
+        self._server = await asyncio.start_server(self._serve, host or "0.0.0.0", int(port), ssl=ssl_context)
+        certificate = None
+        if self.cert:
+            with open(self.cert, "rb") as f:
+                certificate = f.read()
+        await self.application.bot.set_webhook(
+            self.url, certificate=certificate, max_connections=self.max_connections, secret_token=self.secret,
+        )
+        logger.info(f"Webhook listening on {self.listen}, registered {self.url}")
+
+    async def stop(self):
+        """Webhook в Telegram не удаляется: апдейты копятся у Telegram до следующего запуска."""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._connections.values()):
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    def _dispatch(self, method: str, target: str, headers: dict, body: bytes) -> str:
+        if target.split("?")[0] != self.path:
+            return "404 Not Found"
+        if method != "POST":
+            return "405 Method Not Allowed"
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            self.stats["rejected"] += 1
+            return "403 Forbidden"
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return "400 Bad Request"
+        self.application.update_queue.put_nowait(update)
+        self.stats["updates"] += 1
+        return "200 OK"
+
+    @staticmethod
+    async def _read_request(reader):
+        """Строка запроса и заголовки: (method, target, headers) или None, если клиент закрыл соединение или молчит."""
+        try:
+            request = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if not request:
+            return None
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        method, target = (request.decode("latin-1").split() + ["", ""])[:2]
+        return method, target, headers
+
+    async def _respond(self, reader, writer, method: str, target: str, headers: dict) -> bool:
+        """Дочитывает тело, обрабатывает запрос и отвечает. Возвращает, годится ли соединение для следующего."""
+        length = int(headers.get("content-length") or 0)
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if length > MAX_BODY:
+            # Тело не дочитываем - соединение дальше не годится
+            status, keep_alive = "413 Payload Too Large", False
+        else:
+            body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+            status = self._dispatch(method, target, headers, body)
+        connection = "" if keep_alive else "Connection: close\r\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n{connection}\r\n".encode())
+        await writer.drain()
+        return keep_alive
+
+    async def _serve(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None or not await self._respond(reader, writer, *request):
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+
+def create_server(application) -> WebhookServer:
+    return WebhookServer(
+        application, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_SECRET, WEBHOOK_CERT, WEBHOOK_KEY, WEBHOOK_MAX_CONNECTIONS,
+    )
+
+
+async def _run(application):
+    # Тот же порядок, что в Application.run_polling, только вместо Updater - свой сервер
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    server = create_server(application)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.start()
+        await stop.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application):
+    """Аналог application.run_polling() для режима webhook (до SIGINT/SIGTERM)."""
+    asyncio.run(_run(application))
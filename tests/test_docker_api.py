@@ -0,0 +1,156 @@
+"""
+Клиент Docker Engine API (bot/docker_api.py) против фейкового Docker из bench/ на Unix-сокете
+во временном каталоге, плюс разбор потоков (chunked, мультиплексированные кадры, JSON-строки).
+"""
+import asyncio
+import json
+import pytest
+from bench.fake_docker import FakeDocker, LOG_CONTENT_TYPE, _frame
+from bot.docker_api import DockerClient, demux_stream, _json_lines
+
+
+def run(tmp_path, scenario):
+    """Запускает scenario(client, fake) с клиентом, подключенным к FakeDocker."""
+
+    async def main():
+        fake = FakeDocker(str(tmp_path / "docker.sock"))
+        await fake.start()
+        client = DockerClient(fake.socket_path, pool_size=2, timeout=5)
+        try:
+            await asyncio.wait_for(scenario(client, fake), 10)
+        finally:
+            await client.close()
+            await fake.stop()
+
+    asyncio.run(main())
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def feed(data: bytes):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def test_keep_alive_reuses_connection(tmp_path):
+    async def scenario(client, fake):
+        assert await client.ping()
+        assert [c["Names"] for c in await client.containers()] == [["/bench-1"], ["/bench-2"], ["/bench-3"]]
+        assert (await client.inspect("bench-2"))["Id"] == "bench-2"
+        assert fake.connections == 1
+        assert len(client._idle) == 1
+
+    run(tmp_path, scenario)
+
+
+def test_retries_when_pooled_connection_is_dead(tmp_path):
+    async def scenario(client, fake):
+        # Соединение в пуле выглядит живым, но сервер закрывает его, получив запрос
+        async def hang_up(reader, writer):
+            await reader.readline()
+            writer.close()
+
+        dead = await asyncio.start_unix_server(hang_up, str(tmp_path / "dead.sock"))
+        client._idle.append(await asyncio.open_unix_connection(str(tmp_path / "dead.sock")))
+        try:
+            assert await client.ping()
+        finally:
+            dead.close()
+            await dead.wait_closed()
+        assert fake.calls["/_ping"] == 1
+        assert fake.connections == 1
+
+    run(tmp_path, scenario)
+
+
+def test_fresh_connection_error_is_not_retried(tmp_path):
+    async def scenario(client, fake):
+        accepted = []
+
+        def hang_up(reader, writer):
+            accepted.append(writer)
+            writer.close()
+
+        await fake.stop()
+        fake._server = await asyncio.start_unix_server(hang_up, fake.socket_path)
+        with pytest.raises(ConnectionResetError):
+            await client.ping()
+        assert len(accepted) == 1
+
+    run(tmp_path, scenario)
+
+
+def test_chunked_body():
+    async def scenario():
+        reader = feed(b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\nNEXT")
+        body = await collect(DockerClient._iter_body(reader, 200, {"transfer-encoding": "chunked"}, "GET"))
+        assert body == [b"hello", b" world"]
+        # Трейлеры дочитаны - следующий ответ на соединении начинается с начала
+        assert await reader.read() == b"NEXT"
+
+    asyncio.run(scenario())
+
+
+def test_streams_chunked_logs_and_events(tmp_path):
+    async def scenario(client, fake):
+        frames = await client.open_logs("bench-1", follow=True)
+        events = await client.events()
+        await asyncio.sleep(0.1)
+        fake.emit("bench-1", "first")
+        fake.emit("bench-1", "second")
+        fake.emit_event("bench-1", "die", exitCode="1")
+        assert await frames.__anext__() == (1, b"first\n")
+        assert await frames.__anext__() == (1, b"second\n")
+        event = await events.__anext__()
+        assert (event["Action"], event["Actor"]["Attributes"]["exitCode"]) == ("die", "1")
+        await frames.aclose()
+        await events.aclose()
+
+    run(tmp_path, scenario)
+
+
+def test_logs_until_end(tmp_path):
+    async def scenario(client, fake):
+        text = await client.logs("bench-3", tail=2)
+        assert text == "bench-3 GET /api/items/0 200 0ms\nbench-3 GET /api/items/1 200 1ms\n"
+
+    run(tmp_path, scenario)
+
+
+def test_demux_frames_split_across_chunks():
+    data = _frame(b"out line\n") + _frame(b"err line\n", stream=2) + _frame(b"")
+    parts = [data[:3], data[3:12], data[12:20], data[20:]]
+    frames = asyncio.run(collect(demux_stream(chunks(*parts), LOG_CONTENT_TYPE)))
+    assert frames == [(1, b"out line\n"), (2, b"err line\n"), (1, b"")]
+
+
+def test_demux_raw_and_guessed_streams():
+    # TTY-контейнер: поток сырой, всё - stdout
+    raw = asyncio.run(collect(demux_stream(chunks(b"\x01\x00\x00\x00abc", b"def"), "application/vnd.docker.raw-stream")))
+    assert raw == [(1, b"\x01\x00\x00\x00abc"), (1, b"def")]
+    # Без content-type формат угадывается по первому заголовку
+    guessed = asyncio.run(collect(demux_stream(chunks(_frame(b"x", stream=2)))))
+    assert guessed == [(2, b"x")]
+    text = asyncio.run(collect(demux_stream(chunks(b"plain text output\n"))))
+    assert text == [(1, b"plain text output\n")]
+    # Недописанный кадр в конце потока не теряется
+    tail = asyncio.run(collect(demux_stream(chunks(_frame(b"ok") + b"\x01\x00"), LOG_CONTENT_TYPE)))
+    assert tail == [(1, b"ok"), (1, b"\x01\x00")]
+
+
+def test_json_lines():
+    events = [{"Action": "start", "id": "a"}, {"Action": "die", "id": "b"}]
+    data = b"\n".join(json.dumps(event).encode() for event in events) + b"\n\n"
+    parsed = asyncio.run(collect(_json_lines(chunks(data[:7], data[7:30], data[30:]))))
+    assert parsed == events
+    # Строка без перевода строки в конце - не дописанное событие, она не разбирается
+    assert asyncio.run(collect(_json_lines(chunks(b'{"a": 1}\n{"b"')))) == [{"a": 1}]
@@ -0,0 +1,165 @@
+"""
+Режим флота (bot/fleet.py): координатор и несколько агентов на 127.0.0.1 в одном event loop.
+Агенты получают снимки напрямую через publish(), как от сэмплера.
+"""
+import asyncio
+import json
+import time
+import pytest
+from bot import fleet
+from bot.fleet import FleetCoordinator, FleetAgent
+
+TOKEN = "secret"
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(fleet, "RECONNECT_DELAY", (0.05, 0.1))
+
+
+def snapshot(cpu: float = 12.5) -> dict:
+    return {
+        "ts": time.time(), "cpu": cpu, "load": (0.5, 0.4, 0.3),
+        "ram": {"percent": 40.0, "used_gb": 4.0, "total_gb": 10.0},
+        "disk": {"percent": 70.0, "used_gb": 70.0, "total_gb": 100.0},
+        "mounts": {"/data": {"percent": 91.0}},
+    }
+
+
+async def eventually(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition was not met in time"
+        await asyncio.sleep(0.02)
+
+
+def run(scenario, stale: float = 60):
+    """Запускает scenario(coordinator, port) с координатором на свободном порту localhost."""
+
+    async def main():
+        coordinator = FleetCoordinator("127.0.0.1:0", TOKEN, stale)
+        await coordinator.start("coord", "10.0.0.1")
+        port = coordinator._server.sockets[0].getsockname()[1]
+        try:
+            await asyncio.wait_for(scenario(coordinator, port), 10)
+        finally:
+            await coordinator.stop()
+
+    asyncio.run(main())
+
+
+async def hello(port: int, token: str = TOKEN, host: str = "raw"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(json.dumps({"type": "hello", "host": host, "token": token}).encode() + b"\n")
+    await writer.drain()
+    return reader, writer
+
+
+def test_several_agents_report():
+    async def scenario(coordinator, port):
+        agents = [FleetAgent(f"127.0.0.1:{port}", TOKEN) for _ in range(3)]
+        for i, agent in enumerate(agents, 1):
+            await agent.start(f"web-{i}", f"10.0.0.{i + 1}")
+            agent.publish(snapshot(cpu=i * 10))
+        try:
+            await eventually(lambda: len(coordinator.hosts) == 3)
+            # Новая сводка заменяет старую
+            agents[0].publish(snapshot(cpu=99))
+            await eventually(lambda: coordinator.hosts["web-1"]["cpu"] == 99)
+        finally:
+            for agent in agents:
+                await agent.stop()
+        assert coordinator.hosts["web-2"]["ip"] == "10.0.0.3"
+        assert coordinator.hosts["web-3"]["worst_mount"] == ["/data", 91.0]
+        table = coordinator.render("cpu")
+        rows = [line.split()[:2] for line in table.splitlines()[1:4]]
+        assert rows == [["web-1", "99.0"], ["web-2", "20.0"], ["web-3", "30.0"]]
+        assert table.endswith("3 hosts")
+
+    run(scenario)
+
+
+def test_bad_token_rejected():
+    async def scenario(coordinator, port):
+        reader, writer = await hello(port, token="wrong")
+        assert await reader.readline() == b""
+        writer.close()
+        agent = FleetAgent(f"127.0.0.1:{port}", "wrong")
+        await agent.start("intruder", "10.0.0.9")
+        agent.publish(snapshot())
+        await asyncio.sleep(0.3)
+        await agent.stop()
+        assert coordinator.hosts == {}
+
+    run(scenario)
+
+
+@pytest.mark.parametrize("message", [
+    {"type": "snapshot", "cpu": "high"},
+    dict(snapshot(), type="snapshot", ram={"percent": "40"}),
+    dict(snapshot(), type="snapshot", load=[1, 2]),
+    ["snapshot"],
+])
+def test_invalid_summary_dropped(message):
+    async def scenario(coordinator, port):
+        reader, writer = await hello(port)
+        assert json.loads(await reader.readline()) == {"type": "ok"}
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        # Координатор закрывает соединение и не кладет сводку в кэш
+        assert await reader.readline() == b""
+        writer.close()
+        assert "raw" not in coordinator.hosts
+
+    run(scenario)
+
+
+def test_stale_host_marked():
+    async def scenario(coordinator, port):
+        coordinator.record(snapshot())
+        quiet, busy = FleetAgent(f"127.0.0.1:{port}", TOKEN), FleetAgent(f"127.0.0.1:{port}", TOKEN)
+        await quiet.start("quiet", "10.0.0.2")
+        await busy.start("busy", "10.0.0.3")
+        try:
+            quiet.publish(snapshot())
+            busy.publish(snapshot())
+            await eventually(lambda: len(coordinator.hosts) == 3)
+            await asyncio.sleep(0.4)
+            busy.publish(snapshot())
+            await eventually(lambda: time.time() - coordinator.hosts["busy"]["received"] < 0.2)
+        finally:
+            await quiet.stop()
+            await busy.stop()
+        rows = {line.split()[0]: line for line in coordinator.render("status").splitlines()[1:4]}
+        assert "⚠️" in rows["quiet"]
+        assert "⚠️" not in rows["busy"]
+        # Сам координатор не устаревает, даже если record() давно не вызывался
+        assert "⚠️" not in rows["coord"]
+        assert coordinator.render("status").endswith("3 hosts, 1 not reporting")
+
+    run(scenario, stale=0.3)
+
+
+def test_agent_reconnects_after_bad_reply():
+    async def main():
+        accepted = []
+
+        async def confused(reader, writer):
+            accepted.append(json.loads(await reader.readline())["host"])
+            writer.write(b'["ok"]\n')
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(confused, "127.0.0.1", 0)
+        agent = FleetAgent(f"127.0.0.1:{server.sockets[0].getsockname()[1]}", TOKEN)
+        await agent.start("web-1", "10.0.0.2")
+        try:
+            # Задача агента не падает на ответе не-объекте, а переподключается
+            await eventually(lambda: len(accepted) >= 2)
+            assert not agent._task.done()
+        finally:
+            await agent.stop()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(main())
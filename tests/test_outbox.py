@@ -0,0 +1,182 @@
+"""
+Очередь исходящих сообщений (bot/outbox.py) против фейкового Bot API из bench/:
+настоящий telegram.Bot ходит по HTTP на FakeTelegram, тест смотрит, что и когда дошло.
+"""
+import asyncio
+import io
+import time
+import pytest
+from telegram import Bot
+from telegram.error import BadRequest
+from bench.fake_telegram import FakeTelegram
+from bot.outbox import Outbox, PRIORITY_ALERT, PRIORITY_REPLY, PRIORITY_TAIL, MESSAGE_LIMIT
+
+CHAT = 100
+
+
+def run(scenario, global_rate=100.0, chat_rate=100.0, chat_burst=100.0, max_pending=100):
+    """Запускает scenario(outbox, telegram, sent) с ботом, подключенным к FakeTelegram."""
+
+    async def main():
+        telegram = FakeTelegram(user_id=1)
+        await telegram.start()
+        bot = Bot("123456:TEST", base_url=f"{telegram.url}/bot", base_file_url=f"{telegram.url}/file/bot")
+        await bot.initialize()
+        outbox = Outbox(global_rate, chat_rate, chat_burst, max_pending)
+        # (метод, chat_id, текст, perf_counter) каждого принятого вызова
+        sent = []
+        telegram.listeners.append(lambda method, chat_id, text, now: sent.append((method, chat_id, text, now)))
+        try:
+            await asyncio.wait_for(scenario(outbox, bot, telegram, sent), 20)
+        finally:
+            await outbox.stop()
+            await bot.shutdown()
+            await telegram.stop()
+
+    asyncio.run(main())
+
+
+def test_priority_order():
+    async def scenario(outbox, bot, telegram, sent):
+        # Все в очереди до старта: порядок отправки задают только приоритеты
+        futures = [
+            outbox.submit(CHAT, "send_message", PRIORITY_TAIL, text="tail"),
+            outbox.submit(CHAT, "send_message", PRIORITY_REPLY, text="reply"),
+            outbox.submit(CHAT, "send_message", PRIORITY_ALERT, text="alert"),
+            outbox.submit(CHAT, "send_message", PRIORITY_REPLY, text="reply 2"),
+        ]
+        outbox.start(bot)
+        await asyncio.gather(*futures)
+        assert [text for _, _, text, _ in sent] == ["alert", "reply", "reply 2", "tail"]
+
+    run(scenario)
+
+
+def test_merges_consecutive_small_messages():
+    async def scenario(outbox, bot, telegram, sent):
+        futures = [outbox.submit(CHAT, "send_message", PRIORITY_REPLY, True, text=str(i)) for i in range(3)]
+        # Разные параметры и чужой приоритет не склеиваются
+        futures.append(outbox.submit(CHAT, "send_message", PRIORITY_REPLY, True, text="md", parse_mode="Markdown"))
+        futures.append(outbox.submit(CHAT, "send_message", PRIORITY_TAIL, True, text="tail"))
+        outbox.start(bot)
+        messages = await asyncio.gather(*futures)
+        assert [text for _, _, text, _ in sent] == ["0\n\n1\n\n2", "md", "tail"]
+        assert messages[0] is messages[1] is messages[2]
+        assert outbox.stats["merged"] == 2
+
+    run(scenario)
+
+
+def test_does_not_merge_past_message_limit():
+    async def scenario(outbox, bot, telegram, sent):
+        text = "x" * (MESSAGE_LIMIT // 2)
+        futures = [outbox.submit(CHAT, "send_message", PRIORITY_REPLY, True, text=text) for _ in range(2)]
+        outbox.start(bot)
+        await asyncio.gather(*futures)
+        assert len(sent) == 2
+        assert outbox.stats["merged"] == 0
+
+    run(scenario)
+
+
+def test_chat_pacing():
+    async def scenario(outbox, bot, telegram, sent):
+        outbox.start(bot)
+        await asyncio.gather(*[outbox.send_message(CHAT, str(i), coalesce=False) for i in range(6)])
+        gaps = [b[3] - a[3] for a, b in zip(sent, sent[1:])]
+        # 5 msg/s без запаса: не чаще раза в 0.2 с
+        assert min(gaps) > 0.15
+        assert sent[-1][3] - sent[0][3] > 0.9
+
+    run(scenario, chat_rate=5, chat_burst=1)
+
+
+def test_global_pacing():
+    async def scenario(outbox, bot, telegram, sent):
+        outbox.start(bot)
+        started = time.perf_counter()
+        await asyncio.gather(*[outbox.send_message(chat_id, "hi") for chat_id in range(1, 21)])
+        # Запас общего лимита - 10 сообщений сразу, остальные 10 - по 10 msg/s
+        assert len(sent) == 20
+        assert time.perf_counter() - started > 0.85
+        first = sent[0][3]
+        assert sum(1 for *_, at in sent if at - first < 0.5) <= 16
+
+    run(scenario, global_rate=10)
+
+
+def test_overflow_drops_oldest_tail():
+    async def scenario(outbox, bot, telegram, sent):
+        alert = outbox.submit(CHAT, "send_message", PRIORITY_ALERT, text="alert")
+        tails = [outbox.submit(CHAT, "send_message", PRIORITY_TAIL, text=f"tail {i}") for i in range(3)]
+        reply = outbox.submit(CHAT, "send_message", PRIORITY_REPLY, text="reply")
+        assert outbox.pending() == 3
+        # Выброшенные сообщения /tail завершаются с None, а не висят
+        assert tails[0].done() and tails[0].result() is None
+        assert tails[1].done() and tails[1].result() is None
+        outbox.start(bot)
+        await asyncio.gather(alert, reply, tails[2])
+        assert [text for _, _, text, _ in sent] == ["alert", "reply", "tail 2"]
+        assert outbox.stats["dropped"] == 2
+
+    run(scenario, max_pending=3)
+
+
+def test_overflow_keeps_alerts_and_replies():
+    async def scenario(outbox, bot, telegram, sent):
+        futures = [outbox.submit(CHAT, "send_message", PRIORITY_ALERT, text=f"alert {i}") for i in range(5)]
+        outbox.start(bot)
+        await asyncio.gather(*futures)
+        assert len(sent) == 5
+        assert outbox.stats["dropped"] == 0
+
+    run(scenario, max_pending=3)
+
+
+def test_retry_after_pauses_only_that_chat():
+    async def scenario(outbox, bot, telegram, sent):
+        telegram.fail("sendMessage", retry_after=1)
+        outbox.start(bot)
+        started = time.perf_counter()
+        slow = asyncio.ensure_future(outbox.send_message(CHAT, "limited"))
+        await asyncio.sleep(0.2)
+        # Другой чат не ждет паузу первого
+        await outbox.send_message(CHAT + 1, "other")
+        assert time.perf_counter() - started < 0.5
+        await slow
+        assert time.perf_counter() - started >= 1
+        assert [text for _, _, text, _ in sent] == ["other", "limited"]
+        assert outbox.stats["retry_after"] == 1
+        # Скорость чата снижена вдвое и после успешной отправки восстанавливается понемногу
+        assert outbox._chats[CHAT].bucket.rate < 100 * 0.6
+
+    run(scenario)
+
+
+def test_bad_request_fails_without_retry():
+    async def scenario(outbox, bot, telegram, sent):
+        telegram.fail("sendMessage", error_code=400)
+        outbox.start(bot)
+        started = time.perf_counter()
+        with pytest.raises(BadRequest):
+            await outbox.send_message(CHAT, "*broken")
+        # Следующее сообщение в тот же чат не ждет паузы повторов
+        await outbox.send_message(CHAT, "next")
+        assert time.perf_counter() - started < 0.5
+        assert [text for _, _, text, _ in sent] == ["next"]
+        assert outbox.stats["rejected"] == 1
+        assert outbox.stats["network_errors"] == 0
+
+    run(scenario)
+
+
+def test_retry_reuploads_whole_file():
+    async def scenario(outbox, bot, telegram, sent):
+        payload = b"log line\n" * 1000
+        telegram.fail("sendDocument", retry_after=1)
+        outbox.start(bot)
+        await outbox.call(CHAT, "send_document", document=io.BytesIO(payload), filename="logs.txt")
+        assert [files["document"] for _, _, files in telegram.uploads] == [payload, payload]
+        assert sent[0][0] == "sendDocument"
+
+    run(scenario)
@@ -0,0 +1,145 @@
+"""
+Прием апдейтов по webhook (bot/webhook.py): фейковый Bot API из bench/ после setWebhook POST-ит
+апдейты на сервер бота, как Telegram; ошибки протокола проверяются сырыми запросами.
+"""
+import asyncio
+import json
+import socket
+import pytest
+from telegram.ext import ApplicationBuilder
+from bench.fake_telegram import FakeTelegram
+from bot import webhook
+from bot.webhook import create_server, MAX_BODY, SECRET_HEADER
+
+CHAT = 100
+SECRET = "test-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def port(monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", f"http://127.0.0.1:{port}/hook")
+    monkeypatch.setattr(webhook, "WEBHOOK_LISTEN", f"127.0.0.1:{port}")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(webhook, "WEBHOOK_MAX_CONNECTIONS", 2)
+    return port
+
+
+def run(scenario):
+    """Запускает scenario(server, application, telegram) с сервером из create_server()."""
+
+    async def main():
+        telegram = FakeTelegram(user_id=1)
+        await telegram.start()
+        application = ApplicationBuilder().token("123456:TEST").base_url(f"{telegram.url}/bot").updater(None).build()
+        await application.initialize()
+        server = create_server(application)
+        await server.start()
+        try:
+            await asyncio.wait_for(scenario(server, application, telegram), 10)
+        finally:
+            await server.stop()
+            await application.shutdown()
+            await telegram.stop()
+
+    asyncio.run(main())
+
+
+async def post(reader, writer, path: str = "/hook", body: bytes = b"{}", secret: str = SECRET, length: int = None):
+    """Один запрос по открытому соединению. Возвращает (статус, заголовки ответа)."""
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: bot\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body) if length is None else length}\r\n{SECRET_HEADER}: {secret}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers
+
+
+def update(update_id: int, text: str = "/status") -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": CHAT, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+        },
+    }).encode()
+
+
+def test_update_from_telegram_lands_in_queue(port):
+    async def scenario(server, application, telegram):
+        assert telegram.calls["setWebhook"] == 1
+        telegram.inject("/status", CHAT)
+        received = await asyncio.wait_for(application.update_queue.get(), 5)
+        assert received.message.text == "/status"
+        assert received.effective_chat.id == CHAT
+        assert server.stats["updates"] == 1
+
+    run(scenario)
+
+
+def test_wrong_secret_rejected(port):
+    async def scenario(server, application, telegram):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, _ = await post(reader, writer, body=update(1), secret="guess")
+        writer.close()
+        assert status == 403
+        assert server.stats["rejected"] == 1
+        assert application.update_queue.empty()
+
+    run(scenario)
+
+
+def test_wrong_path_not_found(port):
+    async def scenario(server, application, telegram):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, _ = await post(reader, writer, path="/other", body=update(1))
+        writer.close()
+        assert status == 404
+        assert application.update_queue.empty()
+
+    run(scenario)
+
+
+def test_oversized_body_rejected(port):
+    async def scenario(server, application, telegram):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # Тело не отправляется: сервер отвечает по Content-Length и закрывает соединение
+        status, headers = await post(reader, writer, body=b"", length=MAX_BODY + 1)
+        assert status == 413
+        assert headers["connection"] == "close"
+        assert await reader.read() == b""
+        writer.close()
+
+    run(scenario)
+
+
+def test_keep_alive_serves_several_requests(port):
+    async def scenario(server, application, telegram):
+        connections = server.stats["connections"]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        first, headers = await post(reader, writer, body=update(1, "/status"))
+        second, _ = await post(reader, writer, body=update(2, "/cpu"))
+        writer.close()
+        assert (first, second) == (200, 200)
+        assert "connection" not in headers
+        assert server.stats["connections"] == connections + 1
+        texts = [(await application.update_queue.get()).message.text for _ in range(2)]
+        assert texts == ["/status", "/cpu"]
+
+    run(scenario)